@@ -10,6 +10,7 @@ import os
 
 from biz.api import api_app, init_app
 from biz.api.scheduler import setup_scheduler
+from biz.queue.pool import drain_on_sigterm, get_worker_pool, node_role
 from biz.utils.config_checker import check_config
 
 # 初始化应用并注册路由
@@ -17,6 +18,11 @@ init_app(api_app)
 
 if __name__ == '__main__':
     check_config()
+    # 启动常驻 Worker 进程池（Worker 以 spawn 方式启动）；api 角色的节点只入队，由独立的 Worker 节点消费
+    if node_role() != 'api':
+        get_worker_pool().start()
+    # 部署重启时(SIGTERM)先排空进程池，执行中的 Review 完成后再退出
+    drain_on_sigterm()
     # 启动定时任务调度器
     setup_scheduler()
 
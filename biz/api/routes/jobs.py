@@ -0,0 +1,87 @@
+"""
+任务队列路由模块
+"""
+import json
+import time
+
+from flask import Blueprint, jsonify, request
+
+from biz.queue.pool import get_worker_pool
+from biz.service.job_service import JobService
+from biz.service.llm_metrics_service import LLMMetricsService
+from biz.service.review_cache_service import ReviewCacheService
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# 任务视图中对外展示的字段，任务参数(payload)中含有平台 Token，不对外展示
+_JOB_FIELDS = ['id', 'handler', 'status', 'attempts', 'error', 'coalesce_key', 'fair_key', 'priority', 'queue_name',
+               'created_at', 'started_at', 'finished_at', 'updated_at']
+
+
+def _job_view(job: dict) -> dict:
+    """
+    转换为对外展示的任务信息：
+    state 为 queued/fetching/reviewing/publishing/done/failed 等，执行中的任务展示其所处阶段；
+    stage_timings 为各阶段耗时(秒)：platform_fetch、token_count、llm_call、note_post、notification、db_write；
+    llm_usage 为 LLM 调用次数及 token 用量：calls、input_tokens、output_tokens、cached_tokens、cache_creation_tokens
+    """
+    view = {field: job.get(field) for field in _JOB_FIELDS}
+    if job['status'] == JobService.STATUS_RUNNING:
+        view['state'] = job.get('stage') or JobService.STATUS_RUNNING
+    else:
+        view['state'] = job['status']
+    view['stage_timings'] = json.loads(job.get('stage_timings') or '{}')
+    view['llm_usage'] = json.loads(job.get('llm_usage') or '{}')
+    started_at = job.get('started_at') or 0
+    view['queue_wait'] = round(started_at - job['created_at'], 3) if started_at else None
+    view['duration'] = round((job.get('finished_at') or time.time()) - started_at, 3) if started_at else None
+    return view
+
+
+@jobs_bp.route('/review/queue', methods=['GET'])
+def queue_stats():
+    """
+    返回 Worker 进程池及队列深度等运行状态
+    """
+    return jsonify(get_worker_pool().stats()), 200
+
+
+@jobs_bp.route('/review/cache', methods=['GET'])
+def cache_stats():
+    """
+    返回 Review 结果缓存的条目数及命中率
+    """
+    return jsonify(ReviewCacheService.stats()), 200
+
+
+@jobs_bp.route('/review/llm/metrics', methods=['GET'])
+def llm_metrics():
+    """
+    汇总最近 hours 小时(默认 24)的 LLM 调用指标，group_by 为 model(默认，按供应商+模型)或 provider
+    """
+    hours = min(max(request.args.get('hours', 24, type=float), 0), 24 * 90)
+    group_by = request.args.get('group_by', 'model')
+    if group_by not in ('model', 'provider'):
+        return jsonify({'message': 'group_by must be model or provider'}), 400
+    return jsonify(LLMMetricsService.aggregate(time.time() - hours * 3600, group_by)), 200
+
+
+@jobs_bp.route('/review/jobs', methods=['GET'])
+def list_jobs():
+    """
+    查询最近的任务，可按 status 过滤，limit 默认 50、最大 500
+    """
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    jobs = JobService.list_jobs(status=request.args.get('status'), limit=limit)
+    return jsonify([_job_view(job) for job in jobs]), 200
+
+
+@jobs_bp.route('/review/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id: int):
+    """
+    查询单个任务的状态及各阶段耗时
+    """
+    job = JobService.get_job(job_id)
+    if not job:
+        return jsonify({'message': f'Job {job_id} not found'}), 404
+    return jsonify(_job_view(job)), 200
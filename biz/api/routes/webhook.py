@@ -7,6 +7,7 @@ from urllib.parse import urlparse
 from flask import Blueprint, request, jsonify
 
 from biz.platforms.gitlab.webhook_handler import slugify_url
+from biz.queue.admission import QueueOverloadedError
 from biz.queue.worker import (
     handle_merge_request_event,
     handle_push_event,
@@ -21,6 +22,16 @@ from biz.utils.queue import handle_queue
 webhook_bp = Blueprint('webhook', __name__)
 
 
+def merge_request_coalesce_key(url_slug: str, project: str, number, action: str, review_actions: list) -> str:
+    """
+    生成 MR/PR 事件的合并键，仅对会触发 Review 的事件生效，
+    防抖窗口内同一个 MR 只 Review 最新的一次提交
+    """
+    if action not in review_actions or not project or not number:
+        return ''
+    return f"{url_slug}:{project}:mr:{number}"
+
+
 @webhook_bp.route('/review/webhook', methods=['POST'])
 def handle_webhook():
     """
@@ -35,12 +46,18 @@ def handle_webhook():
         webhook_source_github = request.headers.get('X-GitHub-Event')
         webhook_source_gitea = request.headers.get('X-Gitea-Event')
 
-        if webhook_source_gitea:  # Gitea webhook优先处理
-            return handle_gitea_webhook(webhook_source_gitea, data)
-        elif webhook_source_github:  # GitHub webhook
-            return handle_github_webhook(webhook_source_github, data)
-        else:  # GitLab webhook
-            return handle_gitlab_webhook(data)
+        try:
+            if webhook_source_gitea:  # Gitea webhook优先处理
+                return handle_gitea_webhook(webhook_source_gitea, data)
+            elif webhook_source_github:  # GitHub webhook
+                return handle_github_webhook(webhook_source_github, data)
+            else:  # GitLab webhook
+                return handle_gitlab_webhook(data)
+        except QueueOverloadedError as e:
+            # 过载时拒绝事件，由平台根据 Retry-After 稍后重新投递
+            logger.warning(f'Webhook rejected: {e}, retry after {e.retry_after}s.')
+            return jsonify({'message': 'Review queue is overloaded, please retry later.',
+                            'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
     else:
         return jsonify({'message': 'Invalid data format'}), 400
 
@@ -63,16 +80,22 @@ def handle_github_webhook(event_type, data):
 
     if event_type == "pull_request":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug)
+        coalesce_key = merge_request_coalesce_key(github_url_slug, data.get('repository', {}).get('full_name'),
+                                                  data.get('pull_request', {}).get('number'), data.get('action'),
+                                                  ['opened', 'synchronize'])
+        job_id = handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug,
+                              coalesce_key=coalesce_key, project=data.get('repository', {}).get('full_name', ''),
+                              is_merge_request=True, target_branch=data.get('pull_request', {}).get('base', {}).get('ref', ''))
         # 立马返回响应
         return jsonify(
-            {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
+            {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.', 'job_id': job_id}), 200
     elif event_type == "push":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug)
+        job_id = handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug,
+                              project=data.get('repository', {}).get('full_name', ''))
         # 立马返回响应
         return jsonify(
-            {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
+            {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.', 'job_id': job_id}), 200
     else:
         error_message = f'Only pull_request and push events are supported for GitHub webhook, but received: {event_type}.'
         logger.error(error_message)
@@ -114,18 +137,26 @@ def handle_gitlab_webhook(data):
 
     # 处理Merge Request Hook
     if object_kind == "merge_request":
-        # 创建一个新进程进行异步处理
-        handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        object_attributes = data.get('object_attributes', {})
+        coalesce_key = merge_request_coalesce_key(gitlab_url_slug,
+                                                  object_attributes.get('target_project_id') or data.get('project', {}).get('id'),
+                                                  object_attributes.get('iid'), object_attributes.get('action'),
+                                                  ['open', 'update'])
+        # 提交到Worker进程池异步处理
+        job_id = handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug,
+                              coalesce_key=coalesce_key, project=data.get('project', {}).get('path_with_namespace', ''),
+                              is_merge_request=True, target_branch=object_attributes.get('target_branch', ''))
         # 立马返回响应
         return jsonify(
-            {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
+            {'message': f'Request received(object_kind={object_kind}), will process asynchronously.', 'job_id': job_id}), 200
     elif object_kind == "push":
-        # 创建一个新进程进行异步处理
+        # 提交到Worker进程池异步处理
         # TODO check if PUSH_REVIEW_ENABLED is needed here
-        handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        job_id = handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug,
+                              project=data.get('project', {}).get('path_with_namespace', ''))
         # 立马返回响应
         return jsonify(
-            {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
+            {'message': f'Request received(object_kind={object_kind}), will process asynchronously.', 'job_id': job_id}), 200
     else:
         error_message = f'Only merge_request and push events are supported (both Webhook and System Hook), but received: {object_kind}.'
         logger.error(error_message)
@@ -147,13 +178,20 @@ def handle_gitea_webhook(event_type, data):
     logger.info(f'Payload: {json.dumps(data)}')
 
     if event_type == "pull_request":
-        handle_queue(handle_gitea_pull_request_event, data, gitea_token, gitea_url, gitea_url_slug)
+        pull_request = data.get('pull_request', {})
+        coalesce_key = merge_request_coalesce_key(gitea_url_slug, data.get('repository', {}).get('full_name'),
+                                                  pull_request.get('number') or pull_request.get('index'), data.get('action'),
+                                                  ['opened', 'open', 'reopened', 'synchronize', 'synchronized'])
+        job_id = handle_queue(handle_gitea_pull_request_event, data, gitea_token, gitea_url, gitea_url_slug,
+                              coalesce_key=coalesce_key, project=data.get('repository', {}).get('full_name', ''),
+                              is_merge_request=True, target_branch=(pull_request.get('base') or {}).get('ref', ''))
         return jsonify(
-            {'message': f'Gitea request received(event_type={event_type}), will process asynchronously.'}), 200
+            {'message': f'Gitea request received(event_type={event_type}), will process asynchronously.', 'job_id': job_id}), 200
     elif event_type == "push":
-        handle_queue(handle_gitea_push_event, data, gitea_token, gitea_url, gitea_url_slug)
+        job_id = handle_queue(handle_gitea_push_event, data, gitea_token, gitea_url, gitea_url_slug,
+                              project=data.get('repository', {}).get('full_name', ''))
         return jsonify(
-            {'message': f'Gitea request received(event_type={event_type}), will process asynchronously.'}), 200
+            {'message': f'Gitea request received(event_type={event_type}), will process asynchronously.', 'job_id': job_id}), 200
     else:
         error_message = f'Only pull_request and push events are supported for Gitea webhook, but received: {event_type}.'
         logger.error(error_message)
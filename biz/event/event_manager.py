@@ -1,6 +1,7 @@
 from blinker import Signal
 
 from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity
+from biz.queue.context import job_stage
 from biz.service.review_service import ReviewService
 from biz.utils.im import notifier
 
@@ -31,12 +32,14 @@ def on_merge_request_reviewed(mr_review_entity: MergeRequestReviewEntity):
 
 {mr_review_entity.review_result}
     """
-    notifier.send_notification(content=im_msg, msg_type='markdown', title='Merge Request Review',
-                               project_name=mr_review_entity.project_name, url_slug=mr_review_entity.url_slug,
-                               webhook_data=mr_review_entity.webhook_data)
+    with job_stage('notification', 'publishing'):
+        notifier.send_notification(content=im_msg, msg_type='markdown', title='Merge Request Review',
+                                   project_name=mr_review_entity.project_name, url_slug=mr_review_entity.url_slug,
+                                   webhook_data=mr_review_entity.webhook_data)
 
     # 记录到数据库
-    ReviewService().insert_mr_review_log(mr_review_entity)
+    with job_stage('db_write'):
+        ReviewService().insert_mr_review_log(mr_review_entity)
 
 
 def on_push_reviewed(entity: PushReviewEntity):
@@ -58,12 +61,14 @@ def on_push_reviewed(entity: PushReviewEntity):
 
     if entity.review_result:
         im_msg += f"#### AI Review 结果: \n {entity.review_result}\n\n"
-    notifier.send_notification(content=im_msg, msg_type='markdown',title=f"{entity.project_name} Push Event",
-                               project_name=entity.project_name, url_slug=entity.url_slug,
-                               webhook_data=entity.webhook_data)
+    with job_stage('notification', 'publishing'):
+        notifier.send_notification(content=im_msg, msg_type='markdown',title=f"{entity.project_name} Push Event",
+                                   project_name=entity.project_name, url_slug=entity.url_slug,
+                                   webhook_data=entity.webhook_data)
 
     # 记录到数据库
-    ReviewService().insert_push_review_log(entity)
+    with job_stage('db_write'):
+        ReviewService().insert_push_review_log(entity)
 
 
 # 连接事件处理函数到事件信号
@@ -0,0 +1,244 @@
+"""
+供应商 Batch 接口
+
+Push 的 Review 不需要即时返回，开启 PUSH_REVIEW_BATCH_ENABLED 后攒批经 OpenAI Batch API / Anthropic Message Batches
+提交，价格为同步调用的一半，且不占用 MR Review 的并发窗口。
+local 后端在提交时直接逐个同步调用当前配置的 LLM，结果保存为文件，用于测试及不支持 Batch 接口的供应商。
+"""
+import abc
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Any, Optional
+
+from biz.llm.budget import token_budget
+from biz.llm.factory import Factory
+from biz.llm.types import LLMUsage
+from biz.service.batch_review_service import BatchReviewService
+from biz.service.token_budget_service import TokenBudgetService
+from biz.utils.log import logger
+
+
+class BatchResult:
+    """批次中一个请求的结果，失败时 error 非空"""
+
+    def __init__(self, content: str = '', error: str = '', usage: Optional[LLMUsage] = None):
+        self.content = content
+        self.error = error
+        self.usage = usage
+
+
+class BatchBackend(abc.ABC):
+    """Batch 接口的提交及查询"""
+    provider = ''
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def default_model(self) -> str:
+        return getattr(self.client, 'default_model', '')
+
+    @staticmethod
+    def custom_id(request_id: int) -> str:
+        return f"review-{request_id}"
+
+    @abc.abstractmethod
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        提交一批请求，返回批次ID
+        :param requests: BatchReviewService 中的请求，包含 id、model、messages、budget_key
+        """
+
+    @abc.abstractmethod
+    def poll(self, batch_id: str) -> Optional[Dict[str, BatchResult]]:
+        """批次仍在处理时返回 None，结束后返回 custom_id -> 结果(过期、取消的请求不在结果中)"""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    provider = 'openai'
+    ENDPOINT = '/v1/chat/completions'
+    TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        lines = [json.dumps({
+            'custom_id': self.custom_id(request['id']),
+            'method': 'POST',
+            'url': self.ENDPOINT,
+            'body': {'model': request['model'], 'messages': request['messages']},
+        }, ensure_ascii=False) for request in requests]
+        input_file = self.client.client.files.create(file=('review_batch.jsonl', '\n'.join(lines).encode('utf-8')),
+                                                     purpose='batch')
+        batch = self.client.client.batches.create(input_file_id=input_file.id, endpoint=self.ENDPOINT,
+                                                  completion_window='24h')
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, BatchResult]]:
+        batch = self.client.client.batches.retrieve(batch_id)
+        if batch.status not in self.TERMINAL_STATUSES:
+            return None
+        results = {}
+        # 过期、取消的批次也可能有部分已完成的结果
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get('response') or {}
+                body = response.get('body') or {}
+                if response.get('status_code') == 200 and body.get('choices'):
+                    usage = body.get('usage') or {}
+                    results[item['custom_id']] = BatchResult(
+                        content=body['choices'][0]['message']['content'],
+                        usage=LLMUsage(provider=self.provider, model=body.get('model', ''),
+                                       input_tokens=usage.get('prompt_tokens', 0),
+                                       output_tokens=usage.get('completion_tokens', 0)))
+                else:
+                    results[item['custom_id']] = BatchResult(error=str(item.get('error') or body.get('error')
+                                                                       or f"status_code={response.get('status_code')}"))
+        return results
+
+
+class AnthropicBatchBackend(BatchBackend):
+    provider = 'anthropic'
+
+    @property
+    def _batches(self):
+        # anthropic==0.39.0 中 Message Batches 仍位于 beta 命名空间
+        return self.client.client.beta.messages.batches
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_requests = []
+        for request in requests:
+            system_message, anthropic_messages = self.client._convert_messages(request['messages'])
+            params = {
+                'model': request['model'],
+                'messages': anthropic_messages,
+                'max_tokens': int(os.getenv("ANTHROPIC_MAX_TOKENS", "4096")),
+            }
+            if system_message:
+                params['system'] = self.client._cacheable_system(system_message)
+            batch_requests.append({'custom_id': self.custom_id(request['id']), 'params': params})
+        return self._batches.create(requests=batch_requests).id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, BatchResult]]:
+        if self._batches.retrieve(batch_id).processing_status != 'ended':
+            return None
+        results = {}
+        for entry in self._batches.results(batch_id):
+            if entry.result.type == 'succeeded':
+                message = entry.result.message
+                results[entry.custom_id] = BatchResult(content=message.content[0].text,
+                                                       usage=self.client._usage(message.model, message.usage))
+            else:
+                error = getattr(entry.result, 'error', None)
+                results[entry.custom_id] = BatchResult(error=f"{entry.result.type}: {error}" if error
+                                                       else entry.result.type)
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    在提交时逐个同步调用 LLM 的替代实现，结果写入 DIR 下的文件；
+    DIR 位于 QUEUE_DB_FILE 所在目录，多节点部署时与任务队列同在共享存储上，轮询任务可由任一节点执行
+    """
+    provider = 'local'
+    DIR = os.path.join(os.path.dirname(os.getenv("QUEUE_DB_FILE", "data/data.db")), "batches")
+
+    def _path(self, batch_id: str) -> str:
+        return os.path.join(LocalBatchBackend.DIR, f"{batch_id}.json")
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"local-{uuid.uuid4().hex}"
+        results = {}
+        for request in requests:
+            try:
+                # 同步调用的用量由 BaseClient 计入预算，轮询时不再重复累加
+                with token_budget(request.get('budget_key')):
+                    results[self.custom_id(request['id'])] = {
+                        'content': self.client.completions(messages=request['messages'], model=request['model'])}
+            except Exception as e:
+                results[self.custom_id(request['id'])] = {'error': str(e)}
+        os.makedirs(LocalBatchBackend.DIR, exist_ok=True)
+        with open(self._path(batch_id), 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False)
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, BatchResult]]:
+        path = self._path(batch_id)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as file:
+            results = json.load(file)
+        os.remove(path)
+        return {custom_id: BatchResult(**result) for custom_id, result in results.items()}
+
+
+_BACKENDS = {
+    'openai': OpenAIBatchBackend,
+    'anthropic': AnthropicBatchBackend,
+    'local': LocalBatchBackend,
+}
+
+
+def batch_provider() -> str:
+    """
+    提交批次使用的后端：PUSH_REVIEW_BATCH_PROVIDER 未配置时，LLM_PROVIDER 为 openai/anthropic 则使用其 Batch 接口，
+    否则使用 local
+    """
+    provider = os.getenv('PUSH_REVIEW_BATCH_PROVIDER', '') or os.getenv('LLM_PROVIDER', 'anthropic')
+    return provider if provider in _BACKENDS else 'local'
+
+
+def get_batch_backend(provider: str = None) -> BatchBackend:
+    provider = provider or batch_provider()
+    backend_class = _BACKENDS[provider]
+    return backend_class(Factory.getClient(None if provider == 'local' else provider))
+
+
+def submit_due_batches(queue_name: str) -> int:
+    """
+    提交分区中到期的请求：某个后端待提交的请求数达到 PUSH_REVIEW_BATCH_MAX_SIZE，
+    或最早的请求已等待 PUSH_REVIEW_BATCH_MAX_WAIT 秒时提交一批，返回提交的请求数
+    """
+    max_size = max(1, int(os.getenv('PUSH_REVIEW_BATCH_MAX_SIZE', 50)))
+    max_wait = float(os.getenv('PUSH_REVIEW_BATCH_MAX_WAIT', 600))
+    submitted = 0
+    for provider, pending in BatchReviewService.pending_providers(queue_name).items():
+        if pending['count'] < max_size and time.time() - pending['oldest'] < max_wait:
+            continue
+        backend = get_batch_backend(provider)
+        while True:
+            requests = BatchReviewService.list_pending(queue_name, provider, max_size)
+            if not requests:
+                break
+            batch_id = backend.submit(requests)
+            BatchReviewService.mark_submitted([request['id'] for request in requests], batch_id)
+            logger.info(f"Submitted {len(requests)} review requests to {provider} batch {batch_id}.")
+            submitted += len(requests)
+            if len(requests) < max_size:
+                break
+    return submitted
+
+
+def poll_submitted_batches(queue_name: str) -> int:
+    """查询已提交的批次，记录已结束批次中各请求的结果并累加 token 预算，返回有结果的请求数"""
+    finished = 0
+    for batch in BatchReviewService.list_submitted_batches(queue_name):
+        backend = get_batch_backend(batch['provider'])
+        results = backend.poll(batch['batch_id'])
+        if results is None:
+            continue
+        for request in batch['requests']:
+            result = results.get(backend.custom_id(request['id'])) or BatchResult(error='batch ended without result')
+            BatchReviewService.finish(request['id'], result.content, result.error)
+            if result.usage and request['budget_key']:
+                TokenBudgetService.add(request['budget_key'], result.usage.input_tokens + result.usage.output_tokens)
+            finished += 1
+        logger.info(f"Batch {batch['batch_id']} of {batch['provider']} ended, "
+                    f"{len(batch['requests'])} review requests finished.")
+    return finished
+
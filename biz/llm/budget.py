@@ -0,0 +1,100 @@
+"""
+按项目的 LLM token 预算
+
+预算键默认为含分组/命名空间的项目路径(TOKEN_BUDGET_SCOPE=url_slug 时为平台地址)，每小时、每天的额度分别由
+TOKEN_BUDGET_HOURLY、TOKEN_BUDGET_DAILY 配置(0 表示不限制)，可按项目覆盖，如 group/my-project 对应
+TOKEN_BUDGET_DAILY_GROUP_MY_PROJECT。
+Review 期间当前预算键经 contextvar 传递，BaseClient 拿到每次调用的 usage 后累加到对应项目的用量上。
+"""
+import contextvars
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from biz.service.token_budget_service import TokenBudgetService, WINDOWS
+from biz.utils.log import logger
+
+_current_budget_key = contextvars.ContextVar('token_budget_key', default=None)
+
+ACTION_DOWNGRADE = 'downgrade'
+ACTION_DEFER = 'defer'
+ACTION_SKIP = 'skip'
+
+
+class BudgetExhausted:
+    """预算用尽的窗口"""
+
+    def __init__(self, budget_key: str, window: str, used: int, limit: int):
+        self.budget_key = budget_key
+        self.window = window
+        self.used = used
+        self.limit = limit
+        length = WINDOWS[window]
+        self.reset_in = TokenBudgetService.window_start(window) + length - time.time()
+
+    def __str__(self):
+        window_name = '小时' if self.window == 'hour' else '天'
+        return f"{self.budget_key} 本{window_name}的 token 预算已用尽({self.used}/{self.limit})"
+
+
+def project_budget_key(project_path: str, url_slug: str = '') -> str:
+    """
+    项目的预算键
+    :param project_path: 含分组/命名空间的项目路径(GitLab 的 path_with_namespace、GitHub/Gitea 的 full_name)，
+                         与公平调度的分组键一致，不同分组下的同名项目分别计算预算
+    """
+    scope = os.getenv('TOKEN_BUDGET_SCOPE', 'project')
+    return (url_slug if scope == 'url_slug' else project_path) or ''
+
+
+def budget_limit(key: str, window: str) -> int:
+    """
+    项目在某个窗口的额度，优先使用按项目覆盖的配置；预算键中的非字母数字字符替换为下划线后作为变量名后缀，
+    如 group/my-project 对应 TOKEN_BUDGET_DAILY_GROUP_MY_PROJECT
+    """
+    name = 'TOKEN_BUDGET_HOURLY' if window == 'hour' else 'TOKEN_BUDGET_DAILY'
+    suffix = re.sub(r'\W', '_', key).upper()
+    return int(os.getenv(f"{name}_{suffix}", os.getenv(name, 0)) or 0)
+
+
+def budget_action() -> str:
+    action = os.getenv('TOKEN_BUDGET_ACTION', ACTION_SKIP)
+    return action if action in (ACTION_DOWNGRADE, ACTION_DEFER, ACTION_SKIP) else ACTION_SKIP
+
+
+def check_budget(key: Optional[str]) -> Optional[BudgetExhausted]:
+    """检查预算，已用尽时返回用尽的窗口；未配置额度时不查询数据库"""
+    if not key:
+        return None
+    limits = {window: budget_limit(key, window) for window in WINDOWS}
+    if not any(limits.values()):
+        return None
+    used = TokenBudgetService.used(key)
+    # 按天的预算用尽时需要等待更久，优先报告
+    for window in ('day', 'hour'):
+        if limits[window] and used[window] >= limits[window]:
+            return BudgetExhausted(key, window, used[window], limits[window])
+    return None
+
+
+@contextmanager
+def token_budget(key: Optional[str]):
+    """在此上下文中的 LLM 调用计入 key 的预算"""
+    token = _current_budget_key.set(key)
+    try:
+        yield
+    finally:
+        _current_budget_key.reset(token)
+
+
+def consume(tokens: int):
+    """将一次调用的 token 用量计入当前预算键"""
+    key = _current_budget_key.get()
+    if not key or tokens <= 0:
+        return
+    try:
+        TokenBudgetService.add(key, tokens)
+    except Exception as e:
+        logger.warning(f"Failed to record token budget usage of {key}: {e}")
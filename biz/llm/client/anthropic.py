@@ -1,14 +1,17 @@
+import json
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Iterator, Tuple, Any
 
 import httpx
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 
 from biz.llm.client.base import BaseClient
-from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.llm.types import NotGiven, NOT_GIVEN, LLMUsage
 
 
 class AnthropicClient(BaseClient):
+    provider = 'anthropic'
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         self.base_url = os.getenv("ANTHROPIC_API_BASE_URL", None)
@@ -19,20 +22,16 @@ class AnthropicClient(BaseClient):
         # This prevents the 'proxies' parameter error when environment proxy variables are set
         http_client = httpx.Client()
 
-        # Initialize Anthropic client with custom http_client
+        # Initialize Anthropic client with custom http_client; retries are handled by BaseClient
         if self.base_url:
-            self.client = Anthropic(api_key=self.api_key, base_url=self.base_url, http_client=http_client)
+            self.client = Anthropic(api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0)
         else:
-            self.client = Anthropic(api_key=self.api_key, http_client=http_client)
+            self.client = Anthropic(api_key=self.api_key, http_client=http_client, max_retries=0)
 
         self.default_model = os.getenv("ANTHROPIC_API_MODEL", "claude-sonnet-4-5-20250929")
 
-    def completions(self,
-                    messages: List[Dict[str, str]],
-                    model: Optional[str] | NotGiven = NOT_GIVEN,
-                    ) -> str:
-        model = model or self.default_model
-
+    @staticmethod
+    def _convert_messages(messages: List[Dict[str, str]]) -> Tuple[Optional[str], List[Dict[str, str]]]:
         # Convert messages to Anthropic format
         # Anthropic requires separating system messages from user/assistant messages
         system_message = None
@@ -51,14 +50,103 @@ class AnthropicClient(BaseClient):
                     "role": role,
                     "content": content
                 })
+        return system_message, anthropic_messages
+
+    @staticmethod
+    def _cacheable_system(system_message: Optional[str]):
+        """
+        system 提示词在每次 Review 中都相同，且位于请求最前面，标记 cache_control 后
+        后续调用直接命中 Anthropic 的提示词缓存，降低首 token 延迟及费用
+        """
+        if not system_message or os.getenv("ANTHROPIC_PROMPT_CACHE_ENABLED", "1") != "1":
+            return system_message
+        return [{"type": "text", "text": system_message, "cache_control": {"type": "ephemeral"}}]
+
+    def _usage(self, model: str, usage) -> LLMUsage:
+        # Anthropic 的 input_tokens 不含读写缓存的 token，与 OpenAI 兼容接口保持一致，统计为全部输入 token
+        cached_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return LLMUsage(provider=self.provider, model=model,
+                        input_tokens=usage.input_tokens + cached_tokens + cache_creation_tokens,
+                        output_tokens=usage.output_tokens, cached_tokens=cached_tokens,
+                        cache_creation_tokens=cache_creation_tokens)
+
+    def _completions(self,
+                     messages: List[Dict[str, str]],
+                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                     ) -> str:
+        model = model or self.default_model
+        system_message, anthropic_messages = self._convert_messages(messages)
 
         # Create completion with Anthropic API
         response = self.client.messages.create(
             model = model,
-            system = system_message,
+            system = self._cacheable_system(system_message),
             messages = anthropic_messages,
             max_tokens = int(os.getenv("ANTHROPIC_MAX_TOKENS", "4096")),
         )
 
+        self._record_usage(self._usage(model, response.usage))
         # Extract text from response
         return response.content[0].text
+
+    def _structured_completions(self,
+                                messages: List[Dict[str, str]],
+                                model: Optional[str] | NotGiven,
+                                response_schema: Dict[str, Any],
+                                ) -> str:
+        # 以 Schema 作为唯一工具的 input_schema 并强制调用该工具，工具参数即结构化结果
+        model = model or self.default_model
+        system_message, anthropic_messages = self._convert_messages(messages)
+        tool_name = response_schema.get("title", "response")
+        response = self.client.messages.create(
+            model = model,
+            system = self._cacheable_system(system_message),
+            messages = anthropic_messages,
+            max_tokens = int(os.getenv("ANTHROPIC_MAX_TOKENS", "4096")),
+            tools = [{"name": tool_name, "description": "按 Schema 提交结果", "input_schema": response_schema}],
+            tool_choice = {"type": "tool", "name": tool_name},
+        )
+        self._record_usage(self._usage(model, response.usage))
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input, ensure_ascii=False)
+        return ""
+
+    def _create_async_client(self) -> AsyncAnthropic:
+        if self.base_url:
+            return AsyncAnthropic(api_key=self.api_key, base_url=self.base_url, http_client=httpx.AsyncClient(),
+                                  max_retries=0)
+        return AsyncAnthropic(api_key=self.api_key, http_client=httpx.AsyncClient(), max_retries=0)
+
+    async def _acompletions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> str:
+        model = model or self.default_model
+        system_message, anthropic_messages = self._convert_messages(messages)
+        response = await self._get_async_client().messages.create(
+            model = model,
+            system = self._cacheable_system(system_message),
+            messages = anthropic_messages,
+            max_tokens = int(os.getenv("ANTHROPIC_MAX_TOKENS", "4096")),
+        )
+        self._record_usage(self._usage(model, response.usage))
+        return response.content[0].text
+
+    def _stream_completions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> Iterator[str]:
+        model = model or self.default_model
+        system_message, anthropic_messages = self._convert_messages(messages)
+
+        with self.client.messages.stream(
+            model = model,
+            system = self._cacheable_system(system_message),
+            messages = anthropic_messages,
+            max_tokens = int(os.getenv("ANTHROPIC_MAX_TOKENS", "4096")),
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+            self._record_usage(self._usage(model, stream.get_final_message().usage))
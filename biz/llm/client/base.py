@@ -1,26 +1,256 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
 from abc import abstractmethod
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple, Any
 
-from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.llm.budget import consume
+from biz.llm.errors import LLMError, LLMEmptyResponseError, classify
+from biz.llm.limiter import get_limiter, AdaptiveLimiter
+from biz.llm.resilience import get_breaker, retry_delay, CircuitBreaker
+from biz.llm.telemetry import CallRecorder, start_call, current_call
+from biz.llm.types import NotGiven, NOT_GIVEN, LLMUsage
+from biz.queue.context import current_job_id
+from biz.service.job_service import JobService
 from biz.utils.log import logger
 
+# 落选的对冲请求：同步调用无法中断，RoutingClient 采用其他供应商的结果后置位，
+# 此后返回的用量只记录在调用指标中，不计入 token 预算及任务用量
+hedge_discarded: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar('llm_hedge_discarded',
+                                                                                           default=None)
+
 
 class BaseClient:
     """ Base class for chat models client. """
 
+    # 供应商名称，与 LLM_PROVIDER 取值一致
+    provider: str = ''
+
     def ping(self) -> bool:
         """Ping the model to check connectivity."""
         try:
             result = self.completions(messages=[{"role": "user", "content": '请仅返回 "ok"。'}])
             return result and result.strip() == "ok"
-        except Exception:
-            logger.error("尝试连接LLM失败， {e}")
+        except Exception as e:
+            logger.error(f"尝试连接LLM失败， {e}")
             return False
 
-    @abstractmethod
+    def warm_up(self):
+        """服务启动时预热，如预加载本地模型，默认不做任何处理"""
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        """同一供应商、同一 base_url 的所有调用共享一个自适应并发窗口"""
+        return get_limiter(self.provider, getattr(self, 'base_url', None) or '')
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """同一供应商、同一 base_url 的所有调用共享一个熔断器"""
+        return get_breaker(self.provider, getattr(self, 'base_url', None) or '')
+
+    def _on_failure(self, error: Exception, attempt: int) -> Tuple[LLMError, Optional[float]]:
+        """将异常转换为 LLMError 并更新熔断器，返回错误及重试等待时间(不重试时为 None)"""
+        llm_error = classify(self.provider, error)
+        if llm_error.transient:
+            self.breaker.record_failure()
+        else:
+            # 认证失败、请求错误等说明服务本身可达，不计入熔断
+            self.breaker.record_success()
+        delay = retry_delay(llm_error, attempt)
+        if delay is not None:
+            logger.warning(f"LLM call to {self.provider} failed ({llm_error}), retrying in {delay:.1f}s.")
+        return llm_error, delay
+
+    def _start_call(self, model: Optional[str] | NotGiven, streamed: bool = False) -> CallRecorder:
+        """开始记录一次调用的指标(在获得并发名额之后，耗时不含本地排队时间)"""
+        return start_call(self.provider, model or getattr(self, 'default_model', ''), streamed)
+
+    @staticmethod
+    def _output_tokens(call: Optional[CallRecorder]) -> int:
+        """本次调用的输出 token 数(供应商未返回用量时为 0)，用于并发窗口按输出 token 归一化延迟"""
+        return call.usage.output_tokens if call is not None and call.usage is not None else 0
+
+    @staticmethod
+    def _finish_call(call: Optional[CallRecorder], error: Exception = None):
+        if call is not None:
+            call.finish(error)
+
+    def _record_usage(self, usage: Optional[LLMUsage]):
+        """
+        记录一次调用的 token 用量(含命中前缀缓存的 token 数)，写入当前调用的指标并计入当前项目的 token 预算，
+        在任务中执行时同时累加到任务上，由子类在拿到响应后调用
+        """
+        if usage is None:
+            return
+        call = current_call()
+        if call is not None:
+            call.usage = usage
+        logger.info(f"LLM usage of {usage.provider}/{usage.model}: input={usage.input_tokens}, "
+                    f"cached={usage.cached_tokens}, cache_creation={usage.cache_creation_tokens}, "
+                    f"output={usage.output_tokens}")
+        discarded = hedge_discarded.get()
+        if discarded is not None and discarded.is_set():
+            logger.info(f"Usage of {usage.provider} belongs to a discarded hedge request, not charged to the budget.")
+            return
+        consume(usage.input_tokens + usage.output_tokens)
+        job_id = current_job_id()
+        if job_id:
+            JobService.add_llm_usage(job_id, {name: getattr(usage, name) for name in LLMUsage.COUNTERS})
+
+    def _check_result(self, result: str) -> str:
+        if not result or not result.strip():
+            raise LLMEmptyResponseError(f"{self.provider} API returned an empty response", self.provider)
+        return result
+
     def completions(self,
                     messages: List[Dict[str, str]],
                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                    response_schema: Optional[Dict[str, Any]] = None,
                     ) -> str:
-        """Chat with the model.
+        """Chat with the model, retrying transient errors with backoff. Raises LLMError on failure.
+        :param response_schema: 要求按此 JSON Schema 输出，返回 JSON 字符串(不保证通过校验，由调用方校验)
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            call = None
+            try:
+                with self.limiter.slot() as limiter_slot:
+                    call = self._start_call(model)
+                    if response_schema:
+                        result = self._structured_completions(messages, model, response_schema)
+                    else:
+                        result = self._completions(messages=messages, model=model)
+                    result = self._check_result(result)
+                    limiter_slot.output_tokens = self._output_tokens(call)
+            except Exception as e:
+                self._finish_call(call, e)
+                llm_error, delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise llm_error from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._finish_call(call)
+            self.breaker.record_success()
+            return result
+
+    @abstractmethod
+    def _completions(self,
+                     messages: List[Dict[str, str]],
+                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                     ) -> str:
+        """Provider specific chat completion, implemented by subclasses.
+        """
+
+    @staticmethod
+    def schema_messages(messages: List[Dict[str, str]], response_schema: Dict[str, Any]) -> List[Dict[str, str]]:
+        """在 system 提示词末尾追加 JSON Schema 输出要求，用于不支持(或只支持 json_object)结构化输出的供应商"""
+        instruction = ("\n\n### JSON 输出要求：\n只输出一个符合以下 JSON Schema 的 JSON 对象，不要输出 Markdown 或其他内容：\n"
+                       + json.dumps(response_schema, ensure_ascii=False))
+        if messages and messages[0].get("role") == "system":
+            return [{**messages[0], "content": messages[0]["content"] + instruction}] + list(messages[1:])
+        return [{"role": "system", "content": instruction.strip()}] + list(messages)
+
+    def _structured_completions(self,
+                                messages: List[Dict[str, str]],
+                                model: Optional[str] | NotGiven,
+                                response_schema: Dict[str, Any],
+                                ) -> str:
+        """按 JSON Schema 输出，默认通过提示词约束；支持 json_schema/工具调用/format 的供应商在子类中覆盖
+        """
+        return self._completions(messages=self.schema_messages(messages, response_schema), model=model)
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        """Chat with the model asynchronously, sharing the concurrency window and circuit breaker with the sync calls.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            call = None
+            try:
+                async with self.limiter.aslot() as limiter_slot:
+                    call = self._start_call(model)
+                    result = self._check_result(await self._acompletions(messages=messages, model=model))
+                    limiter_slot.output_tokens = self._output_tokens(call)
+            except Exception as e:
+                self._finish_call(call, e)
+                llm_error, delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise llm_error from e
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._finish_call(call)
+            self.breaker.record_success()
+            return result
+
+    async def _acompletions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> str:
+        """Provider specific async completion, falls back to running the sync call in a thread for providers without
+        an async SDK.
+        """
+        return await asyncio.to_thread(self._completions, messages=messages, model=model)
+
+    def _get_async_client(self):
+        """
+        获取异步 SDK 客户端：按事件循环缓存，同一事件循环内的所有异步调用共享连接池
+        （异步连接池绑定创建它的事件循环，不能跨事件循环复用）
+        """
+        loop = asyncio.get_running_loop()
+        if getattr(self, '_async_client_loop', None) is not loop:
+            self._async_client = self._create_async_client()
+            self._async_client_loop = loop
+        return self._async_client
+
+    def _create_async_client(self):
+        """创建异步 SDK 客户端，由支持异步调用的子类实现"""
+        raise NotImplementedError
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        """Chat with the model, yielding the reply incrementally as text deltas.
+        Transient errors are retried only before the first delta, as emitted text cannot be withdrawn.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            started = False
+            call = None
+            try:
+                # 流式调用的耗时还取决于调用方的消费速度，不报告输出 token 数，不参与并发窗口的延迟判断
+                with self.limiter.slot():
+                    call = self._start_call(model, streamed=True)
+                    for delta in self._stream_completions(messages=messages, model=model):
+                        if not started:
+                            started = True
+                            call.first_token()
+                        yield delta
+            except Exception as e:
+                self._finish_call(call, e)
+                llm_error, delay = self._on_failure(e, attempt)
+                if delay is None or started:
+                    raise llm_error from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._finish_call(call)
+            self.breaker.record_success()
+            return
+
+    def _stream_completions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> Iterator[str]:
+        """Provider specific streaming completion, falls back to a single delta for providers without streaming.
         """
+        yield self._completions(messages=messages, model=model)
@@ -1,48 +1,88 @@
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Iterator, Any
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 from biz.llm.client.base import BaseClient
-from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.llm.errors import LLMEmptyResponseError
+from biz.llm.types import NotGiven, NOT_GIVEN, LLMUsage
 from biz.utils.log import logger
 
 
 class DeepSeekClient(BaseClient):
+    provider = 'deepseek'
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         self.base_url = os.getenv("DEEPSEEK_API_BASE_URL", "https://api.deepseek.com")
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url) # DeepSeek supports OpenAI API SDK
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0) # DeepSeek supports OpenAI API SDK
         self.default_model = os.getenv("DEEPSEEK_API_MODEL", "deepseek-chat")
 
-    def completions(self,
-                    messages: List[Dict[str, str]],
-                    model: Optional[str] | NotGiven = NOT_GIVEN,
-                    ) -> str:
-        try:
-            model = model or self.default_model
-            logger.debug(f"Sending request to DeepSeek API. Model: {model}, Messages: {messages}")
-            
-            completion = self.client.chat.completions.create(
-                model=model,
-                messages=messages
-            )
-            
-            if not completion or not completion.choices:
-                logger.error("Empty response from DeepSeek API")
-                return "AI服务返回为空，请稍后重试"
-                
-            return completion.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"DeepSeek API error: {str(e)}")
-            # 检查是否是认证错误
-            if "401" in str(e):
-                return "DeepSeek API认证失败，请检查API密钥是否正确"
-            elif "404" in str(e):
-                return "DeepSeek API接口未找到，请检查API地址是否正确"
-            else:
-                return f"调用DeepSeek API时出错: {str(e)}"
+    def _completions(self,
+                     messages: List[Dict[str, str]],
+                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                     ) -> str:
+        model = model or self.default_model
+        logger.debug(f"Sending request to DeepSeek API. Model: {model}, Messages: {messages}")
+        completion = self.client.chat.completions.create(
+            model=model,
+            messages=messages
+        )
+        if not completion or not completion.choices:
+            raise LLMEmptyResponseError("Empty response from DeepSeek API", self.provider)
+        self._record_usage(LLMUsage.from_openai(self.provider, model, completion.usage))
+        return completion.choices[0].message.content
+
+    def _structured_completions(self,
+                                messages: List[Dict[str, str]],
+                                model: Optional[str] | NotGiven,
+                                response_schema: Dict[str, Any],
+                                ) -> str:
+        # DeepSeek 只支持 json_object，Schema 通过提示词约束
+        model = model or self.default_model
+        completion = self.client.chat.completions.create(
+            model=model,
+            messages=self.schema_messages(messages, response_schema),
+            response_format={"type": "json_object"},
+        )
+        if not completion or not completion.choices:
+            raise LLMEmptyResponseError("Empty response from DeepSeek API", self.provider)
+        self._record_usage(LLMUsage.from_openai(self.provider, model, completion.usage))
+        return completion.choices[0].message.content
+
+    def _create_async_client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+
+    async def _acompletions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> str:
+        model = model or self.default_model
+        completion = await self._get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+        )
+        self._record_usage(LLMUsage.from_openai(self.provider, model, completion.usage))
+        return completion.choices[0].message.content
+
+    def _stream_completions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> Iterator[str]:
+        model = model or self.default_model
+        logger.debug(f"Sending streaming request to DeepSeek API. Model: {model}, Messages: {messages}")
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                # 开启 include_usage 后，最后一个分片携带整个请求的 token 用量
+                self._record_usage(LLMUsage.from_openai(self.provider, model, chunk.usage))
@@ -1,22 +1,153 @@
 import os
 import re
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Iterator, Any
 
 from ollama import ChatResponse
-from ollama import Client
+from ollama import Client, AsyncClient
 
 from biz.llm.client.base import BaseClient
-from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.llm.limiter import get_limiter, AdaptiveLimiter
+from biz.llm.types import NotGiven, NOT_GIVEN, LLMUsage
+from biz.utils.log import logger
+from biz.utils.token_util import count_tokens, truncate_text_by_tokens
+
+
+class ThinkTagFilter:
+    """
+    流式输出中增量去除<think>...</think>思考内容，与 OllamaClient._extract_content 的处理保持一致：
+    - 思考内容不输出，标签被拆分在多个分片中时也能识别
+    - 尚未输出正文时遇到没有起始标签的</think>，丢弃其之前的内容；
+      若模型模板预置了起始标签、且思考内容已经开始输出，则无法识别，此类模型请关闭流式 Review
+    - 思考链被截断(没有结束标签)且没有输出任何正文时，返回 "COT ABORT!"
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self._thinking = False
+        self._emitted = False
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """text 末尾可能是 tag 前缀的长度，这部分需要等待后续分片"""
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:length]):
+                return length
+        return 0
+
+    def feed(self, delta: str) -> str:
+        """输入一段增量内容，返回可以输出的正文增量"""
+        self._buffer += delta
+        output = []
+        while self._buffer:
+            if self._thinking:
+                index = self._buffer.find(self.CLOSE_TAG)
+                if index < 0:
+                    keep = self._partial_tag_length(self._buffer, self.CLOSE_TAG)
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                self._buffer = self._buffer[index + len(self.CLOSE_TAG):]
+                self._thinking = False
+                continue
+            open_index = self._buffer.find(self.OPEN_TAG)
+            close_index = self._buffer.find(self.CLOSE_TAG)
+            if not self._emitted and not output and close_index >= 0 and (open_index < 0 or close_index < open_index):
+                self._buffer = self._buffer[close_index + len(self.CLOSE_TAG):]
+                continue
+            if open_index >= 0:
+                output.append(self._buffer[:open_index])
+                self._buffer = self._buffer[open_index + len(self.OPEN_TAG):]
+                self._thinking = True
+                continue
+            keep = max(self._partial_tag_length(self._buffer, self.OPEN_TAG),
+                       self._partial_tag_length(self._buffer, self.CLOSE_TAG))
+            output.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return self._emit("".join(output))
+
+    def finish(self) -> str:
+        """输入结束，返回剩余的正文"""
+        if self._thinking:
+            self._buffer = ""
+            return "" if self._emitted else "COT ABORT!"
+        rest, self._buffer = self._buffer, ""
+        return self._emit(rest)
+
+    def _emit(self, text: str) -> str:
+        if not self._emitted:
+            text = text.lstrip()
+        if text:
+            self._emitted = True
+        return text
 
 
 class OllamaClient(BaseClient):
+    provider = 'ollama'
+
     def __init__(self, api_key: str = None):
-        self.default_model = self.default_model = os.getenv("OLLAMA_API_MODEL", "deepseek-r1-8k:14b")
+        self.default_model = os.getenv("OLLAMA_API_MODEL", "deepseek-r1-8k:14b")
         self.base_url = os.getenv("OLLAMA_API_BASE_URL", "http://127.0.0.1:11434")
         self.client = Client(
             host=self.base_url,
         )
 
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        """
+        并发上限由 Ollama 服务端的 OLLAMA_NUM_PARALLEL 按 Worker 进程数(WORKER_POOL_SIZE)均分，每个进程至少 1，
+        超出的请求在本地排队，而不是堆积在服务端。限制器只在进程内生效：WORKER_POOL_SIZE 大于 OLLAMA_NUM_PARALLEL 时
+        同时发往 Ollama 的请求数最多为 WORKER_POOL_SIZE；多个节点共用一个 Ollama 服务时，
+        OLLAMA_NUM_PARALLEL 应配置为本节点分得的份额
+        """
+        parallel = float(os.getenv("OLLAMA_NUM_PARALLEL", 1))
+        pool_size = max(1, int(os.getenv("WORKER_POOL_SIZE", 4)))
+        return get_limiter(self.provider, self.base_url, max_limit=max(1.0, parallel // pool_size))
+
+    @staticmethod
+    def _keep_alive():
+        """模型在显存/内存中的保留时间，如 30m；-1 表示常驻不卸载"""
+        keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+        try:
+            return float(keep_alive)
+        except ValueError:
+            return keep_alive
+
+    @staticmethod
+    def _options() -> dict:
+        """
+        所有进程、所有调用(包括预加载)使用同一个固定的 num_ctx(OLLAMA_NUM_CTX)，
+        num_ctx 变化会导致 Ollama 重新加载模型，因此不按提示词长度调整
+        """
+        return {"num_ctx": int(os.getenv("OLLAMA_NUM_CTX", 16384))}
+
+    def _fit_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        提示词加上预留的输出 token 数(OLLAMA_OUTPUT_RESERVE_TOKENS)超过 num_ctx 时，截断最后一条消息(代码变更位于末尾)，
+        避免 Ollama 在上下文之外静默截断提示词开头的 system 指令
+        """
+        budget = self._options()["num_ctx"] - int(os.getenv("OLLAMA_OUTPUT_RESERVE_TOKENS", 2048))
+        tokens = [count_tokens(str(message.get("content", ""))) for message in messages]
+        if not messages or sum(tokens) <= budget:
+            return messages
+        remaining = max(budget - sum(tokens[:-1]), 1)
+        logger.warning(f"Ollama prompt requires {sum(tokens)} tokens, exceeding num_ctx minus output reserve "
+                       f"({budget}), the last message is truncated to {remaining} tokens.")
+        last = messages[-1]
+        return list(messages[:-1]) + [{**last, "content": truncate_text_by_tokens(str(last.get("content", "")),
+                                                                                  remaining)}]
+
+    def warm_up(self):
+        """预加载模型并按 OLLAMA_KEEP_ALIVE 常驻，避免稀疏的 Review 之间模型被卸载，每次都要冷启动加载"""
+        model = self.default_model
+        try:
+            # messages 为空时 Ollama 只加载模型，不做推理
+            self.client.chat(model, [], keep_alive=self._keep_alive(), options=self._options())
+            logger.info(f"Ollama model {model} preloaded (keep_alive={self._keep_alive()}).")
+        except Exception as e:
+            logger.warning(f"Ollama model {model} preload failed: {e}")
+
     def _extract_content(self, content: str) -> str:
         """
         从内容中提取<think>...</think>标签之外的部分。
@@ -36,10 +167,61 @@ class OllamaClient(BaseClient):
             return re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL).strip()
         return content
 
-    def completions(self,
-                    messages: List[Dict[str, str]],
-                    model: Optional[str] | NotGiven = NOT_GIVEN,
-                    ) -> str:
-        response: ChatResponse = self.client.chat(model or self.default_model, messages)
+    def _usage(self, response: ChatResponse) -> LLMUsage:
+        return LLMUsage(provider=self.provider, model=response.get('model') or self.default_model,
+                        input_tokens=response.get('prompt_eval_count') or 0,
+                        output_tokens=response.get('eval_count') or 0)
+
+    def _completions(self,
+                     messages: List[Dict[str, str]],
+                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                     ) -> str:
+        messages = self._fit_messages(messages)
+        response: ChatResponse = self.client.chat(model or self.default_model, messages,
+                                                  keep_alive=self._keep_alive(), options=self._options())
+        self._record_usage(self._usage(response))
         content = response['message']['content']
         return self._extract_content(content)
+
+    def _structured_completions(self,
+                                messages: List[Dict[str, str]],
+                                model: Optional[str] | NotGiven,
+                                response_schema: Dict[str, Any],
+                                ) -> str:
+        # format 传入 JSON Schema 时按 Schema 约束解码
+        messages = self._fit_messages(messages)
+        response: ChatResponse = self.client.chat(model or self.default_model, messages, format=response_schema,
+                                                  keep_alive=self._keep_alive(), options=self._options())
+        self._record_usage(self._usage(response))
+        return self._extract_content(response['message']['content'])
+
+    def _create_async_client(self) -> AsyncClient:
+        return AsyncClient(host=self.base_url)
+
+    async def _acompletions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> str:
+        messages = self._fit_messages(messages)
+        response: ChatResponse = await self._get_async_client().chat(model or self.default_model, messages,
+                                                                     keep_alive=self._keep_alive(),
+                                                                     options=self._options())
+        self._record_usage(self._usage(response))
+        return self._extract_content(response['message']['content'])
+
+    def _stream_completions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> Iterator[str]:
+        think_filter = ThinkTagFilter()
+        messages = self._fit_messages(messages)
+        for chunk in self.client.chat(model or self.default_model, messages, stream=True,
+                                      keep_alive=self._keep_alive(), options=self._options()):
+            text = think_filter.feed(chunk['message']['content'] or '')
+            if text:
+                yield text
+            if chunk.get('done'):
+                self._record_usage(self._usage(chunk))
+        rest = think_filter.finish()
+        if rest:
+            yield rest
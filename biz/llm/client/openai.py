@@ -1,29 +1,82 @@
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Iterator, Any
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 from biz.llm.client.base import BaseClient
-from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.llm.types import NotGiven, NOT_GIVEN, LLMUsage
 
 
 class OpenAIClient(BaseClient):
+    provider = 'openai'
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.base_url = os.getenv("OPENAI_API_BASE_URL", "https://api.openai.com")
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
         self.default_model = os.getenv("OPENAI_API_MODEL", "gpt-4o-mini")
 
-    def completions(self,
-                    messages: List[Dict[str, str]],
-                    model: Optional[str] | NotGiven = NOT_GIVEN,
-                    ) -> str:
+    def _completions(self,
+                     messages: List[Dict[str, str]],
+                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                     ) -> str:
+        model = model or self.default_model
+        completion = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+        )
+        self._record_usage(LLMUsage.from_openai(self.provider, model, completion.usage))
+        return completion.choices[0].message.content
+
+    def _structured_completions(self,
+                                messages: List[Dict[str, str]],
+                                model: Optional[str] | NotGiven,
+                                response_schema: Dict[str, Any],
+                                ) -> str:
         model = model or self.default_model
         completion = self.client.chat.completions.create(
             model=model,
             messages=messages,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": response_schema.get("title", "response"), "schema": response_schema},
+            },
+        )
+        self._record_usage(LLMUsage.from_openai(self.provider, model, completion.usage))
+        return completion.choices[0].message.content
+
+    def _create_async_client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+
+    async def _acompletions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> str:
+        model = model or self.default_model
+        completion = await self._get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
         )
+        self._record_usage(LLMUsage.from_openai(self.provider, model, completion.usage))
         return completion.choices[0].message.content
+
+    def _stream_completions(self,
+                            messages: List[Dict[str, str]],
+                            model: Optional[str] | NotGiven = NOT_GIVEN,
+                            ) -> Iterator[str]:
+        model = model or self.default_model
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage:
+                # 开启 include_usage 后，最后一个分片携带整个请求的 token 用量
+                self._record_usage(LLMUsage.from_openai(self.provider, model, chunk.usage))
@@ -0,0 +1,263 @@
+"""
+多供应商路由：对冲请求与基于延迟的故障转移
+
+按 LLM_PROVIDERS 的顺序依次选择供应商：
+- 主供应商超过其近期 p95 延迟仍未返回时，向下一个供应商发出对冲请求，采用最先成功返回的结果，取消其余请求
+- 供应商调用失败时立即转移到下一个供应商
+- 近期暂时性错误(超时、限流、5xx 等)的比例达到 LLM_EJECT_ERROR_RATE 的供应商被摘除 LLM_EJECT_SECONDS 秒，期间不再参与路由
+
+同步调用无法中断，落选的对冲请求会继续执行完毕，占用该供应商的并发名额并产生实际费用(最多为单次调用的两倍)，
+其用量记录在调用指标中，但不计入项目的 token 预算及任务用量；异步调用的落选请求会被立即取消。
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Iterator, Tuple, Any
+
+from biz.llm.client.base import BaseClient, hedge_discarded
+from biz.llm.errors import LLMError
+from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.utils.log import logger
+
+
+class ProviderHealth:
+    """单个供应商的近期延迟及成功率统计（线程安全）"""
+
+    def __init__(self, name: str, window: int = 50, min_samples: int = 10, error_rate: float = 0.5,
+                 eject_seconds: float = 60, default_delay: float = 60):
+        self.name = name
+        self.min_samples = min_samples
+        self.error_rate = error_rate
+        self.eject_seconds = eject_seconds
+        self.default_delay = default_delay
+        self.ejected_until = 0.0
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return time.time() >= self.ejected_until
+
+    def record(self, success: bool, latency: float = None):
+        with self._lock:
+            self._outcomes.append(success)
+            if success and latency is not None:
+                self._latencies.append(latency)
+            if len(self._outcomes) < self.min_samples:
+                return
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self.ejected_until = time.time() + self.eject_seconds
+                # 重新接入后按新的调用结果重新统计
+                self._outcomes.clear()
+                logger.warning(f"LLM provider {self.name} ejected for {self.eject_seconds:.0f}s "
+                               f"({failures} failures in recent calls).")
+
+    def hedge_delay(self) -> float:
+        """对冲等待时间：近期成功调用延迟的 p95，样本不足时使用默认值"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_delay
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            outcomes = list(self._outcomes)
+        return {
+            'available': self.available(),
+            'hedge_delay': round(self.hedge_delay(), 2),
+            'error_rate': round(outcomes.count(False) / len(outcomes), 4) if outcomes else 0.0,
+        }
+
+
+class RoutingClient(BaseClient):
+    """在多个供应商之间对冲、故障转移的组合 Client，各供应商仍使用各自的并发窗口"""
+
+    provider = 'routing'
+
+    def __init__(self, clients: List[Tuple[str, BaseClient]]):
+        if not clients:
+            raise ValueError("RoutingClient requires at least one provider")
+        self.clients = clients
+        self.default_model = ','.join(f"{name}:{getattr(client, 'default_model', '')}" for name, client in clients)
+        self.health = {
+            name: ProviderHealth(
+                name,
+                window=int(os.getenv('LLM_HEALTH_WINDOW', 50)),
+                min_samples=int(os.getenv('LLM_HEALTH_MIN_SAMPLES', 10)),
+                error_rate=float(os.getenv('LLM_EJECT_ERROR_RATE', 0.5)),
+                eject_seconds=float(os.getenv('LLM_EJECT_SECONDS', 60)),
+                default_delay=float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', 60)),
+            )
+            for name, _ in clients
+        }
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_HEDGE_THREADS', 16)),
+                                            thread_name_prefix='llm-hedge')
+
+    def warm_up(self):
+        for _, client in self.clients:
+            client.warm_up()
+
+    def _candidates(self) -> List[Tuple[str, BaseClient]]:
+        """按配置顺序排列的可用(未被摘除、未熔断)供应商；全部不可用时仍按原顺序尝试，避免所有请求直接失败"""
+        available = [(name, client) for name, client in self.clients
+                     if self.health[name].available() and client.breaker.allows()]
+        return available or list(self.clients)
+
+    def _model_for(self, name: str, model: Optional[str] | NotGiven) -> Optional[str] | NotGiven:
+        """指定的模型名仅对配置中的第一个(主)供应商有效，其余供应商使用各自配置的模型"""
+        return model if name == self.clients[0][0] else NOT_GIVEN
+
+    def _record_failure(self, name: str, error: Exception):
+        """只有暂时性错误计入供应商的错误率，认证失败、请求错误等与供应商的健康状况无关"""
+        if isinstance(error, LLMError) and error.transient:
+            self.health[name].record(False)
+
+    def _call(self, name: str, client: BaseClient, messages: List[Dict[str, str]],
+              model: Optional[str] | NotGiven, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        start = time.time()
+        try:
+            result = client.completions(messages=messages, model=model, response_schema=response_schema)
+        except Exception as e:
+            self._record_failure(name, e)
+            raise
+        self.health[name].record(True, time.time() - start)
+        return result
+
+    def completions(self,
+                    messages: List[Dict[str, str]],
+                    model: Optional[str] | NotGiven = NOT_GIVEN,
+                    response_schema: Optional[Dict[str, Any]] = None,
+                    ) -> str:
+        candidates = self._candidates()
+        pending = {}
+        discarded = {}
+        last_error = None
+
+        def launch():
+            name, client = candidates.pop(0)
+            # 在当前上下文的副本中执行，保留当前任务等信息
+            context = contextvars.copy_context()
+            discarded_event = threading.Event()
+            context.run(hedge_discarded.set, discarded_event)
+            future = self._executor.submit(context.run, self._call, name, client, messages,
+                                           self._model_for(name, model), response_schema)
+            pending[future] = name
+            discarded[future] = discarded_event
+            return name
+
+        primary = launch()
+        hedge_delay = self.health[primary].hedge_delay()
+        while pending:
+            done, _ = wait(pending, timeout=hedge_delay if candidates else None, return_when=FIRST_COMPLETED)
+            if not done:
+                name = launch()
+                logger.info(f"LLM provider {primary} slower than {hedge_delay:.1f}s, hedging to {name}.")
+                hedge_delay = self.health[name].hedge_delay()
+                continue
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"LLM provider {name} failed: {e}")
+                    continue
+                # 同步 SDK 调用无法中断，已在执行的请求由线程池继续执行完毕，结果仅用于更新延迟统计，用量不计入预算
+                for other in pending:
+                    other.cancel()
+                    discarded[other].set()
+                return result
+            if not pending and candidates:
+                launch()
+        raise last_error
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        candidates = self._candidates()
+        pending = {}
+        last_error = None
+
+        async def call(name: str, client: BaseClient, call_model) -> str:
+            start = time.time()
+            try:
+                result = await client.acompletions(messages=messages, model=call_model)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record_failure(name, e)
+                raise
+            self.health[name].record(True, time.time() - start)
+            return result
+
+        def launch():
+            name, client = candidates.pop(0)
+            task = asyncio.ensure_future(call(name, client, self._model_for(name, model)))
+            pending[task] = name
+            return name
+
+        primary = launch()
+        hedge_delay = self.health[primary].hedge_delay()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay if candidates else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    name = launch()
+                    logger.info(f"LLM provider {primary} slower than {hedge_delay:.1f}s, hedging to {name}.")
+                    hedge_delay = self.health[name].hedge_delay()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        logger.warning(f"LLM provider {name} failed: {last_error}")
+                        continue
+                    return task.result()
+                if not pending and candidates:
+                    launch()
+            raise last_error
+        finally:
+            # 异步请求可以真正取消，落选的请求立即释放连接及并发名额
+            for task in pending:
+                task.cancel()
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        """流式调用不做对冲（已输出的内容无法撤回），仅在首个分片返回前失败时转移到下一个供应商"""
+        last_error = None
+        for name, client in self._candidates():
+            start = time.time()
+            started = False
+            try:
+                for delta in client.stream_completions(messages=messages, model=self._model_for(name, model)):
+                    started = True
+                    yield delta
+            except Exception as e:
+                self._record_failure(name, e)
+                if started:
+                    raise
+                last_error = e
+                logger.warning(f"LLM provider {name} failed: {e}")
+                continue
+            self.health[name].record(True, time.time() - start)
+            return
+        raise last_error
+
+    def _completions(self,
+                     messages: List[Dict[str, str]],
+                     model: Optional[str] | NotGiven = NOT_GIVEN,
+                     ) -> str:
+        return self.completions(messages=messages, model=model)
+
+    def stats(self) -> dict:
+        return {name: self.health[name].stats() for name, _ in self.clients}
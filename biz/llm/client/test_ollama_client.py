@@ -0,0 +1,55 @@
+import os
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.client.ollama_client import ThinkTagFilter, OllamaClient
+
+
+def _stream(text: str, size: int) -> str:
+    think_filter = ThinkTagFilter()
+    output = ''.join(think_filter.feed(text[i:i + size]) for i in range(0, len(text), size))
+    return output + think_filter.finish()
+
+
+class TestThinkTagFilter(TestCase):
+    def test_think_block_removed_across_chunk_boundaries(self):
+        text = '<think>先分析一下 diff</think>\n\n### 问题\n总分:80分'
+        for size in range(1, 10):
+            self.assertEqual(_stream(text, size), '### 问题\n总分:80分')
+
+    def test_think_block_in_middle_removed(self):
+        self.assertEqual(_stream('结论 <think>草稿</think>正文', 3), '结论 正文')
+
+    def test_unclosed_think_block_aborted(self):
+        self.assertEqual(_stream('<think>思考被截断', 4), 'COT ABORT!')
+
+    def test_plain_text_passed_through(self):
+        self.assertEqual(_stream('a < b and c > d', 2), 'a < b and c > d')
+
+
+@patch.dict(os.environ, {'OLLAMA_NUM_CTX': '8192', 'OLLAMA_OUTPUT_RESERVE_TOKENS': '1000'})
+class TestOllamaClient(TestCase):
+    @patch('biz.llm.client.ollama_client.count_tokens', side_effect=len)
+    def test_fixed_num_ctx_and_prompt_truncated_to_fit(self, _):
+        """测试所有调用使用同一个 num_ctx，超长的提示词截断最后一条消息而不是调大 num_ctx"""
+        client = OllamaClient()
+        self.assertEqual(client._options(), {'num_ctx': 8192})
+        short = [{'role': 'system', 'content': 's' * 100}, {'role': 'user', 'content': 'd' * 1000}]
+        self.assertIs(client._fit_messages(short), short)
+        long = [{'role': 'system', 'content': 's' * 100}, {'role': 'user', 'content': 'd' * 20000}]
+        with patch('biz.llm.client.ollama_client.truncate_text_by_tokens', side_effect=lambda text, n: text[:n]):
+            fitted = client._fit_messages(long)
+        self.assertEqual(fitted[0], long[0])
+        self.assertEqual(len(fitted[1]['content']), 8192 - 1000 - 100)
+
+    @patch.dict(os.environ, {'OLLAMA_NUM_PARALLEL': '8', 'WORKER_POOL_SIZE': '4'})
+    def test_concurrency_capped_by_server_parallelism(self):
+        """测试服务端并发数按 Worker 进程数均分，每个进程至少 1"""
+        with patch.dict(os.environ, {'OLLAMA_API_BASE_URL': 'http://ollama-test:11434'}):
+            self.assertEqual(OllamaClient().limiter.max_limit, 2)
+        with patch.dict(os.environ, {'OLLAMA_API_BASE_URL': 'http://ollama-small:11434', 'OLLAMA_NUM_PARALLEL': '2'}):
+            self.assertEqual(OllamaClient().limiter.max_limit, 1)
+
+
+if __name__ == '__main__':
+    main()
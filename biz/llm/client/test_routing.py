@@ -0,0 +1,97 @@
+import asyncio
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.client.base import BaseClient
+from biz.llm.client.routing import RoutingClient
+from biz.llm.errors import LLMAuthError
+from biz.llm.types import NOT_GIVEN, LLMUsage
+
+
+class FakeClient(BaseClient):
+    def __init__(self, name: str, delay: float = 0.0, error: Exception = None):
+        self.provider = f'fake-{name}'
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.models = []
+
+    def _completions(self, messages, model=None) -> str:
+        self.calls += 1
+        self.models.append(model)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self._record_usage(LLMUsage(provider=self.provider, model=str(model), input_tokens=10, output_tokens=1))
+        return self.name
+
+    async def _acompletions(self, messages, model=None) -> str:
+        self.calls += 1
+        self.models.append(model)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.name
+
+
+@patch.dict('os.environ', {'LLM_METRICS_ENABLED': '0'})
+class TestRoutingClient(TestCase):
+    messages = [{'role': 'user', 'content': 'hi'}]
+
+    @patch.dict('os.environ', {'LLM_HEDGE_DEFAULT_DELAY': '0.05'})
+    def test_hedges_to_secondary_when_primary_is_slow(self):
+        """测试主供应商超过对冲等待时间后采用备用供应商的结果"""
+        slow, fast = FakeClient('slow', delay=0.3), FakeClient('fast')
+        client = RoutingClient([('slow', slow), ('fast', fast)])
+        start = time.time()
+        self.assertEqual(client.completions(self.messages), 'fast')
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual(asyncio.run(client.acompletions(self.messages)), 'fast')
+        client._executor.shutdown(wait=True)
+
+    @patch.dict('os.environ', {'LLM_HEDGE_DEFAULT_DELAY': '0.05'})
+    @patch('biz.llm.client.base.consume')
+    def test_discarded_hedge_not_charged_to_budget(self, consume):
+        """测试落选的对冲请求执行完毕后，其用量不计入 token 预算"""
+        slow, fast = FakeClient('slow', delay=0.3), FakeClient('fast')
+        client = RoutingClient([('slow', slow), ('fast', fast)])
+        self.assertEqual(client.completions(self.messages), 'fast')
+        client._executor.shutdown(wait=True)
+        self.assertEqual(slow.calls, 1)
+        consume.assert_called_once_with(11)
+
+    @patch.dict('os.environ', {'LLM_HEALTH_MIN_SAMPLES': '2', 'LLM_EJECT_SECONDS': '60', 'LLM_MAX_RETRIES': '0'})
+    def test_failing_provider_is_ejected(self):
+        """测试失败时立即转移，暂时性错误率超过阈值的供应商被摘除"""
+        broken, healthy = FakeClient('broken', error=ConnectionError('boom')), FakeClient('healthy')
+        client = RoutingClient([('broken', broken), ('healthy', healthy)])
+        for _ in range(3):
+            self.assertEqual(client.completions(self.messages), 'healthy')
+        self.assertEqual(broken.calls, 2)
+        self.assertFalse(client.stats()['broken']['available'])
+        self.assertEqual(''.join(client.stream_completions(self.messages)), 'healthy')
+
+    @patch.dict('os.environ', {'LLM_HEALTH_MIN_SAMPLES': '2'})
+    def test_non_transient_errors_do_not_eject_provider(self):
+        """测试认证失败等非暂时性错误只转移，不计入错误率"""
+        rejected, healthy = FakeClient('rejected', error=LLMAuthError('invalid key')), FakeClient('healthy')
+        client = RoutingClient([('rejected', rejected), ('healthy', healthy)])
+        for _ in range(3):
+            self.assertEqual(client.completions(self.messages), 'healthy')
+        self.assertTrue(client.stats()['rejected']['available'])
+        self.assertEqual(client.stats()['rejected']['error_rate'], 0.0)
+
+    def test_failover_does_not_pass_primary_model(self):
+        """测试主供应商在对冲前失败转移时，备用供应商使用自己配置的模型"""
+        broken, healthy = FakeClient('broken', error=RuntimeError('boom')), FakeClient('healthy')
+        client = RoutingClient([('broken', broken), ('healthy', healthy)])
+        self.assertEqual(client.completions(self.messages, model='primary-model'), 'healthy')
+        self.assertEqual(asyncio.run(client.acompletions(self.messages, model='primary-model')), 'healthy')
+        self.assertEqual(broken.models, ['primary-model', 'primary-model'])
+        self.assertEqual(healthy.models, [NOT_GIVEN, NOT_GIVEN])
+
+
+if __name__ == '__main__':
+    main()
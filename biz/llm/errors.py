@@ -0,0 +1,91 @@
+"""
+LLM 调用的错误类型
+
+各 SDK 的异常统一转换为以下类型，调用方据此判断能否重试，不再依赖异常信息的字符串匹配：
+- LLMTransientError: 超时、连接失败、429、5xx 等可重试的错误，LLMRateLimitError 为其中的 429
+- LLMAuthError: 认证失败(401/403)
+- LLMBadRequestError: 请求本身有误(400/404/422 等)，重试无意义
+- LLMEmptyResponseError: 供应商返回空结果
+- LLMCircuitOpenError: 供应商熔断中，调用被直接拒绝
+"""
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from biz.llm.limiter import status_code_of
+
+
+class LLMError(Exception):
+    """LLM 调用失败"""
+    transient = False
+
+    def __init__(self, message: str, provider: str = '', status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMTransientError(LLMError):
+    transient = True
+
+
+class LLMRateLimitError(LLMTransientError):
+    pass
+
+
+class LLMEmptyResponseError(LLMTransientError):
+    pass
+
+
+class LLMAuthError(LLMError):
+    pass
+
+
+class LLMBadRequestError(LLMError):
+    pass
+
+
+class LLMCircuitOpenError(LLMError):
+    pass
+
+
+# 没有 HTTP 状态码时，按异常类名判断是否为超时、连接类的可重试错误(兼容 httpx、requests 及各 SDK 的封装)
+_TRANSIENT_NAME_MARKERS = ('Timeout', 'Connection', 'RemoteProtocol', 'ReadError')
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """从响应头 Retry-After 中解析建议的重试间隔(秒)，支持秒数及 HTTP 日期两种格式"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(provider: str, error: BaseException) -> LLMError:
+    """将 SDK 异常转换为对应的 LLMError"""
+    if isinstance(error, LLMError):
+        return error
+    status_code = status_code_of(error)
+    message = f"{provider} API error: {error}"
+    if status_code == 429:
+        return LLMRateLimitError(message, provider, status_code, retry_after_of(error))
+    if status_code in (401, 403):
+        return LLMAuthError(message, provider, status_code)
+    if status_code is not None and (status_code >= 500 or status_code in (408, 409)):
+        return LLMTransientError(message, provider, status_code, retry_after_of(error))
+    if status_code is not None and status_code >= 400:
+        return LLMBadRequestError(message, provider, status_code)
+    if isinstance(error, (TimeoutError, ConnectionError)) or any(
+            marker in cls.__name__ for cls in type(error).__mro__ for marker in _TRANSIENT_NAME_MARKERS):
+        return LLMTransientError(message, provider)
+    return LLMError(message, provider, status_code)
@@ -1,4 +1,6 @@
 import os
+import threading
+from typing import List, Tuple
 
 from biz.llm.client.base import BaseClient
 from biz.llm.client.anthropic import AnthropicClient
@@ -6,25 +8,99 @@ from biz.llm.client.deepseek import DeepSeekClient
 from biz.llm.client.ollama_client import OllamaClient
 from biz.llm.client.openai import OpenAIClient
 from biz.llm.client.qwen import QwenClient
+from biz.llm.client.routing import RoutingClient
 from biz.llm.client.zhipuai import ZhipuAIClient
+from biz.llm.types import NotGiven, NOT_GIVEN
+from biz.utils.diff_allocator import change_path, risky_path_pattern
 from biz.utils.log import logger
+from biz.utils.token_util import count_tokens
+
+MODEL_TIER_FAST = 'fast'
+MODEL_TIER_STRONG = 'strong'
+# 默认的低风险文件类型：文档及配置
+DEFAULT_LOW_RISK_EXTENSIONS = '.md,.txt,.rst,.yml,.yaml,.json,.css'
+
+
+def _csv_env(name: str, default: str) -> List[str]:
+    return [item.strip().lower() for item in os.getenv(name, default).split(',') if item.strip()]
 
 
 class Factory:
+    # 按 (进程, 供应商) 缓存 Client，常驻 Worker 进程内复用连接池
+    _clients = {}
+    _lock = threading.Lock()
+
     @staticmethod
     def getClient(provider: str = None) -> BaseClient:
+        if provider is None and len(Factory.routing_providers()) > 1:
+            provider = 'routing'
         provider = provider or os.getenv("LLM_PROVIDER", "anthropic")
+        cache_key = (os.getpid(), provider)
+        client = Factory._clients.get(cache_key)
+        if client is not None:
+            return client
+
         chat_model_providers = {
             'anthropic': lambda: AnthropicClient(),
             'zhipuai': lambda: ZhipuAIClient(),
             'openai': lambda: OpenAIClient(),
             'deepseek': lambda: DeepSeekClient(),
             'qwen': lambda: QwenClient(),
-            'ollama': lambda: OllamaClient()
+            'ollama': lambda: OllamaClient(),
+            'routing': lambda: RoutingClient([(name, Factory.getClient(name)) for name in Factory.routing_providers()])
         }
 
         provider_func = chat_model_providers.get(provider)
         if provider_func:
-            return provider_func()
+            if provider == 'routing':
+                # 子供应商的 Client 同样经 getClient 缓存，不能在持有锁时创建
+                client = provider_func()
+                return Factory._clients.setdefault(cache_key, client)
+            with Factory._lock:
+                client = Factory._clients.get(cache_key)
+                if client is None:
+                    client = provider_func()
+                    Factory._clients[cache_key] = client
+            return client
         else:
             raise Exception(f'Unknown chat model provider: {provider}')
+
+    @staticmethod
+    def routing_providers() -> list:
+        """LLM_PROVIDERS 配置的多个供应商(按优先级排列)，配置多个时所有调用经 RoutingClient 对冲及故障转移"""
+        return [name.strip() for name in os.getenv("LLM_PROVIDERS", "").split(',') if name.strip()]
+
+    @staticmethod
+    def review_model_tier(changes: list, tokens: int) -> Tuple[str, str]:
+        """
+        按 diff 规模及风险选择 Review 的模型档位，返回 (档位, 原因)：
+        - 涉及 MODEL_ROUTING_RISKY_PATTERNS(正则，匹配文件路径)的变更，或超过 MODEL_ROUTING_LARGE_DIFF_TOKENS 的大变更使用强模型
+        - 不超过 MODEL_ROUTING_SMALL_DIFF_TOKENS 的小变更，或只涉及 MODEL_ROUTING_LOW_RISK_EXTENSIONS 文件类型的变更使用快速模型
+        - 其余使用强模型
+        """
+        paths = [change_path(change).lower() for change in changes]
+        risky_pattern = risky_path_pattern()
+        risky_paths = [path for path in paths if risky_pattern.search(path)]
+        if risky_paths:
+            return MODEL_TIER_STRONG, f"risky paths: {', '.join(risky_paths[:3])}"
+        if tokens > int(os.getenv('MODEL_ROUTING_LARGE_DIFF_TOKENS', 6000)):
+            return MODEL_TIER_STRONG, f"large diff: {tokens} tokens"
+        if tokens <= int(os.getenv('MODEL_ROUTING_SMALL_DIFF_TOKENS', 1500)):
+            return MODEL_TIER_FAST, f"small diff: {tokens} tokens"
+        low_risk_extensions = _csv_env('MODEL_ROUTING_LOW_RISK_EXTENSIONS', DEFAULT_LOW_RISK_EXTENSIONS)
+        if paths and all(os.path.splitext(path)[1] in low_risk_extensions for path in paths):
+            return MODEL_TIER_FAST, 'low-risk file types only'
+        return MODEL_TIER_STRONG, f"medium diff: {tokens} tokens"
+
+    @staticmethod
+    def review_model(changes: list) -> str | NotGiven:
+        """
+        开启 MODEL_ROUTING_ENABLED 时按 review_model_tier 选择模型：快速档位使用 MODEL_ROUTING_FAST_MODEL，
+        强模型档位使用 MODEL_ROUTING_STRONG_MODEL；未开启或对应档位未配置模型时返回 NOT_GIVEN，即使用供应商配置的 *_API_MODEL
+        """
+        if os.getenv('MODEL_ROUTING_ENABLED', '0') != '1':
+            return NOT_GIVEN
+        tier, reason = Factory.review_model_tier(changes, count_tokens(str(changes)))
+        model = os.getenv('MODEL_ROUTING_FAST_MODEL' if tier == MODEL_TIER_FAST else 'MODEL_ROUTING_STRONG_MODEL', '')
+        logger.info(f"Model routing: tier={tier} ({reason}), model={model or 'default'}")
+        return model or NOT_GIVEN
@@ -0,0 +1,177 @@
+"""
+LLM 调用自适应并发限制
+
+每个 (供应商, base_url) 共享一个 AIMD 并发窗口：调用成功时窗口加性增长，
+遇到 429/503 或每个输出 token 的延迟明显升高时窗口乘性收缩；超出窗口的调用排队等待而不是直接失败。
+Review、初筛、合并等调用的输出长度差别很大，延迟按输出 token 数归一化后再比较；
+未报告输出 token 数的调用(流式调用、失败的调用)不参与延迟判断。
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional
+
+from biz.utils.log import logger
+
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """从各 SDK 的异常中提取 HTTP 状态码"""
+    for attr in ('status_code', 'http_status', 'status'):
+        code = getattr(error, attr, None)
+        if isinstance(code, int):
+            return code
+    response = getattr(error, 'response', None)
+    code = getattr(response, 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+class LimiterSlot:
+    """一次调用占用的并发名额，调用方拿到响应后填写输出 token 数，用于按输出 token 归一化延迟"""
+
+    def __init__(self):
+        self.output_tokens = 0
+
+
+class AdaptiveLimiter:
+    """AIMD 并发限制器（线程安全）"""
+
+    def __init__(self, name: str, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 32,
+                 backoff_ratio: float = 0.5, latency_tolerance: float = 2.0):
+        self.name = name
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.waiting = 0
+        # 每个输出 token 延迟的短期/长期指数滑动平均，短期明显高于长期时视为服务端开始拥塞
+        self._short_latency = None
+        self._long_latency = None
+        # 单次调用耗时的滑动平均，作为连续收缩的合并窗口
+        self._call_latency = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    self._cond.wait()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """不等待地尝试占用一个并发名额"""
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, throttled: bool = False, output_tokens: int = 0):
+        """
+        归还名额并调整窗口
+        :param output_tokens: 本次调用的输出 token 数，为 0 时(未知)只按是否限流调整，不参与延迟判断
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._call_latency = latency if self._call_latency is None else 0.3 * latency + 0.7 * self._call_latency
+            if throttled:
+                self._decrease('throttled')
+            elif output_tokens > 0 and self._latency_rising(latency / output_tokens):
+                self._decrease(f'latency rising to {latency * 1000 / output_tokens:.0f}ms per output token')
+            elif self.in_flight + 1 >= int(self.limit):
+                # 仅在窗口被用满时增长，避免空闲时窗口无限放大
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """在并发窗口内执行一次调用，返回的 LimiterSlot 可填写输出 token 数"""
+        self.acquire()
+        start = time.time()
+        limiter_slot = LimiterSlot()
+        throttled = False
+        try:
+            yield limiter_slot
+        except Exception as e:
+            throttled = status_code_of(e) in THROTTLE_STATUS_CODES
+            limiter_slot.output_tokens = 0
+            raise
+        finally:
+            self.release(time.time() - start, throttled, limiter_slot.output_tokens)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """在并发窗口内执行一次异步调用，等待名额时不阻塞事件循环"""
+        with self._cond:
+            self.waiting += 1
+        try:
+            while not self.try_acquire():
+                await asyncio.sleep(0.05)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+        start = time.time()
+        limiter_slot = LimiterSlot()
+        throttled = False
+        try:
+            yield limiter_slot
+        except Exception as e:
+            throttled = status_code_of(e) in THROTTLE_STATUS_CODES
+            limiter_slot.output_tokens = 0
+            raise
+        finally:
+            self.release(time.time() - start, throttled, limiter_slot.output_tokens)
+
+    def _latency_rising(self, latency: float) -> bool:
+        if self._long_latency is None:
+            self._short_latency = self._long_latency = latency
+            return False
+        self._short_latency = 0.3 * latency + 0.7 * self._short_latency
+        self._long_latency = 0.05 * latency + 0.95 * self._long_latency
+        return self._short_latency > self.latency_tolerance * self._long_latency
+
+    def _decrease(self, reason: str):
+        now = time.time()
+        # 同一批并发请求的连续失败只收缩一次
+        if now - self._last_decrease < (self._call_latency or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        logger.info(f"LLM concurrency limit of {self.name} decreased to {self.limit:.1f} ({reason}).")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {'limit': round(self.limit, 2), 'in_flight': self.in_flight, 'waiting': self.waiting}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str, base_url: str = '', max_limit: float = None) -> AdaptiveLimiter:
+    """获取 (供应商, base_url) 共享的限制器"""
+    key = f"{provider}@{base_url or ''}"
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = AdaptiveLimiter(
+                    name=key,
+                    initial_limit=float(os.getenv('LLM_CONCURRENCY_INITIAL', 4)),
+                    min_limit=float(os.getenv('LLM_CONCURRENCY_MIN', 1)),
+                    max_limit=max_limit or float(os.getenv('LLM_CONCURRENCY_MAX', 16)),
+                    latency_tolerance=float(os.getenv('LLM_LATENCY_TOLERANCE', 2.0)),
+                )
+                _limiters[key] = limiter
+    return limiter
+
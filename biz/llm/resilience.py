@@ -0,0 +1,109 @@
+"""
+LLM 调用的重试及熔断
+
+- 可重试错误按带抖动的指数退避重试，响应头带 Retry-After 时至少等待其建议的间隔
+- 每个 (供应商, base_url) 一个熔断器：连续失败 LLM_CIRCUIT_FAILURE_THRESHOLD 次后熔断 LLM_CIRCUIT_RESET_SECONDS 秒，
+  期间调用直接抛出 LLMCircuitOpenError，不再占用 Worker 等待超时；熔断结束后放行一次试探调用，成功则恢复
+"""
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+from biz.llm.errors import LLMCircuitOpenError, LLMError
+from biz.utils.log import logger
+
+
+class CircuitBreaker:
+    """熔断器（线程安全）"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        # 试探调用的开始时间；试探调用被取消而没有结果时，超过 reset_seconds 后允许新的试探
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half_open' if time.time() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allows(self) -> bool:
+        """不占用试探名额地判断当前是否可能放行调用"""
+        return self.state != 'open'
+
+    def before_call(self):
+        """调用前检查，熔断中抛出 LLMCircuitOpenError；熔断到期后只放行一个试探调用"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.time() - self.opened_at)
+            probing = self._probe_started is not None and time.time() - self._probe_started < self.reset_seconds
+            if remaining > 0 or probing:
+                raise LLMCircuitOpenError(f"{self.name} circuit open", self.name,
+                                          retry_after=max(remaining, 0.0))
+            self._probe_started = time.time()
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"LLM circuit of {self.name} closed.")
+            self.failures = 0
+            self.opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            probing = self._probe_started is not None
+            if probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or probing:
+                    logger.warning(f"LLM circuit of {self.name} opened for {self.reset_seconds:.0f}s "
+                                   f"after {self.failures} consecutive failures.")
+                self.opened_at = time.time()
+                self._probe_started = None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, base_url: str = '') -> CircuitBreaker:
+    """获取 (供应商, base_url) 共享的熔断器"""
+    key = f"{provider}@{base_url or ''}"
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name=key,
+                    failure_threshold=int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', 5)),
+                    reset_seconds=float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', 30)),
+                )
+                _breakers[key] = breaker
+    return breaker
+
+
+def retry_delay(error: LLMError, attempt: int) -> Optional[float]:
+    """
+    第 attempt 次(从 0 开始)失败后的重试等待时间，不应重试时返回 None
+    退避时间为 [0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2^attempt)] 内的随机值(full jitter)，
+    避免大量 Worker 同时重试；Retry-After 超过 LLM_RETRY_MAX_DELAY 时不再重试，交由任务队列稍后重试
+    """
+    if not error.transient or attempt >= int(os.getenv('LLM_MAX_RETRIES', 3)):
+        return None
+    max_delay = float(os.getenv('LLM_RETRY_MAX_DELAY', 30))
+    delay = random.uniform(0, min(max_delay, float(os.getenv('LLM_RETRY_BASE_DELAY', 1)) * 2 ** attempt))
+    if error.retry_after is not None:
+        if error.retry_after > max_delay:
+            return None
+        delay = max(delay, error.retry_after)
+    return delay
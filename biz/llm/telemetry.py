@@ -0,0 +1,68 @@
+"""
+LLM 调用遥测
+
+BaseClient 在每次调用(含重试)时创建一个 CallRecorder，记录耗时、流式调用的首 token 耗时、token 用量及调用结果，
+调用结束后写入 llm_call_metrics 表。子类在拿到响应后通过 BaseClient._record_usage 上报用量，
+当前调用经 contextvar 传递，同一线程内的并发异步调用、asyncio.to_thread 中执行的同步调用都能对应到各自的记录。
+"""
+import contextvars
+import os
+import time
+from typing import Optional
+
+from biz.llm.errors import classify
+from biz.llm.types import LLMUsage
+from biz.queue.context import current_job_id
+from biz.service.llm_metrics_service import LLMMetricsService
+from biz.utils.log import logger
+
+_current_call = contextvars.ContextVar('llm_current_call', default=None)
+
+
+class CallRecorder:
+    """一次 LLM 调用的指标"""
+
+    def __init__(self, provider: str, model: str, streamed: bool = False):
+        self.provider = provider
+        self.model = model
+        self.streamed = streamed
+        self.job_id = current_job_id()
+        self.usage: Optional[LLMUsage] = None
+        self.ttft: Optional[float] = None
+        self.start = time.time()
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.time() - self.start
+
+    def finish(self, error: Exception = None):
+        if os.getenv('LLM_METRICS_ENABLED', '1') != '1':
+            return
+        usage = self.usage or LLMUsage()
+        metrics = {
+            'provider': self.provider,
+            'model': usage.model or self.model,
+            'job_id': self.job_id,
+            'streamed': int(self.streamed),
+            'outcome': type(classify(self.provider, error)).__name__ if error else LLMMetricsService.OUTCOME_SUCCESS,
+            'error': str(error)[:500] if error else '',
+            'latency': round(time.time() - self.start, 3),
+            'ttft': round(self.ttft, 3) if self.ttft is not None else None,
+            **{name: getattr(usage, name) for name in LLMUsage.COUNTERS},
+        }
+        try:
+            LLMMetricsService.record(metrics)
+        except Exception as e:
+            # 指标写入失败不影响 Review
+            logger.warning(f"Failed to record LLM call metrics: {e}")
+
+
+def start_call(provider: str, model: str, streamed: bool = False) -> CallRecorder:
+    """开始记录一次调用，并设为当前调用"""
+    call = CallRecorder(provider, model, streamed)
+    _current_call.set(call)
+    return call
+
+
+def current_call() -> Optional[CallRecorder]:
+    return _current_call.get()
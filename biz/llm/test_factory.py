@@ -0,0 +1,37 @@
+import os
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.factory import Factory, MODEL_TIER_FAST, MODEL_TIER_STRONG
+from biz.llm.types import NOT_GIVEN
+
+
+class TestModelRouting(TestCase):
+    def _tier(self, paths, tokens):
+        return Factory.review_model_tier([{'new_path': path, 'diff': ''} for path in paths], tokens)[0]
+
+    def test_tier_by_size_and_risk(self):
+        self.assertEqual(self._tier(['src/utils/date.py'], 300), MODEL_TIER_FAST)
+        self.assertEqual(self._tier(['src/utils/date.py'], 3000), MODEL_TIER_STRONG)
+        self.assertEqual(self._tier(['src/utils/date.py'], 20000), MODEL_TIER_STRONG)
+        self.assertEqual(self._tier(['docs/guide.md', 'conf/app.yml'], 3000), MODEL_TIER_FAST)
+        # 高风险路径即使改动很小也使用强模型
+        self.assertEqual(self._tier(['app/auth/login.py'], 50), MODEL_TIER_STRONG)
+        self.assertEqual(self._tier(['db/V2__add_index.sql'], 50), MODEL_TIER_STRONG)
+
+    @patch.dict(os.environ, {'MODEL_ROUTING_RISKY_PATTERNS': r'(^|/)core/'})
+    def test_custom_risky_patterns(self):
+        self.assertEqual(self._tier(['app/auth/login.py'], 50), MODEL_TIER_FAST)
+        self.assertEqual(self._tier(['core/engine.py'], 50), MODEL_TIER_STRONG)
+
+    def test_review_model(self):
+        changes = [{'new_path': 'README.md', 'diff': '+typo'}]
+        self.assertIs(Factory.review_model(changes), NOT_GIVEN)
+        with patch.dict(os.environ, {'MODEL_ROUTING_ENABLED': '1', 'MODEL_ROUTING_FAST_MODEL': 'fast-model'}):
+            self.assertEqual(Factory.review_model(changes), 'fast-model')
+            # 强模型档位未配置时使用供应商默认模型
+            self.assertIs(Factory.review_model([{'new_path': 'auth/a.py', 'diff': '+x'}]), NOT_GIVEN)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase, main
+
+from biz.llm.limiter import AdaptiveLimiter
+
+
+class ThrottledError(Exception):
+    status_code = 429
+
+
+class TestAdaptiveLimiter(TestCase):
+    def test_limit_grows_when_window_is_full_and_shrinks_on_throttle(self):
+        """测试窗口用满时加性增长，遇到 429 时乘性收缩"""
+        limiter = AdaptiveLimiter('test', initial_limit=2, max_limit=8, latency_tolerance=100)
+        for _ in range(2):
+            limiter.acquire()
+        limiter.release(0.01)
+        self.assertAlmostEqual(limiter.limit, 2.5)
+        limiter.release(0.01)
+
+        with self.assertRaises(ThrottledError):
+            with limiter.slot():
+                raise ThrottledError()
+        self.assertAlmostEqual(limiter.limit, 1.25)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_latency_normalized_by_output_tokens(self):
+        """测试延迟按输出 token 数归一化：长输出的调用耗时更长不收缩窗口，未报告输出 token 数的调用不参与判断"""
+        limiter = AdaptiveLimiter('test', initial_limit=4, max_limit=4)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(1.0, output_tokens=100)
+        limiter.acquire()
+        limiter.release(30.0, output_tokens=3000)
+        limiter.acquire()
+        limiter.release(60.0)
+        self.assertEqual(limiter.limit, 4)
+
+        limiter.acquire()
+        limiter.release(10.0, output_tokens=100)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_excess_calls_wait_instead_of_failing(self):
+        """测试超出窗口的调用排队等待"""
+        limiter = AdaptiveLimiter('test', initial_limit=1, max_limit=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def call():
+            with limiter.slot():
+                acquired.set()
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        time.sleep(0.05)
+        self.assertFalse(acquired.is_set())
+        self.assertEqual(limiter.stats()['waiting'], 1)
+        limiter.release(0.01)
+        thread.join(1)
+        self.assertTrue(acquired.is_set())
+
+    def test_async_slot_bounds_concurrency_without_blocking_loop(self):
+        """测试异步调用同样受并发窗口限制"""
+        limiter = AdaptiveLimiter('test', initial_limit=2, max_limit=2)
+        active, peak = 0, 0
+
+        async def call():
+            nonlocal active, peak
+            async with limiter.aslot():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.05)
+                active -= 1
+
+        async def run():
+            await asyncio.gather(*[call() for _ in range(6)])
+
+        asyncio.run(run())
+        self.assertEqual(peak, 2)
+        self.assertEqual(limiter.stats(), {'limit': 2, 'in_flight': 0, 'waiting': 0})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.client.base import BaseClient
+from biz.llm.errors import LLMAuthError, LLMCircuitOpenError, LLMRateLimitError, LLMTransientError, classify
+
+
+class FakeResponse:
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+class ApiError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(headers or {})
+
+
+class FlakyClient(BaseClient):
+    def __init__(self, provider: str, errors: list):
+        self.provider = provider
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _completions(self, messages, model=None) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+@patch.dict(os.environ, {'LLM_RETRY_BASE_DELAY': '0.01', 'LLM_MAX_RETRIES': '3', 'LLM_METRICS_ENABLED': '0'})
+class TestResilience(TestCase):
+    messages = [{'role': 'user', 'content': 'hi'}]
+
+    def test_classify(self):
+        self.assertIsInstance(classify('p', ApiError(429, {'retry-after': '2'})), LLMRateLimitError)
+        self.assertEqual(classify('p', ApiError(429, {'retry-after': '2'})).retry_after, 2.0)
+        self.assertIsInstance(classify('p', ApiError(401)), LLMAuthError)
+        self.assertTrue(classify('p', TimeoutError('read timed out')).transient)
+        self.assertFalse(classify('p', ApiError(400)).transient)
+
+    def test_transient_errors_are_retried_honouring_retry_after(self):
+        """测试可重试错误按退避重试，并至少等待 Retry-After"""
+        client = FlakyClient('flaky-retry', [ApiError(503), ApiError(429, {'retry-after': '0.2'})])
+        start = time.time()
+        self.assertEqual(client.completions(self.messages), 'ok')
+        self.assertEqual(client.calls, 3)
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+    def test_non_transient_error_is_not_retried(self):
+        client = FlakyClient('flaky-auth', [ApiError(401), ApiError(401)])
+        with self.assertRaises(LLMAuthError):
+            client.completions(self.messages)
+        self.assertEqual(client.calls, 1)
+
+    @patch.dict(os.environ, {'LLM_MAX_RETRIES': '0', 'LLM_CIRCUIT_FAILURE_THRESHOLD': '2',
+                             'LLM_CIRCUIT_RESET_SECONDS': '0.2'})
+    def test_circuit_opens_and_recovers(self):
+        """测试连续失败后熔断、直接失败，熔断到期后试探调用成功即恢复"""
+        client = FlakyClient('flaky-circuit', [ApiError(502), ApiError(502)])
+        for _ in range(2):
+            with self.assertRaises(LLMTransientError):
+                client.completions(self.messages)
+        with self.assertRaises(LLMCircuitOpenError):
+            client.completions(self.messages)
+        self.assertEqual(client.calls, 2)
+
+        time.sleep(0.25)
+        self.assertEqual(client.completions(self.messages), 'ok')
+        self.assertEqual(client.breaker.state, 'closed')
+
+
+if __name__ == '__main__':
+    main()
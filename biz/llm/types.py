@@ -1,4 +1,4 @@
-from typing import Optional, List, Literal
+from typing import Optional, List, Literal, ClassVar, Tuple
 
 from pydantic import BaseModel
 from typing_extensions import override
@@ -58,3 +58,30 @@ class CompletionMessage(BaseModel):
     """
     message: dict
     role: str
+
+
+class LLMUsage(BaseModel):
+    """
+    一次 LLM 调用的 token 用量
+    cached_tokens 为命中供应商前缀缓存的输入 token 数(OpenAI/Qwen 的 cached_tokens、DeepSeek 的 prompt_cache_hit_tokens、
+    Anthropic 的 cache_read_input_tokens)，cache_creation_tokens 为写入缓存的输入 token 数(仅 Anthropic)
+    """
+    provider: str = ''
+    model: str = ''
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cache_creation_tokens: int = 0
+
+    # 按任务累加的计数项
+    COUNTERS: ClassVar[Tuple[str, ...]] = ('input_tokens', 'output_tokens', 'cached_tokens', 'cache_creation_tokens')
+
+    @classmethod
+    def from_openai(cls, provider: str, model: str, usage) -> Optional["LLMUsage"]:
+        """解析 OpenAI 兼容接口(OpenAI、DeepSeek、Qwen)返回的 usage"""
+        if usage is None:
+            return None
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or getattr(usage, 'prompt_cache_hit_tokens', None) or 0
+        return cls(provider=provider, model=model, input_tokens=usage.prompt_tokens or 0,
+                   output_tokens=usage.completion_tokens or 0, cached_tokens=cached_tokens)
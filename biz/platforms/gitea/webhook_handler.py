@@ -4,8 +4,8 @@ import time
 from urllib.parse import urljoin
 
 import fnmatch
-import requests
 
+from biz.utils.http import http_session
 from biz.utils.log import logger
 
 
@@ -105,7 +105,7 @@ class PullRequestHandler:
         url = urljoin(f"{self.gitea_url}/", endpoint)
 
         for attempt in range(max_retries):
-            response = requests.get(url, headers=self._headers(), verify=False)
+            response = http_session().get(url, headers=self._headers(), verify=False)
             logger.debug(
                 f"Get changes response from Gitea (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
 
@@ -142,7 +142,7 @@ class PullRequestHandler:
 
         endpoint = f"api/v1/repos/{self.repo_full_name}/pulls/{self.pull_request_index}/commits"
         url = urljoin(f"{self.gitea_url}/", endpoint)
-        response = requests.get(url, headers=self._headers(), verify=False)
+        response = http_session().get(url, headers=self._headers(), verify=False)
         logger.debug(f"Get commits response from Gitea: {response.status_code}, {response.text}")
 
         if response.status_code == 200:
@@ -166,20 +166,33 @@ class PullRequestHandler:
             return []
 
     def add_pull_request_notes(self, review_result: str):
+        """添加 PR 评论，返回评论ID(失败时返回 None)"""
         if not self.repo_full_name or not self.pull_request_index:
             logger.error("Missing repository information for adding pull request notes.")
-            return
+            return None
 
         endpoint = f"api/v1/repos/{self.repo_full_name}/issues/{self.pull_request_index}/comments"
         url = urljoin(f"{self.gitea_url}/", endpoint)
-        response = requests.post(url, headers=self._headers(), json={'body': review_result}, verify=False)
+        response = http_session().post(url, headers=self._headers(), json={'body': review_result}, verify=False)
         logger.debug(f"Add comment to Gitea pull request {url}: {response.status_code}, {response.text}")
 
         if response.status_code == 201:
             logger.info("Comment successfully added to Gitea pull request.")
+            return response.json().get('id')
         else:
             logger.error(f"Failed to add comment to Gitea pull request: {response.status_code}")
             logger.error(response.text)
+            return None
+
+    def update_pull_request_note(self, comment_id, review_result: str):
+        endpoint = f"api/v1/repos/{self.repo_full_name}/issues/comments/{comment_id}"
+        url = urljoin(f"{self.gitea_url}/", endpoint)
+        response = http_session().patch(url, headers=self._headers(), json={'body': review_result}, verify=False)
+        logger.debug(f"Update comment of Gitea pull request {url}: {response.status_code}, {response.text}")
+
+        if response.status_code != 200:
+            logger.error(f"Failed to update comment of Gitea pull request: {response.status_code}")
+            logger.error(response.text)
 
     def target_branch_protected(self) -> bool:
         if not self.repo_full_name or not self.target_branch:
@@ -187,7 +200,7 @@ class PullRequestHandler:
 
         endpoint = f"api/v1/repos/{self.repo_full_name}/branches?protected=true"
         url = urljoin(f"{self.gitea_url}/", endpoint)
-        response = requests.get(url, headers=self._headers(), verify=False)
+        response = http_session().get(url, headers=self._headers(), verify=False)
         logger.debug(f"Get protected branches response from Gitea: {response.status_code}, {response.text}")
 
         if response.status_code == 200:
@@ -283,7 +296,7 @@ class PushHandler:
 
         endpoint = f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_id}.diff"
         url = urljoin(f"{self.gitea_url}/", endpoint)
-        response = requests.get(url, headers=self._headers(), verify=False)
+        response = http_session().get(url, headers=self._headers(), verify=False)
         logger.debug(
             f"Get commit diff from Gitea: {response.status_code}, {url}")
         if response.status_code == 200:
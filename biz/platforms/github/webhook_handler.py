@@ -2,8 +2,8 @@ import os
 import re
 import time
 
-import requests
 import fnmatch
+from biz.utils.http import http_session
 from biz.utils.log import logger
 
 
@@ -93,7 +93,7 @@ class PullRequestHandler:
                 'Authorization': f'token {self.github_token}',
                 'Accept': 'application/vnd.github.v3+json'
             }
-            response = requests.get(url, headers=headers)
+            response = http_session().get(url, headers=headers)
             logger.debug(
                 f"Get changes response from GitHub (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
 
@@ -135,7 +135,7 @@ class PullRequestHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_session().get(url, headers=headers)
         logger.debug(f"Get commits response from GitHub: {response.status_code}, {response.text}")
         
         # 检查请求是否成功
@@ -160,6 +160,7 @@ class PullRequestHandler:
             return []
 
     def add_pull_request_notes(self, review_result):
+        """添加 PR 评论，返回评论ID(失败时返回 None)"""
         url = f"https://api.github.com/repos/{self.repo_full_name}/issues/{self.pull_request_number}/comments"
         headers = {
             'Authorization': f'token {self.github_token}',
@@ -168,13 +169,30 @@ class PullRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = http_session().post(url, headers=headers, json=data)
         logger.debug(f"Add comment to GitHub PR {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to pull request.")
+            return response.json().get('id')
         else:
             logger.error(f"Failed to add comment: {response.status_code}")
             logger.error(response.text)
+            return None
+
+    def update_pull_request_note(self, comment_id, review_result):
+        url = f"https://api.github.com/repos/{self.repo_full_name}/issues/comments/{comment_id}"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        data = {
+            'body': review_result
+        }
+        response = http_session().patch(url, headers=headers, json=data)
+        logger.debug(f"Update comment of GitHub PR {url}: {response.status_code}, {response.text}")
+        if response.status_code != 200:
+            logger.error(f"Failed to update comment: {response.status_code}")
+            logger.error(response.text)
 
     def target_branch_protected(self) -> bool:
         url = f"https://api.github.com/repos/{self.repo_full_name}/branches?protected=true"
@@ -183,7 +201,7 @@ class PullRequestHandler:
             'Accept': 'application/vnd.github.v3+json'
         }
 
-        response = requests.get(url, headers=headers)
+        response = http_session().get(url, headers=headers)
         if response.status_code == 200:
             data = response.json()
             target_branch = self.webhook_data['pull_request']['base']['ref']
@@ -255,7 +273,7 @@ class PushHandler:
         data = {
             'body': message
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = http_session().post(url, headers=headers, json=data)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -270,7 +288,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_session().get(url, headers=headers)
         logger.debug(
             f"Get commits response from GitHub for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -287,7 +305,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_session().get(url, headers=headers)
         logger.debug(
             f"Get commit response from GitHub: {response.status_code}, {response.text}, URL: {url}")
 
@@ -302,7 +320,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_session().get(url, headers=headers)
         logger.debug(
             f"Get changes response from GitHub for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
@@ -3,8 +3,8 @@ import re
 import time
 from urllib.parse import urljoin
 import fnmatch
-import requests
 
+from biz.utils.http import http_session
 from biz.utils.log import logger
 
 
@@ -89,7 +89,7 @@ class MergeRequestHandler:
             headers = {
                 'Private-Token': self.gitlab_token
             }
-            response = requests.get(url, headers=headers, verify=False)
+            response = http_session().get(url, headers=headers, verify=False)
             logger.debug(
                 f"Get changes response from GitLab (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
 
@@ -120,7 +120,7 @@ class MergeRequestHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_session().get(url, headers=headers, verify=False)
         logger.debug(f"Get commits response from gitlab: {response.status_code}, {response.text}")
         # 检查请求是否成功
         if response.status_code == 200:
@@ -130,6 +130,7 @@ class MergeRequestHandler:
             return []
 
     def add_merge_request_notes(self, review_result):
+        """添加 MR 评论，返回评论ID(失败时返回 None)"""
         url = urljoin(f"{self.gitlab_url}/",
                       f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/notes")
         headers = {
@@ -139,13 +140,31 @@ class MergeRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = http_session().post(url, headers=headers, json=data, verify=False)
         logger.debug(f"Add notes to gitlab {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Note successfully added to merge request.")
+            return response.json().get('id')
         else:
             logger.error(f"Failed to add note: {response.status_code}")
             logger.error(response.text)
+            return None
+
+    def update_merge_request_note(self, note_id, review_result):
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/notes/{note_id}")
+        headers = {
+            'Private-Token': self.gitlab_token,
+            'Content-Type': 'application/json'
+        }
+        data = {
+            'body': review_result
+        }
+        response = http_session().put(url, headers=headers, json=data, verify=False)
+        logger.debug(f"Update note of gitlab {url}: {response.status_code}, {response.text}")
+        if response.status_code != 200:
+            logger.error(f"Failed to update note: {response.status_code}")
+            logger.error(response.text)
 
     def target_branch_protected(self) -> bool:
         url = urljoin(f"{self.gitlab_url}/",
@@ -154,7 +173,7 @@ class MergeRequestHandler:
             'Private-Token': self.gitlab_token,
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_session().get(url, headers=headers, verify=False)
         logger.debug(f"Get protected branches response from gitlab: {response.status_code}, {response.text}")
         # 检查请求是否成功
         if response.status_code == 200:
@@ -232,7 +251,7 @@ class PushHandler:
         data = {
             'note': message
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = http_session().post(url, headers=headers, json=data, verify=False)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -247,7 +266,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_session().get(url, headers=headers, verify=False)
         logger.debug(
             f"Get commits response from GitLab for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -264,7 +283,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_session().get(url, headers=headers, verify=False)
         logger.debug(
             f"Get changes response from GitLab for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
@@ -281,7 +300,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_session().get(url, headers=headers, verify=False)
         logger.debug(
             f"Get commit diff response from GitLab: {response.status_code}, {response.text}, URL: {url}")
 
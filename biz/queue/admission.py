@@ -0,0 +1,63 @@
+"""
+Webhook 入口限流
+
+节点过载（排队中、执行中的任务过多）时拒绝低优先级的 Push 事件，返回 503 及 Retry-After，
+由 GitLab/GitHub/Gitea 稍后重新投递；MR 事件仍然入队，使系统平滑降级而不是无限堆积任务。
+"""
+import os
+import threading
+import time
+
+from biz.queue.fair_queue import PRIORITY_PUSH
+from biz.service.job_service import JobService
+
+
+class QueueOverloadedError(Exception):
+    """任务队列过载，事件被拒绝"""
+
+    def __init__(self, retry_after: int, load: dict):
+        super().__init__(f"review queue overloaded (queued={load.get('queued')}, running={load.get('running')})")
+        self.retry_after = retry_after
+        self.load = load
+
+
+_load_cache = {'at': 0.0, 'load': None}
+_load_lock = threading.Lock()
+
+
+def _current_load() -> dict:
+    """队列负载，短时间内缓存，避免 Webhook 洪峰时每个请求都查询数据库"""
+    interval = float(os.getenv('ADMISSION_CHECK_INTERVAL', 1))
+    with _load_lock:
+        now = time.time()
+        if _load_cache['load'] is None or now - _load_cache['at'] >= interval:
+            _load_cache['load'] = JobService.load()
+            _load_cache['at'] = now
+        return _load_cache['load']
+
+
+def check_admission(priority: int):
+    """
+    判断事件能否入队，过载时抛出 QueueOverloadedError
+    - 排队任务数超过 ADMISSION_MAX_QUEUE_DEPTH 或执行中任务数超过 ADMISSION_MAX_IN_FLIGHT 时，拒绝 Push 事件
+    - 排队任务数超过 ADMISSION_HARD_MAX_QUEUE_DEPTH 时，拒绝所有事件
+    阈值为 0 表示不限制
+    """
+    max_depth = int(os.getenv('ADMISSION_MAX_QUEUE_DEPTH', 200))
+    max_in_flight = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 0))
+    hard_max_depth = int(os.getenv('ADMISSION_HARD_MAX_QUEUE_DEPTH', 0))
+    if max_depth <= 0 and max_in_flight <= 0 and hard_max_depth <= 0:
+        return
+    load = _current_load()
+    overload = 0.0
+    if hard_max_depth > 0 and load['queued'] >= hard_max_depth:
+        overload = load['queued'] / hard_max_depth
+    elif priority <= PRIORITY_PUSH:
+        if max_depth > 0 and load['queued'] >= max_depth:
+            overload = load['queued'] / max_depth
+        if max_in_flight > 0 and load['running'] >= max_in_flight:
+            overload = max(overload, load['running'] / max_in_flight)
+    if overload:
+        # 过载越严重，建议的重试间隔越长（最多 5 倍）
+        retry_after = int(float(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', 60)) * min(overload, 5))
+        raise QueueOverloadedError(retry_after, load)
@@ -0,0 +1,51 @@
+"""
+任务执行上下文：记录当前 Worker 正在执行的任务，供处理函数查询，并记录任务各阶段耗时
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from biz.service.job_service import JobService
+
+_current_job_id = contextvars.ContextVar('current_job_id', default=None)
+
+
+class JobDeferred(Exception):
+    """处理函数抛出此异常时，任务放回队列，delay_seconds 秒后重新执行(不计入重试次数)"""
+
+    def __init__(self, delay_seconds: float, reason: str = ''):
+        super().__init__(reason or f'job deferred for {delay_seconds:.0f}s')
+        self.delay_seconds = delay_seconds
+
+
+def set_current_job(job_id: Optional[int]):
+    _current_job_id.set(job_id)
+
+
+def current_job_id() -> Optional[int]:
+    return _current_job_id.get()
+
+
+def job_cancelled() -> bool:
+    """当前任务是否已被同一MR更新的事件取代"""
+    job_id = current_job_id()
+    return bool(job_id) and JobService.is_cancel_requested(job_id)
+
+
+@contextmanager
+def job_stage(timing: str, stage: str = None):
+    """
+    记录当前任务的阶段耗时（同名耗时累加，如多次 LLM 调用），不在任务中执行时不做任何记录
+    :param timing: 耗时项，如 platform_fetch、token_count、llm_call、note_post、notification、db_write
+    :param stage: 进入的任务状态，如 fetching、reviewing、publishing，为空时不改变状态
+    """
+    job_id = current_job_id()
+    if job_id and stage:
+        JobService.set_stage(job_id, stage)
+    start = time.time()
+    try:
+        yield
+    finally:
+        if job_id:
+            JobService.add_stage_timing(job_id, timing, time.time() - start)
@@ -0,0 +1,96 @@
+"""
+任务公平调度
+
+按项目(或 url_slug)做加权公平排队(Start-time Fair Queueing)，避免单个高频推送的项目饿死其他项目；
+同时按事件类型区分优先级：合并到受保护分支的 MR > 普通 MR > Push。
+"""
+import fnmatch
+import os
+from typing import Dict, List, Optional
+
+PRIORITY_PUSH = 1
+PRIORITY_MERGE_REQUEST = 2
+PRIORITY_PROTECTED_MERGE_REQUEST = 3
+
+
+def parse_weights(weights_text: str) -> Dict[str, float]:
+    """
+    解析项目权重配置，格式: project_a:2,group/monorepo:0.5
+    """
+    weights = {}
+    for item in (weights_text or '').split(','):
+        key, sep, value = item.strip().rpartition(':')
+        if not sep or not key:
+            continue
+        try:
+            weights[key.strip()] = float(value)
+        except ValueError:
+            continue
+    return weights
+
+
+def job_priority(is_merge_request: bool, target_branch: str = '') -> int:
+    """根据事件类型及目标分支计算任务优先级"""
+    if not is_merge_request:
+        return PRIORITY_PUSH
+    patterns = os.getenv('SCHEDULER_PROTECTED_BRANCHES', 'main,master,release/*').split(',')
+    if target_branch and any(fnmatch.fnmatch(target_branch, p.strip()) for p in patterns if p.strip()):
+        return PRIORITY_PROTECTED_MERGE_REQUEST
+    return PRIORITY_MERGE_REQUEST
+
+
+def fair_key(url_slug: str, project: str) -> str:
+    """公平调度的分组键，由 SCHEDULER_FAIR_KEY 决定按项目还是按 url_slug 分组"""
+    if os.getenv('SCHEDULER_FAIR_KEY', 'project') == 'url_slug' or not project:
+        return url_slug or ''
+    return project
+
+
+class FairScheduler:
+    """
+    加权公平调度器：每个分组维护虚拟完成时间，每次选择虚拟完成时间最小的分组的队首任务。
+    任务的虚拟耗时 = 1 / (分组权重 * 任务优先级)，权重或优先级越高，获得的调度份额越大。
+    """
+
+    def __init__(self, weights: Dict[str, float] = None, default_weight: float = 1.0):
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self._head_tags: Dict[str, tuple] = {}
+
+    @classmethod
+    def from_env(cls) -> 'FairScheduler':
+        return cls(parse_weights(os.getenv('SCHEDULER_PROJECT_WEIGHTS', '')),
+                   float(os.getenv('SCHEDULER_DEFAULT_WEIGHT', 1.0)))
+
+    def _tags(self, job: dict):
+        """计算任务的虚拟开始/完成时间；任务成为分组队首时确定，直到被调度前保持不变"""
+        key = job.get('fair_key') or ''
+        cached = self._head_tags.get(key)
+        if cached and cached[0] == job['id']:
+            return cached[1], cached[2]
+        weight = self.weights.get(key, self.default_weight)
+        cost = 1.0 / (max(weight, 1e-6) * max(job.get('priority') or PRIORITY_PUSH, 1))
+        start = max(self.virtual_time, self._finish_tags.get(key, 0.0))
+        self._head_tags[key] = (job['id'], start, start + cost)
+        return start, start + cost
+
+    def select(self, candidates: List[dict]) -> Optional[dict]:
+        """从各分组的队首任务中选出下一个要执行的任务"""
+        if not candidates:
+            return None
+        chosen, chosen_tags = None, None
+        for job in candidates:
+            tags = self._tags(job)
+            if chosen is None or (tags[1], job['id']) < (chosen_tags[1], chosen['id']):
+                chosen, chosen_tags = job, tags
+        key = chosen.get('fair_key') or ''
+        self.virtual_time = chosen_tags[0]
+        self._finish_tags[key] = chosen_tags[1]
+        self._head_tags.pop(key, None)
+        # 清理已经落后于虚拟时间或已不在队列中的分组，避免状态无限增长
+        active_keys = {job.get('fair_key') or '' for job in candidates}
+        self._finish_tags = {k: v for k, v in self._finish_tags.items() if v > self.virtual_time}
+        self._head_tags = {k: v for k, v in self._head_tags.items() if k in active_keys}
+        return chosen
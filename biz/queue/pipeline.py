@@ -0,0 +1,31 @@
+"""
+Review 流水线并发工具：让相互独立的网络 I/O(平台接口请求、通知、入库等)重叠执行
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    # 线程池按进程创建，避免 fork 后继承父进程中不可用的线程池
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=int(os.getenv('PIPELINE_IO_THREADS', 16)),
+                                       thread_name_prefix='review-io')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def run_concurrently(*calls: Callable) -> List:
+    """
+    并发执行多个相互独立的阻塞调用，按传入顺序返回结果，任一调用抛出的异常会原样抛出。
+    每个调用在当前上下文的副本中执行，保留当前任务等上下文信息。
+    """
+    if len(calls) == 1:
+        return [calls[0]()]
+    futures = [_get_executor().submit(contextvars.copy_context().run, call) for call in calls]
+    return [future.result() for future in futures]
@@ -0,0 +1,380 @@
+"""
+常驻 Worker 进程池
+
+替代“每个 Webhook 启动一个进程”的方式：固定数量的 Worker 进程消费任务，
+进程内复用 LLM Client、HTTP Session 等资源，处理一定数量任务后自动回收重建。
+任务持久化在 JobService 中，由调度线程按租约领取后分发给空闲 Worker；每个 Worker 有自己的任务队列，
+分发时即记录任务所属的 Worker，Worker 异常退出时其名下的任务(包括尚未开始执行的)立即放回队列。
+
+节点角色(NODE_ROLE)：
+- all: 默认，同一节点既接收 Webhook 又执行任务
+- api: 只接收 Webhook 并入队，不启动 Worker
+- worker: 只消费 WORKER_QUEUE 中配置的分区，由 worker.py 启动
+
+收到 SIGTERM 时进程池进入排空(drain)模式：停止领取新任务，等待执行中的任务完成（最长 WORKER_DRAIN_TIMEOUT 秒），
+仍未完成的任务放回持久化队列（不计入重试次数），由重启后的进程或其他节点继续处理。
+"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from biz.queue.context import set_current_job, JobDeferred
+from biz.queue.fair_queue import FairScheduler
+from biz.service.job_service import JobService
+from biz.utils.log import logger
+
+
+def node_role() -> str:
+    return os.getenv('NODE_ROLE', 'all').strip().lower()
+
+
+def worker_queue_names() -> List[str]:
+    """当前 Worker 节点消费的分区，WORKER_QUEUE 为空或为 * 时消费所有分区"""
+    names = [name.strip() for name in os.getenv('WORKER_QUEUE', '').split(',') if name.strip()]
+    return [] if '*' in names else names
+
+
+def handler_name(function: callable) -> str:
+    """将任务处理函数转换为可持久化的名称，如 biz.queue.worker:handle_push_event"""
+    return f"{function.__module__}:{function.__qualname__}"
+
+
+def resolve_handler(name: str) -> callable:
+    module_name, qualname = name.split(':', 1)
+    target = importlib.import_module(module_name)
+    for attr in qualname.split('.'):
+        target = getattr(target, attr)
+    return target
+
+
+def _execute_job(job_id: int, handler: str, args: list):
+    set_current_job(job_id)
+    try:
+        resolve_handler(handler)(*args)
+    finally:
+        set_current_job(None)
+
+
+async def _run_job(job, event_queue, semaphore: asyncio.Semaphore):
+    job_id, handler, args = job
+    event, error = 'done', None
+    try:
+        await asyncio.to_thread(_execute_job, job_id, handler, args)
+    except JobDeferred as e:
+        logger.info(f"Job {job_id} deferred for {e.delay_seconds:.0f}s: {e}")
+        event, error = 'defer', e.delay_seconds
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+        logger.error(f"Worker 执行任务 {job_id} 出错: {error}")
+    finally:
+        semaphore.release()
+        event_queue.put((event, os.getpid(), job_id, error))
+
+
+async def _worker_loop(job_queue, event_queue, max_jobs: int, concurrency: int):
+    loop = asyncio.get_running_loop()
+    # 阻塞的平台请求、LLM 调用在线程中执行，事件循环同时保持最多 concurrency 个任务在途
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency + 1, thread_name_prefix='review-job'))
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    taken = 0
+    while max_jobs <= 0 or taken < max_jobs:
+        await semaphore.acquire()
+        job = await loop.run_in_executor(None, job_queue.get)
+        if job is None:
+            semaphore.release()
+            break
+        taken += 1
+        task = asyncio.create_task(_run_job(job, event_queue, semaphore))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def _worker_main(job_queue, event_queue, max_jobs: int, concurrency: int):
+    """
+    Worker 进程主循环：处理 max_jobs 个任务后退出，由进程池重新拉起（max_jobs<=0 表示不回收）
+    """
+    # 退出由主进程统一调度(排空后发送结束信号)，避免进程组收到的 SIGTERM/SIGINT 中断执行中的任务
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(job_queue, event_queue, max_jobs, max(1, concurrency)))
+    event_queue.put(('exit', os.getpid(), None, None))
+
+
+class WorkerPool:
+    """固定大小、可回收的 Worker 进程池"""
+
+    def __init__(self, size: int, max_jobs_per_worker: int, lease_seconds: float = 120, max_attempts: int = 3,
+                 queue_names: List[str] = None, concurrency: int = 1):
+        self.size = max(1, size)
+        # 每个 Worker 进程同时执行的任务数
+        self.concurrency = max(1, concurrency)
+        self.queue_names = queue_names or []
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._scheduler = FairScheduler.from_env()
+        # Worker 在监控线程中被回收重建，此时父进程已有调度、HTTP 等线程，fork 会继承其持有的锁；
+        # 以 spawn 方式启动全新的解释器，不依赖进程池的启动时机
+        self._ctx = multiprocessing.get_context('spawn')
+        self._event_queue = self._ctx.Queue()
+        self._workers = {}
+        # Worker pid -> 该 Worker 的任务队列
+        self._job_queues = {}
+        # Worker pid -> 已分发给该 Worker 的任务数，达到 max_jobs_per_worker 后不再分发(Worker 处理完后退出)
+        self._assigned = {}
+        # 已分发但尚未完成的任务: job_id -> 分发到的 Worker pid
+        self._dispatched = {}
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._recycled = 0
+        self._running = False
+        self._draining = False
+        self._monitor = None
+        self._last_lease_check = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            requeued = JobService.requeue_expired_leases(self.max_attempts)
+            if requeued:
+                logger.info(f"Requeued {requeued} jobs with expired leases.")
+            for _ in range(self.size):
+                self._spawn_worker()
+        self._monitor = threading.Thread(target=self._monitor_loop, name='worker-pool-monitor', daemon=True)
+        self._monitor.start()
+        logger.info(f"Worker pool started, size={self.size}, concurrency={self.concurrency}, "
+                    f"max_jobs_per_worker={self.max_jobs_per_worker}, queues={self.queue_names or '*'}")
+
+    def submit(self, function: callable, *args, coalesce_key: str = '', delay_seconds: float = 0,
+               fair_key: str = '', priority: int = 1, queue_name: str = '') -> int:
+        """持久化任务并唤醒调度线程，返回任务ID；api 角色的节点、排空中的进程池只入队"""
+        if not self._running and not self._draining and node_role() == 'all':
+            self.start()
+        job_id = JobService.enqueue(handler_name(function), list(args), coalesce_key=coalesce_key,
+                                    delay_seconds=delay_seconds, fair_key=fair_key, priority=priority,
+                                    queue_name=queue_name)
+        if self._running and not self._draining:
+            self._event_queue.put(('wakeup', None, None, None))
+        return job_id
+
+    def queue_depth(self) -> int:
+        """排队中、可立即领取（尚未被领取）的任务数"""
+        return JobService.queue_depth(self.queue_names)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'role': node_role(),
+                'queues': self.queue_names or ['*'],
+                'size': self.size if self._running else 0,
+                'draining': self._draining,
+                'concurrency': self.concurrency,
+                'workers_alive': sum(1 for p in self._workers.values() if p.is_alive()),
+                'queue_depth': JobService.queue_depth(self.queue_names),
+                'deferred': JobService.queue_depth(self.queue_names, deferred=True),
+                'in_flight': len(self._dispatched),
+                'completed': self._completed,
+                'failed': self._failed,
+                'recycled_workers': self._recycled,
+            }
+
+    def drain(self, timeout: float):
+        """
+        排空进程池：停止领取新任务，等待已分发的任务在 timeout 秒内完成，然后关闭进程池；
+        超时仍未完成的任务放回持久化队列
+        """
+        with self._lock:
+            if not self._running or self._draining:
+                return
+            self._draining = True
+            in_flight = len(self._dispatched)
+        logger.info(f"Worker pool draining, waiting for {in_flight} in-flight jobs (timeout={timeout}s).")
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if not self._dispatched:
+                    break
+            time.sleep(0.5)
+        self.shutdown()
+
+    def shutdown(self, timeout: float = 5):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._draining = True
+            workers = list(self._workers.values())
+            job_queues = list(self._job_queues.values())
+        for job_queue in job_queues:
+            job_queue.put(None)
+        for process in workers:
+            process.join(timeout)
+            if process.is_alive():
+                # Worker 忽略 SIGTERM，只能强制结束
+                process.kill()
+        # 未完成的任务放回持久化队列，不计入重试次数
+        with self._lock:
+            for job_id in list(self._dispatched):
+                JobService.release(job_id, self.max_attempts, 'worker pool shutdown', count_attempt=False)
+            if self._dispatched:
+                logger.info(f"Worker pool stopped, {len(self._dispatched)} unfinished jobs released to the queue.")
+            self._dispatched.clear()
+
+    def _spawn_worker(self):
+        job_queue = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main,
+                                    args=(job_queue, self._event_queue, self.max_jobs_per_worker, self.concurrency),
+                                    daemon=True)
+        process.start()
+        self._workers[process.pid] = process
+        self._job_queues[process.pid] = job_queue
+        self._assigned[process.pid] = 0
+
+    def _idle_worker(self):
+        """在途任务最少、仍有空闲并发且未达到回收数量的 Worker，没有时返回 None"""
+        in_flight = {pid: 0 for pid in self._workers}
+        for pid in self._dispatched.values():
+            if pid in in_flight:
+                in_flight[pid] += 1
+        candidates = [pid for pid, count in in_flight.items()
+                      if count < self.concurrency and self._workers[pid].is_alive() and
+                      (self.max_jobs_per_worker <= 0 or self._assigned[pid] < self.max_jobs_per_worker)]
+        return min(candidates, key=lambda pid: in_flight[pid]) if candidates else None
+
+    def _dispatch(self):
+        """为空闲的 Worker 领取任务，分发时记录任务所属的 Worker"""
+        while self._running and not self._draining:
+            pid = self._idle_worker()
+            if pid is None:
+                return
+            job = JobService.claim(self.owner, self.lease_seconds, select=self._scheduler.select,
+                                   queue_names=self.queue_names)
+            if job is None:
+                return
+            self._dispatched[job['id']] = pid
+            self._assigned[pid] += 1
+            self._job_queues[pid].put((job['id'], job['handler'], job['args']))
+
+    def _monitor_loop(self):
+        while self._running:
+            events = []
+            try:
+                events.append(self._event_queue.get(timeout=1))
+                # 取出所有已到达的事件后再检查退出的 Worker，避免已完成的任务被当作未完成放回队列
+                while True:
+                    events.append(self._event_queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                with self._lock:
+                    for event, pid, job_id, error in events:
+                        self._handle_event(event, pid, job_id, error)
+                    self._reap_dead_workers()
+                    if self._running and not self._draining:
+                        # 排空期间不再补齐 Worker：退出的 Worker 名下的任务已放回队列，由重启后的进程或其他节点处理
+                        while len(self._workers) < self.size:
+                            self._spawn_worker()
+                    self._maintain_leases()
+                    self._dispatch()
+            except Exception as e:
+                logger.error(f"Worker pool monitor error: {e}\n{traceback.format_exc()}")
+                time.sleep(1)
+
+    def _handle_event(self, event, pid, job_id, error):
+        if event == 'done':
+            self._dispatched.pop(job_id, None)
+            if error:
+                self._failed += 1
+                JobService.fail(job_id, error)
+            else:
+                self._completed += 1
+                JobService.complete(job_id)
+        elif event == 'defer':
+            self._dispatched.pop(job_id, None)
+            JobService.defer(job_id, error)
+        elif event == 'exit':
+            process = self._workers.pop(pid, None)
+            if process:
+                process.join(1)
+            self._release_worker_jobs(pid, 'worker recycled', count_attempt=False)
+            self._recycled += 1
+
+    def _maintain_leases(self):
+        now = time.time()
+        if now - self._last_lease_check < self.lease_seconds / 3:
+            return
+        self._last_lease_check = now
+        JobService.renew_leases(list(self._dispatched), self.owner, self.lease_seconds)
+        requeued = JobService.requeue_expired_leases(self.max_attempts)
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs with expired leases.")
+
+    def _release_worker_jobs(self, pid: int, error: str, count_attempt: bool = True):
+        """将分发给已退出 Worker 的任务(执行中或仍在其任务队列中)放回持久化队列"""
+        self._job_queues.pop(pid, None)
+        self._assigned.pop(pid, None)
+        for job_id, worker_pid in list(self._dispatched.items()):
+            if worker_pid == pid:
+                self._dispatched.pop(job_id)
+                JobService.release(job_id, self.max_attempts, error, count_attempt=count_attempt)
+                logger.error(f"Worker {pid} exited ({error}) before finishing job {job_id}, job released.")
+
+    def _reap_dead_workers(self):
+        for pid, process in list(self._workers.items()):
+            if process.is_alive():
+                continue
+            # Worker 异常退出（如 OOM），名下的任务放回队列重试
+            self._workers.pop(pid, None)
+            self._release_worker_jobs(pid, f'worker exited with code {process.exitcode}')
+
+
+def drain_on_sigterm():
+    """
+    注册 SIGTERM 处理：在后台线程中排空进程池，完成后中断主线程使进程退出；
+    排空期间 API 仍可接收 Webhook，新任务只持久化入队
+    """
+    def handle_sigterm(signum, frame):
+        def drain_and_exit():
+            if _pool is not None:
+                _pool.drain(float(os.getenv('WORKER_DRAIN_TIMEOUT', 60)))
+            os.kill(os.getpid(), signal.SIGINT)
+
+        logger.info("Received SIGTERM, draining worker pool before exit.")
+        threading.Thread(target=drain_and_exit, name='worker-pool-drain', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    """获取全局 Worker 进程池（懒加载）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WorkerPool(size=int(os.getenv('WORKER_POOL_SIZE', 4)),
+                                   max_jobs_per_worker=int(os.getenv('WORKER_MAX_JOBS_PER_WORKER', 50)),
+                                   lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', 120)),
+                                   max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+                                   queue_names=worker_queue_names() if node_role() == 'worker' else [],
+                                   concurrency=int(os.getenv('WORKER_CONCURRENCY', 4)))
+    return _pool
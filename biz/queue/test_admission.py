@@ -0,0 +1,57 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.queue import admission
+from biz.queue.admission import QueueOverloadedError, check_admission
+from biz.queue.fair_queue import PRIORITY_MERGE_REQUEST, PRIORITY_PUSH
+from biz.service.job_service import JobService
+
+
+class TestAdmission(TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = JobService.DB_FILE
+        JobService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        JobService.init_db()
+        admission._load_cache['load'] = None
+
+    def tearDown(self):
+        JobService.DB_FILE = self.original_db_file
+        self.db_dir.cleanup()
+
+    def _enqueue(self, count: int):
+        for i in range(count):
+            JobService.enqueue('biz.queue.worker:handle_push_event', [i])
+        admission._load_cache['load'] = None
+
+    @patch.dict(os.environ, {'ADMISSION_MAX_QUEUE_DEPTH': '3', 'ADMISSION_RETRY_AFTER_SECONDS': '10'})
+    def test_push_shed_and_merge_request_admitted_when_overloaded(self):
+        self._enqueue(2)
+        check_admission(PRIORITY_PUSH)
+
+        self._enqueue(4)
+        with self.assertRaises(QueueOverloadedError) as ctx:
+            check_admission(PRIORITY_PUSH)
+        self.assertEqual(ctx.exception.retry_after, 20)
+        check_admission(PRIORITY_MERGE_REQUEST)
+
+    @patch.dict(os.environ, {'ADMISSION_MAX_QUEUE_DEPTH': '3', 'ADMISSION_HARD_MAX_QUEUE_DEPTH': '5'})
+    def test_hard_limit_rejects_merge_request(self):
+        self._enqueue(5)
+        with self.assertRaises(QueueOverloadedError):
+            check_admission(PRIORITY_MERGE_REQUEST)
+
+    @patch.dict(os.environ, {'ADMISSION_MAX_QUEUE_DEPTH': '3'})
+    def test_deferred_jobs_not_counted(self):
+        """测试推迟执行的任务(预算用尽、批量 Review 轮询)不计入排队任务数"""
+        for i in range(5):
+            JobService.enqueue('biz.queue.worker:handle_push_event', [i], delay_seconds=3600)
+        admission._load_cache['load'] = None
+        check_admission(PRIORITY_PUSH)
+        self.assertEqual(JobService.load(), {'queued': 0, 'deferred': 5, 'running': 0})
+
+
+if __name__ == '__main__':
+    main()
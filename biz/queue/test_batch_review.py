@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import patch, MagicMock
+
+from biz.entity.review_entity import PushReviewEntity
+from biz.llm.batch import LocalBatchBackend
+from biz.queue import worker
+from biz.service.batch_review_service import BatchReviewService
+from biz.service.job_service import JobService
+from biz.utils.code_reviewer import CodeReviewer
+
+
+@patch.dict(os.environ, {'PUSH_REVIEW_BATCH_ENABLED': '1', 'PUSH_REVIEW_BATCH_PROVIDER': 'local',
+                         'PUSH_REVIEW_BATCH_MAX_SIZE': '10', 'PUSH_REVIEW_BATCH_MAX_WAIT': '0',
+                         'REVIEW_CACHE_ENABLED': '0', 'LLM_METRICS_ENABLED': '0'})
+@patch('biz.queue.worker.event_manager')
+@patch('biz.queue.worker._post_review_note')
+class TestBatchReview(TestCase):
+    changes = [{'diff': '@@ -1 +1 @@\n-a\n+b', 'new_path': 'a.py', 'additions': 1, 'deletions': 1}]
+
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original = (JobService.DB_FILE, BatchReviewService.DB_FILE, LocalBatchBackend.DIR)
+        JobService.DB_FILE = BatchReviewService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        LocalBatchBackend.DIR = os.path.join(self.db_dir.name, 'batches')
+        JobService.init_db()
+        BatchReviewService.init_db()
+        self.client = MagicMock(provider='fake', default_model='fake-model')
+        patcher = patch('biz.llm.factory.Factory.getClient', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        JobService.DB_FILE, BatchReviewService.DB_FILE, LocalBatchBackend.DIR = self.original
+        self.db_dir.cleanup()
+
+    def _queue_push_review(self):
+        batch_request = CodeReviewer().batch_request(self.changes, 'fix bug')
+        self.assertIsNotNone(batch_request)
+        entity = PushReviewEntity(project_name='demo', author='dev', branch='main', updated_at=0, commits=[],
+                                  score=0, review_result=None, url_slug='git_example_com',
+                                  webhook_data={'repository': {'full_name': 'group/demo'}}, additions=1, deletions=1)
+        worker._submit_push_review_batch('github', 'token', 'https://github.com', entity, batch_request)
+
+    def test_batched_review_published_after_poll(self, post_review_note, event_manager):
+        self.client.completions.return_value = '总分:85分'
+        self._queue_push_review()
+        # 入队时只写入请求并创建一个轮询任务，不调用 LLM
+        self.client.completions.assert_not_called()
+        self._queue_push_review()
+        self.assertEqual(JobService.queue_depth(deferred=True), 1)
+
+        worker.process_review_batches('')
+
+        self.assertEqual(self.client.completions.call_count, 2)
+        self.assertEqual(post_review_note.call_count, 2)
+        entity = event_manager['push_reviewed'].send.call_args.args[0]
+        self.assertEqual((entity.project_name, entity.score, entity.review_result), ('demo', 85, '总分:85分'))
+        self.assertFalse(BatchReviewService.has_unfinished(''))
+
+    def test_failed_request_falls_back_to_synchronous_review(self, post_review_note, event_manager):
+        self.client.completions.side_effect = [Exception('batch item failed'), '总分:70分']
+        self._queue_push_review()
+
+        worker.process_review_batches('')
+
+        self.assertEqual(post_review_note.call_args.args[1], '总分:70分')
+        self.assertFalse(BatchReviewService.has_unfinished(''))
+
+    def test_expired_publishing_claim_is_published_again(self, post_review_note, event_manager):
+        self.client.completions.return_value = '总分:85分'
+        self._queue_push_review()
+        worker.submit_due_batches('')
+        worker.poll_submitted_batches('')
+        # 模拟领取后进程崩溃：租约未过期时不会被重复领取，过期后由下一次轮询重新发布
+        self.assertIsNotNone(BatchReviewService.claim_finished('', 60))
+        self.assertIsNone(BatchReviewService.claim_finished('', 60))
+        self.assertTrue(BatchReviewService.has_unfinished(''))
+
+        with patch('biz.service.batch_review_service.time.time', return_value=time.time() + 120):
+            worker.process_review_batches('')
+
+        self.assertEqual(post_review_note.call_count, 1)
+        self.assertFalse(BatchReviewService.has_unfinished(''))
+
+    def test_routed_model_not_sent_to_other_batch_provider(self, post_review_note, event_manager):
+        batch_client = MagicMock(provider='openai', default_model='gpt-batch')
+        reviewer = CodeReviewer()
+        reviewer.model = 'fake-strong-model'
+        with patch.dict(os.environ, {'PUSH_REVIEW_BATCH_PROVIDER': 'openai'}), \
+                patch('biz.llm.factory.Factory.getClient',
+                      side_effect=lambda provider=None: batch_client if provider == 'openai' else self.client), \
+                patch('biz.utils.code_reviewer.ReviewCacheService') as review_cache:
+            review_cache.get.return_value = None
+            batch_request = reviewer.batch_request(self.changes, 'fix bug')
+
+        # 路由选出的是 LLM_PROVIDER 的模型，批次经 openai 执行时使用其默认模型，缓存键同样按 openai 计算
+        self.assertEqual((batch_request['provider'], batch_request['model']), ('openai', 'gpt-batch'))
+        self.assertEqual(review_cache.make_key.call_args.args[1:], ('openai', 'gpt-batch'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+from unittest import TestCase, main
+
+from biz.queue.fair_queue import FairScheduler, parse_weights, job_priority, PRIORITY_PUSH, \
+    PRIORITY_MERGE_REQUEST, PRIORITY_PROTECTED_MERGE_REQUEST
+
+
+class TestFairScheduler(TestCase):
+    def _run(self, scheduler: FairScheduler, backlog: dict, rounds: int) -> list:
+        """模拟调度：backlog 为 分组 -> 排队任务优先级列表，返回每轮选中的分组"""
+        next_id = 0
+        queues = {}
+        for key, priorities in backlog.items():
+            queues[key] = []
+            for priority in priorities:
+                next_id += 1
+                queues[key].append({'id': next_id, 'fair_key': key, 'priority': priority})
+        picked = []
+        for _ in range(rounds):
+            heads = [q[0] for q in queues.values() if q]
+            job = scheduler.select(heads)
+            queues[job['fair_key']].pop(0)
+            picked.append(job['fair_key'])
+        return picked
+
+    def test_noisy_project_does_not_starve_others(self):
+        """测试高频推送的项目不会饿死其他项目"""
+        picked = self._run(FairScheduler(), {'monorepo': [PRIORITY_PUSH] * 100, 'team': [PRIORITY_PUSH] * 3}, 6)
+        self.assertEqual(picked.count('team'), 3)
+
+    def test_weights_and_priority_share(self):
+        """测试权重及优先级越高，获得的调度份额越大"""
+        picked = self._run(FairScheduler({'core': 3}), {'core': [PRIORITY_PUSH] * 50, 'other': [PRIORITY_PUSH] * 50},
+                           40)
+        self.assertEqual(picked.count('core'), 30)
+
+        picked = self._run(FairScheduler(), {'mr': [PRIORITY_MERGE_REQUEST] * 50, 'push': [PRIORITY_PUSH] * 50}, 30)
+        self.assertEqual(picked.count('mr'), 20)
+
+    def test_parse_weights_and_priority(self):
+        self.assertEqual(parse_weights('group/monorepo:0.5, core:2,invalid'), {'group/monorepo': 0.5, 'core': 2.0})
+        self.assertEqual(job_priority(False, 'main'), PRIORITY_PUSH)
+        self.assertEqual(job_priority(True, 'feature/x'), PRIORITY_MERGE_REQUEST)
+        self.assertEqual(job_priority(True, 'release/1.0'), PRIORITY_PROTECTED_MERGE_REQUEST)
+
+
+if __name__ == '__main__':
+    main()
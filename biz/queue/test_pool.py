@@ -0,0 +1,102 @@
+import os
+import queue
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import MagicMock
+
+from biz.queue.pool import WorkerPool
+from biz.service.job_service import JobService
+
+
+def _append_pid(path: str, value: str):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(f"{value}:{os.getpid()}\n")
+
+
+def _sleep(seconds: float):
+    time.sleep(seconds)
+
+
+class TestWorkerPool(TestCase):
+    def setUp(self):
+        fd, self.output_file = tempfile.mkstemp()
+        os.close(fd)
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = JobService.DB_FILE
+        JobService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        JobService.init_db()
+
+    def tearDown(self):
+        JobService.DB_FILE = self.original_db_file
+        self.db_dir.cleanup()
+        os.remove(self.output_file)
+
+    def _wait_for_completed(self, pool: WorkerPool, expected: int, timeout: float = 10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if pool.stats()['completed'] >= expected:
+                return
+            time.sleep(0.05)
+        self.fail(f"jobs not completed in time: {pool.stats()}")
+
+    def test_jobs_are_processed_and_workers_recycled(self):
+        """测试任务被执行，且 Worker 处理 max_jobs 个任务后被回收重建"""
+        pool = WorkerPool(size=1, max_jobs_per_worker=2)
+        pool.start()
+        try:
+            for i in range(5):
+                pool.submit(_append_pid, self.output_file, str(i))
+            self._wait_for_completed(pool, 5)
+
+            with open(self.output_file, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(sorted(line.split(':')[0] for line in lines), ['0', '1', '2', '3', '4'])
+            self.assertGreaterEqual(len({line.split(':')[1] for line in lines}), 3)
+            self.assertEqual(pool.queue_depth(), 0)
+            self.assertEqual(JobService.get_job(1)['status'], JobService.STATUS_DONE)
+        finally:
+            pool.shutdown()
+
+    def test_drain_finishes_in_flight_jobs_and_releases_unfinished(self):
+        """测试排空时执行中的任务完成，超时未完成的任务放回队列且不计入尝试次数，之后不再领取新任务"""
+        pool = WorkerPool(size=1, max_jobs_per_worker=0, concurrency=2)
+        pool.start()
+        short_job = pool.submit(_sleep, 0.5)
+        long_job = pool.submit(_sleep, 30)
+        deadline = time.time() + 10
+        while pool.stats()['in_flight'] < 2 and time.time() < deadline:
+            time.sleep(0.05)
+
+        pool.drain(timeout=2)
+        pending_job = pool.submit(_sleep, 0)
+
+        self.assertEqual(JobService.get_job(short_job)['status'], JobService.STATUS_DONE)
+        released = JobService.get_job(long_job)
+        self.assertEqual(released['status'], JobService.STATUS_QUEUED)
+        self.assertEqual(released['attempts'], 0)
+        self.assertEqual(JobService.get_job(pending_job)['status'], JobService.STATUS_QUEUED)
+
+    def test_jobs_of_dead_worker_released_even_if_not_started(self):
+        """测试任务分发时即记录所属 Worker，Worker 在开始执行前退出时任务同样放回队列"""
+        pool = WorkerPool(size=1, max_jobs_per_worker=0, concurrency=2)
+        worker = MagicMock(exitcode=-9)
+        worker.is_alive.return_value = True
+        pool._workers, pool._job_queues, pool._assigned = {123: worker}, {123: queue.Queue()}, {123: 0}
+        pool._running = True
+        job_ids = [JobService.enqueue('module:func', [i]) for i in range(3)]
+
+        pool._dispatch()
+        self.assertEqual(pool._dispatched, {job_ids[0]: 123, job_ids[1]: 123})
+        self.assertEqual(pool._job_queues[123].qsize(), 2)
+
+        worker.is_alive.return_value = False
+        pool._reap_dead_workers()
+        self.assertEqual(pool._dispatched, {})
+        for job_id in job_ids:
+            self.assertEqual(JobService.get_job(job_id)['status'], JobService.STATUS_QUEUED)
+        self.assertIn('worker exited', JobService.get_job(job_ids[0])['error'])
+
+
+if __name__ == '__main__':
+    main()
@@ -8,30 +8,99 @@ from biz.platforms.gitlab.webhook_handler import filter_changes, MergeRequestHan
 from biz.platforms.github.webhook_handler import filter_changes as filter_github_changes, PullRequestHandler as GithubPullRequestHandler, PushHandler as GithubPushHandler
 from biz.platforms.gitea.webhook_handler import filter_changes as filter_gitea_changes, PullRequestHandler as GiteaPullRequestHandler, \
     PushHandler as GiteaPushHandler
+from biz.llm.batch import submit_due_batches, poll_submitted_batches
+from biz.llm.budget import project_budget_key
+from biz.queue.context import current_job_id, job_cancelled, job_stage, JobDeferred
+from biz.queue.pipeline import run_concurrently
+from biz.queue.pool import handler_name
+from biz.service.batch_review_service import BatchReviewService
+from biz.service.job_service import JobService
 from biz.service.review_service import ReviewService
 from biz.utils.code_reviewer import CodeReviewer
 from biz.utils.im import notifier
 from biz.utils.log import logger
 
 
+def _superseded(project_name: str, stage: str) -> bool:
+    """当前 MR 任务是否已被同一 MR 更新的事件取代，取代时跳过后续步骤，避免浪费 LLM Token"""
+    if job_cancelled():
+        logger.info(f"Merge Request of {project_name} has a newer commit, skipping {stage}.")
+        return True
+    return False
+
+
+def _post_review_note(add_notes: callable, review_result: str):
+    """将review结果提交到平台的 notes"""
+    with job_stage('note_post', 'publishing'):
+        add_notes(f'Auto Review Result: \n{review_result}')
+
+
+class _ProgressiveNote:
+    """
+    MR 的 Review 评论：开启流式 Review(REVIEW_STREAMING_ENABLED=1)时先发布占位评论，随 LLM 输出逐步更新，
+    完成后更新为最终结果；未开启时只在最后发布一次评论
+    """
+
+    def __init__(self, add_note: callable, update_note: callable):
+        self.add_note = add_note
+        self.update_note = update_note
+        self.note_id = None
+
+    def __enter__(self):
+        if os.environ.get('REVIEW_STREAMING_ENABLED', '0') == '1':
+            with job_stage('note_post'):
+                self.note_id = self.add_note('Auto Review Result: \n⏳ AI Review 进行中，结果将在生成过程中持续更新...')
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if isinstance(exc_value, JobDeferred) and self.note_id:
+            self.update_note(self.note_id, f'Auto Review Result: \n⏳ {exc_value}，AI Review 已推迟，稍后自动重新执行。')
+        elif exc_type and self.note_id:
+            self.update_note(self.note_id, 'Auto Review Result: \nAI Review 出错，请稍后重试或联系管理员查看服务日志。')
+        return False
+
+    @property
+    def on_progress(self):
+        """传给 CodeReviewer 的流式输出回调，没有占位评论时为 None(不使用流式调用)"""
+        return self._update if self.note_id else None
+
+    def _update(self, partial_result: str):
+        with job_stage('note_post'):
+            self.update_note(self.note_id, f'Auto Review Result: \n{partial_result}\n\n⏳ AI Review 进行中...')
+
+    def publish(self, review_result: str):
+        """发布最终的 Review 结果"""
+        if not self.note_id:
+            _post_review_note(self.add_note, review_result)
+            return
+        with job_stage('note_post', 'publishing'):
+            self.update_note(self.note_id, f'Auto Review Result: \n{review_result}')
+
+    def discard(self, reason: str):
+        if self.note_id:
+            self.update_note(self.note_id, f'Auto Review Result: \n{reason}')
+
 
 def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gitlab_url_slug: str):
     push_review_enabled = os.environ.get('PUSH_REVIEW_ENABLED', '0') == '1'
     try:
         handler = PushHandler(webhook_data, gitlab_token, gitlab_url)
         logger.info('Push Hook event received')
-        commits = handler.get_push_commits()
+        with job_stage('platform_fetch', 'fetching'):
+            commits = handler.get_push_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
 
         review_result = None
+        batch_request = None
         score = 0
         additions = 0
         deletions = 0
         if push_review_enabled:
             # 获取PUSH的changes
-            changes = handler.get_push_changes()
+            with job_stage('platform_fetch', 'fetching'):
+                changes = handler.get_push_changes()
             logger.info('changes: %s', changes)
             changes = filter_changes(changes)
             if not changes:
@@ -40,15 +109,18 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
 
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-                score = CodeReviewer.parse_review_score(review_text=review_result)
+                reviewer = CodeReviewer(project_budget_key(
+                    webhook_data['project'].get('path_with_namespace') or webhook_data['project']['name'],
+                    gitlab_url_slug))
+                batch_request = reviewer.batch_request(changes, commits_text)
+                if not batch_request:
+                    review_result = reviewer.review_changes(changes, commits_text)
+                    score = CodeReviewer.parse_review_score(review_text=review_result)
                 for item in changes:
                     additions += item['additions']
                     deletions += item['deletions']
-            # 将review结果提交到Gitlab的 notes
-            handler.add_push_notes(f'Auto Review Result: \n{review_result}')
 
-        event_manager['push_reviewed'].send(PushReviewEntity(
+        entity = PushReviewEntity(
             project_name=webhook_data['project']['name'],
             author=webhook_data['user_username'],
             branch=webhook_data.get('ref', '').replace('refs/heads/', ''),
@@ -60,12 +132,24 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
             webhook_data=webhook_data,
             additions=additions,
             deletions=deletions,
-        ))
-
+        )
+        if batch_request:
+            _submit_push_review_batch('gitlab', gitlab_token, gitlab_url, entity, batch_request)
+        elif push_review_enabled:
+            # 将review结果提交到Gitlab的 notes，同时发送通知、记录日志
+            run_concurrently(lambda: _post_review_note(handler.add_push_notes, review_result),
+                             lambda: event_manager['push_reviewed'].send(entity))
+        else:
+            event_manager['push_reviewed'].send(entity)
+
+    except JobDeferred:
+        raise
     except Exception as e:
         error_message = f'服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        # 交由进程池将任务标记为失败
+        raise
 
 
 def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gitlab_url_slug: str):
@@ -113,8 +197,9 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
                 return
 
         # 仅仅在MR创建或更新时进行Code Review
-        # 获取Merge Request的changes
-        changes = handler.get_merge_request_changes()
+        # 并发获取Merge Request的changes和commits
+        with job_stage('platform_fetch', 'fetching'):
+            changes, commits = run_concurrently(handler.get_merge_request_changes, handler.get_merge_request_commits)
         logger.info('changes: %s', changes)
         changes = filter_changes(changes)
         if not changes:
@@ -127,61 +212,73 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
             additions += item.get('additions', 0)
             deletions += item.get('deletions', 0)
 
-        # 获取Merge Request的commits
-        commits = handler.get_merge_request_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
 
+        if _superseded(webhook_data['project']['name'], 'review'):
+            return
+
         # review 代码
         commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-
-        # 将review结果提交到Gitlab的 notes
-        handler.add_merge_request_notes(f'Auto Review Result: \n{review_result}')
-
-        # dispatch merge_request_reviewed event
-        event_manager['merge_request_reviewed'].send(
-            MergeRequestReviewEntity(
-                project_name=webhook_data['project']['name'],
-                author=webhook_data['user']['username'],
-                source_branch=webhook_data['object_attributes']['source_branch'],
-                target_branch=webhook_data['object_attributes']['target_branch'],
-                updated_at=int(datetime.now().timestamp()),
-                commits=commits,
-                score=CodeReviewer.parse_review_score(review_text=review_result),
-                url=webhook_data['object_attributes']['url'],
-                review_result=review_result,
-                url_slug=gitlab_url_slug,
-                webhook_data=webhook_data,
-                additions=additions,
-                deletions=deletions,
-                last_commit_id=last_commit_id,
-            )
+        with _ProgressiveNote(handler.add_merge_request_notes, handler.update_merge_request_note) as note:
+            reviewer = CodeReviewer(project_budget_key(
+                webhook_data['project'].get('path_with_namespace') or webhook_data['project']['name'], gitlab_url_slug))
+            review_result = reviewer.review_changes(changes, commits_text, on_progress=note.on_progress)
+
+        if _superseded(webhook_data['project']['name'], 'adding notes'):
+            note.discard('本次 Review 已被更新的提交取代。')
+            return
+
+        entity = MergeRequestReviewEntity(
+            project_name=webhook_data['project']['name'],
+            author=webhook_data['user']['username'],
+            source_branch=webhook_data['object_attributes']['source_branch'],
+            target_branch=webhook_data['object_attributes']['target_branch'],
+            updated_at=int(datetime.now().timestamp()),
+            commits=commits,
+            score=CodeReviewer.parse_review_score(review_text=review_result),
+            url=webhook_data['object_attributes']['url'],
+            review_result=review_result,
+            url_slug=gitlab_url_slug,
+            webhook_data=webhook_data,
+            additions=additions,
+            deletions=deletions,
+            last_commit_id=last_commit_id,
         )
+        # 将review结果提交到Gitlab的 notes，同时 dispatch merge_request_reviewed event
+        run_concurrently(lambda: note.publish(review_result),
+                         lambda: event_manager['merge_request_reviewed'].send(entity))
 
+    except JobDeferred:
+        raise
     except Exception as e:
         error_message = f'AI Code Review 服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        # 交由进程池将任务标记为失败
+        raise
 
 def handle_github_push_event(webhook_data: dict, github_token: str, github_url: str, github_url_slug: str):
     push_review_enabled = os.environ.get('PUSH_REVIEW_ENABLED', '0') == '1'
     try:
         handler = GithubPushHandler(webhook_data, github_token, github_url)
         logger.info('GitHub Push event received')
-        commits = handler.get_push_commits()
+        with job_stage('platform_fetch', 'fetching'):
+            commits = handler.get_push_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
 
         review_result = None
+        batch_request = None
         score = 0
         additions = 0
         deletions = 0
         if push_review_enabled:
             # 获取PUSH的changes
-            changes = handler.get_push_changes()
+            with job_stage('platform_fetch', 'fetching'):
+                changes = handler.get_push_changes()
             logger.info('changes: %s', changes)
             changes = filter_github_changes(changes)
             if not changes:
@@ -190,15 +287,17 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
 
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-                score = CodeReviewer.parse_review_score(review_text=review_result)
+                reviewer = CodeReviewer(project_budget_key(
+                    webhook_data['repository'].get('full_name') or webhook_data['repository']['name'], github_url_slug))
+                batch_request = reviewer.batch_request(changes, commits_text)
+                if not batch_request:
+                    review_result = reviewer.review_changes(changes, commits_text)
+                    score = CodeReviewer.parse_review_score(review_text=review_result)
                 for item in changes:
                     additions += item.get('additions', 0)
                     deletions += item.get('deletions', 0)
-            # 将review结果提交到GitHub的 notes
-            handler.add_push_notes(f'Auto Review Result: \n{review_result}')
 
-        event_manager['push_reviewed'].send(PushReviewEntity(
+        entity = PushReviewEntity(
             project_name=webhook_data['repository']['name'],
             author=webhook_data['sender']['login'],
             branch=webhook_data['ref'].replace('refs/heads/', ''),
@@ -210,12 +309,24 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
             webhook_data=webhook_data,
             additions=additions,
             deletions=deletions,
-        ))
-
+        )
+        if batch_request:
+            _submit_push_review_batch('github', github_token, github_url, entity, batch_request)
+        elif push_review_enabled:
+            # 将review结果提交到GitHub的 notes，同时发送通知、记录日志
+            run_concurrently(lambda: _post_review_note(handler.add_push_notes, review_result),
+                             lambda: event_manager['push_reviewed'].send(entity))
+        else:
+            event_manager['push_reviewed'].send(entity)
+
+    except JobDeferred:
+        raise
     except Exception as e:
         error_message = f'服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        # 交由进程池将任务标记为失败
+        raise
 
 
 def handle_github_pull_request_event(webhook_data: dict, github_token: str, github_url: str, github_url_slug: str):
@@ -253,8 +364,9 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
                 return
 
         # 仅仅在PR创建或更新时进行Code Review
-        # 获取Pull Request的changes
-        changes = handler.get_pull_request_changes()
+        # 并发获取Pull Request的changes和commits
+        with job_stage('platform_fetch', 'fetching'):
+            changes, commits = run_concurrently(handler.get_pull_request_changes, handler.get_pull_request_commits)
         logger.info('changes: %s', changes)
         changes = filter_github_changes(changes)
         if not changes:
@@ -267,42 +379,52 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
             additions += item.get('additions', 0)
             deletions += item.get('deletions', 0)
 
-        # 获取Pull Request的commits
-        commits = handler.get_pull_request_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
 
+        if _superseded(webhook_data['repository']['name'], 'review'):
+            return
+
         # review 代码
         commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-
-        # 将review结果提交到GitHub的 notes
-        handler.add_pull_request_notes(f'Auto Review Result: \n{review_result}')
-
-        # dispatch pull_request_reviewed event
-        event_manager['merge_request_reviewed'].send(
-            MergeRequestReviewEntity(
-                project_name=webhook_data['repository']['name'],
-                author=webhook_data['pull_request']['user']['login'],
-                source_branch=webhook_data['pull_request']['head']['ref'],
-                target_branch=webhook_data['pull_request']['base']['ref'],
-                updated_at=int(datetime.now().timestamp()),
-                commits=commits,
-                score=CodeReviewer.parse_review_score(review_text=review_result),
-                url=webhook_data['pull_request']['html_url'],
-                review_result=review_result,
-                url_slug=github_url_slug,
-                webhook_data=webhook_data,
-                additions=additions,
-                deletions=deletions,
-                last_commit_id=github_last_commit_id,
-            ))
+        with _ProgressiveNote(handler.add_pull_request_notes, handler.update_pull_request_note) as note:
+            reviewer = CodeReviewer(project_budget_key(
+                webhook_data['repository'].get('full_name') or webhook_data['repository']['name'], github_url_slug))
+            review_result = reviewer.review_changes(changes, commits_text, on_progress=note.on_progress)
+
+        if _superseded(webhook_data['repository']['name'], 'adding notes'):
+            note.discard('本次 Review 已被更新的提交取代。')
+            return
+
+        entity = MergeRequestReviewEntity(
+            project_name=webhook_data['repository']['name'],
+            author=webhook_data['pull_request']['user']['login'],
+            source_branch=webhook_data['pull_request']['head']['ref'],
+            target_branch=webhook_data['pull_request']['base']['ref'],
+            updated_at=int(datetime.now().timestamp()),
+            commits=commits,
+            score=CodeReviewer.parse_review_score(review_text=review_result),
+            url=webhook_data['pull_request']['html_url'],
+            review_result=review_result,
+            url_slug=github_url_slug,
+            webhook_data=webhook_data,
+            additions=additions,
+            deletions=deletions,
+            last_commit_id=github_last_commit_id,
+        )
+        # 将review结果提交到GitHub的 notes，同时 dispatch pull_request_reviewed event
+        run_concurrently(lambda: note.publish(review_result),
+                         lambda: event_manager['merge_request_reviewed'].send(entity))
 
+    except JobDeferred:
+        raise
     except Exception as e:
         error_message = f'服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        # 交由进程池将任务标记为失败
+        raise
 
 
 def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str, gitea_url_slug: str):
@@ -310,17 +432,20 @@ def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str
     try:
         handler = GiteaPushHandler(webhook_data, gitea_token, gitea_url)
         logger.info('Gitea Push event received')
-        commits = handler.get_push_commits()
+        with job_stage('platform_fetch', 'fetching'):
+            commits = handler.get_push_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
 
         review_result = None
+        batch_request = None
         score = 0
         additions = 0
         deletions = 0
         if push_review_enabled:
-            changes = handler.get_push_changes()
+            with job_stage('platform_fetch', 'fetching'):
+                changes = handler.get_push_changes()
             logger.info('changes: %s', changes)
             changes = filter_gitea_changes(changes)
             if not changes:
@@ -329,17 +454,21 @@ def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str
 
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-                score = CodeReviewer.parse_review_score(review_text=review_result)
+                reviewer = CodeReviewer(project_budget_key(
+                    webhook_data.get('repository', {}).get('full_name') or webhook_data.get('repository', {}).get('name'),
+                    gitea_url_slug))
+                batch_request = reviewer.batch_request(changes, commits_text)
+                if not batch_request:
+                    review_result = reviewer.review_changes(changes, commits_text)
+                    score = CodeReviewer.parse_review_score(review_text=review_result)
                 for item in changes:
                     additions += item.get('additions', 0)
                     deletions += item.get('deletions', 0)
-            handler.add_push_notes(f'Auto Review Result: \n{review_result}')
 
         repository = webhook_data.get('repository', {})
         sender = webhook_data.get('sender', {}) or webhook_data.get('pusher', {}) or {}
 
-        event_manager['push_reviewed'].send(PushReviewEntity(
+        entity = PushReviewEntity(
             project_name=repository.get('name'),
             author=sender.get('login') or sender.get('username'),
             branch=handler.branch_name,
@@ -351,12 +480,23 @@ def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str
             webhook_data=webhook_data,
             additions=additions,
             deletions=deletions,
-        ))
-
+        )
+        if batch_request:
+            _submit_push_review_batch('gitea', gitea_token, gitea_url, entity, batch_request)
+        elif push_review_enabled:
+            run_concurrently(lambda: _post_review_note(handler.add_push_notes, review_result),
+                             lambda: event_manager['push_reviewed'].send(entity))
+        else:
+            event_manager['push_reviewed'].send(entity)
+
+    except JobDeferred:
+        raise
     except Exception as e:
         error_message = f'服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        # 交由进程池将任务标记为失败
+        raise
 
 
 def handle_gitea_pull_request_event(webhook_data: dict, gitea_token: str, gitea_url: str, gitea_url_slug: str):
@@ -388,7 +528,9 @@ def handle_gitea_pull_request_event(webhook_data: dict, gitea_token: str, gitea_
                 logger.info(f"Pull Request with last_commit_id {last_commit_id} already exists, skipping review for {project_name}.")
                 return
 
-        changes = handler.get_pull_request_changes()
+        with job_stage('platform_fetch', 'fetching'):
+
+            changes, commits = run_concurrently(handler.get_pull_request_changes, handler.get_pull_request_commits)
         logger.info('changes: %s', changes)
         changes = filter_gitea_changes(changes)
         if not changes:
@@ -401,38 +543,117 @@ def handle_gitea_pull_request_event(webhook_data: dict, gitea_token: str, gitea_
             additions += item.get('additions', 0)
             deletions += item.get('deletions', 0)
 
-        commits = handler.get_pull_request_commits()
         if not commits:
             logger.error('Failed to get commits for Gitea pull request')
             return
 
-        commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+        if _superseded(webhook_data.get('repository', {}).get('name'), 'review'):
+            return
 
-        handler.add_pull_request_notes(f'Auto Review Result: \n{review_result}')
+        commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
+        with _ProgressiveNote(handler.add_pull_request_notes, handler.update_pull_request_note) as note:
+            reviewer = CodeReviewer(project_budget_key(
+                webhook_data.get('repository', {}).get('full_name') or webhook_data.get('repository', {}).get('name'),
+                gitea_url_slug))
+            review_result = reviewer.review_changes(changes, commits_text, on_progress=note.on_progress)
+
+        if _superseded(webhook_data.get('repository', {}).get('name'), 'adding notes'):
+            note.discard('本次 Review 已被更新的提交取代。')
+            return
 
         repository = webhook_data.get('repository', {})
         author_info = pull_request.get('user', {}) or webhook_data.get('sender', {}) or {}
 
-        event_manager['merge_request_reviewed'].send(
-            MergeRequestReviewEntity(
-                project_name=repository.get('name'),
-                author=author_info.get('login') or author_info.get('username'),
-                source_branch=head_info.get('ref') or pull_request.get('head_branch', ''),
-                target_branch=base_info.get('ref') or pull_request.get('base_branch', ''),
-                updated_at=int(datetime.now().timestamp()),
-                commits=commits,
-                score=CodeReviewer.parse_review_score(review_text=review_result),
-                url=pull_request.get('html_url') or pull_request.get('url'),
-                review_result=review_result,
-                url_slug=gitea_url_slug,
-                webhook_data=webhook_data,
-                additions=additions,
-                deletions=deletions,
-                last_commit_id=last_commit_id,
-            ))
+        entity = MergeRequestReviewEntity(
+            project_name=repository.get('name'),
+            author=author_info.get('login') or author_info.get('username'),
+            source_branch=head_info.get('ref') or pull_request.get('head_branch', ''),
+            target_branch=base_info.get('ref') or pull_request.get('base_branch', ''),
+            updated_at=int(datetime.now().timestamp()),
+            commits=commits,
+            score=CodeReviewer.parse_review_score(review_text=review_result),
+            url=pull_request.get('html_url') or pull_request.get('url'),
+            review_result=review_result,
+            url_slug=gitea_url_slug,
+            webhook_data=webhook_data,
+            additions=additions,
+            deletions=deletions,
+            last_commit_id=last_commit_id,
+        )
+        run_concurrently(lambda: note.publish(review_result),
+                         lambda: event_manager['merge_request_reviewed'].send(entity))
 
+    except JobDeferred:
+        raise
     except Exception as e:
         error_message = f'AI Code Review 服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        # 交由进程池将任务标记为失败
+        raise
+
+
+_PUSH_HANDLERS = {'gitlab': PushHandler, 'github': GithubPushHandler, 'gitea': GiteaPushHandler}
+
+
+def _batch_poll_interval() -> float:
+    return float(os.getenv('PUSH_REVIEW_BATCH_POLL_INTERVAL', 60))
+
+
+def _submit_push_review_batch(platform: str, token: str, url: str, entity: PushReviewEntity, batch_request: dict):
+    """
+    Push Review 写入批量请求表，由同一分区的 process_review_batches 轮询任务攒批提交，完成后发布评论、记录审查日志
+    """
+    job = JobService.get_job(current_job_id()) if current_job_id() else None
+    queue_name = job['queue_name'] if job else ''
+    context = {'platform': platform, 'token': token, 'url': url, 'entity': vars(entity)}
+    request_id = BatchReviewService.add(queue_name, context=context, **batch_request)
+    logger.info(f"Push review of {entity.project_name} queued as batch review request {request_id}.")
+    # 检查与入队在同一个事务中完成，并发的 Push 只会创建一个轮询任务
+    JobService.enqueue(handler_name(process_review_batches), [queue_name], coalesce_key=f"review_batches:{queue_name}",
+                       delay_seconds=_batch_poll_interval(), queue_name=queue_name, keep_queued=True)
+
+
+def _publish_batched_push_review(request: dict):
+    context = request['context']
+    review_result = CodeReviewer(request['budget_key']).finish_batch_request(request)
+    entity = PushReviewEntity(**context['entity'])
+    entity.review_result = review_result
+    entity.score = CodeReviewer.parse_review_score(review_text=review_result)
+    entity.updated_at = int(datetime.now().timestamp())
+    handler = _PUSH_HANDLERS[context['platform']](entity.webhook_data, context['token'], context['url'])
+    run_concurrently(lambda: _post_review_note(handler.add_push_notes, review_result),
+                     lambda: event_manager['push_reviewed'].send(entity))
+    BatchReviewService.mark_published(request['id'], review_result)
+
+
+def process_review_batches(queue_name: str):
+    """
+    批量 Review 轮询任务：提交到期的批次、查询已提交批次的结果，并发布已有结果的 Push Review；
+    仍有未完成的请求时推迟 PUSH_REVIEW_BATCH_POLL_INTERVAL 秒后再次执行
+    """
+    for step in (submit_due_batches, poll_submitted_batches):
+        try:
+            step(queue_name)
+        except Exception as e:
+            # 供应商接口暂时不可用时等待下一次轮询
+            logger.error(f"{step.__name__} of queue '{queue_name}' failed: {e}\n{traceback.format_exc()}")
+
+    while True:
+        # 发布中进程崩溃的请求在租约过期后由之后的轮询重新发布
+        request = BatchReviewService.claim_finished(queue_name,
+                                                    float(os.getenv('PUSH_REVIEW_BATCH_PUBLISH_LEASE', 600)))
+        if request is None:
+            break
+        try:
+            _publish_batched_push_review(request)
+        except Exception as e:
+            BatchReviewService.fail(request['id'], str(e))
+            error_message = f'批量 Review 结果发布失败: {str(e)}\n{traceback.format_exc()}'
+            notifier.send_notification(content=error_message)
+            logger.error('出现未知错误: %s', error_message)
+
+    # 轮询期间有新的 Push 入队了另一个轮询任务时，由新任务继续轮询
+    if BatchReviewService.has_unfinished(queue_name) and \
+            not JobService.has_queued(handler_name(process_review_batches), queue_name):
+        raise JobDeferred(_batch_poll_interval(), 'waiting for review batches')
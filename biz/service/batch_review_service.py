@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+class BatchReviewService:
+    """
+    批量 Review 请求：开启 PUSH_REVIEW_BATCH_ENABLED 时，Push 的 Review 请求先写入此表，
+    由轮询任务攒批后经供应商的 Batch 接口提交，完成后发布评论并记录审查日志。
+    状态流转：pending(待提交) -> submitted(已提交) -> finished(已有结果或失败) -> publishing -> published(已发布)，
+    发布出错的请求标记为 failed，不再重试；发布中的请求带有租约，进程崩溃导致租约过期后重新发布
+    """
+    # 批量请求在提交、轮询、发布的节点间共享，与任务队列共用 QUEUE_DB_FILE 指向的数据库
+    DB_FILE = os.getenv("QUEUE_DB_FILE", "data/data.db")
+
+    STATUS_PENDING = 'pending'
+    STATUS_SUBMITTED = 'submitted'
+    STATUS_FINISHED = 'finished'
+    STATUS_PUBLISHING = 'publishing'
+    STATUS_PUBLISHED = 'published'
+    STATUS_FAILED = 'failed'
+
+    @staticmethod
+    @contextmanager
+    def _connect():
+        conn = sqlite3.connect(BatchReviewService.DB_FILE, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def init_db():
+        """初始化批量 Review 请求表"""
+        try:
+            with BatchReviewService._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS batch_review_request (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            queue_name TEXT DEFAULT '',
+                            provider TEXT,
+                            model TEXT,
+                            budget_key TEXT DEFAULT '',
+                            cache_key TEXT DEFAULT '',
+                            messages TEXT NOT NULL,
+                            context TEXT NOT NULL,
+                            status TEXT NOT NULL DEFAULT 'pending',
+                            batch_id TEXT DEFAULT '',
+                            result TEXT DEFAULT '',
+                            error TEXT DEFAULT '',
+                            lease_expires_at REAL DEFAULT 0,
+                            created_at REAL,
+                            updated_at REAL
+                        )
+                    ''')
+                # 为旧版本的batch_review_request表补充字段
+                current_columns = [col[1] for col in
+                                   conn.execute("PRAGMA table_info('batch_review_request')").fetchall()]
+                if 'lease_expires_at' not in current_columns:
+                    conn.execute("ALTER TABLE batch_review_request ADD COLUMN lease_expires_at REAL DEFAULT 0")
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_batch_review_request_status ON batch_review_request '
+                             '(queue_name, status, id);')
+        except sqlite3.DatabaseError as e:
+            print(f"Batch review table initialization failed: {e}")
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict[str, Any]:
+        request = dict(row)
+        request['messages'] = json.loads(request['messages'])
+        request['context'] = json.loads(request['context'])
+        return request
+
+    @staticmethod
+    def add(queue_name: str, provider: str, model: str, messages: List[Dict[str, Any]], context: Dict[str, Any],
+            budget_key: str = '', cache_key: str = '') -> int:
+        """
+        追加待提交的 Review 请求，返回请求ID
+        :param context: 发布结果所需的信息(平台、Token、审查日志实体等)
+        """
+        now = time.time()
+        with BatchReviewService._connect() as conn:
+            cursor = conn.execute('''
+                    INSERT INTO batch_review_request (queue_name, provider, model, budget_key, cache_key, messages,
+                    context, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (queue_name, provider, model, budget_key or '', cache_key or '',
+                      json.dumps(messages, ensure_ascii=False), json.dumps(context, ensure_ascii=False),
+                      BatchReviewService.STATUS_PENDING, now, now))
+            return cursor.lastrowid
+
+    @staticmethod
+    def list_pending(queue_name: str, provider: str, limit: int) -> List[Dict[str, Any]]:
+        """某个分区、供应商待提交的请求，按入队顺序排列"""
+        with BatchReviewService._connect() as conn:
+            rows = conn.execute('''
+                    SELECT * FROM batch_review_request WHERE queue_name = ? AND provider = ? AND status = ?
+                    ORDER BY id LIMIT ?
+                ''', (queue_name, provider, BatchReviewService.STATUS_PENDING, limit)).fetchall()
+            return [BatchReviewService._row(row) for row in rows]
+
+    @staticmethod
+    def pending_providers(queue_name: str) -> Dict[str, Dict[str, float]]:
+        """各供应商待提交的请求数及最早请求的入队时间: {provider: {'count': n, 'oldest': t}}"""
+        with BatchReviewService._connect() as conn:
+            rows = conn.execute('''
+                    SELECT provider, COUNT(*) AS count, MIN(created_at) AS oldest FROM batch_review_request
+                    WHERE queue_name = ? AND status = ? GROUP BY provider
+                ''', (queue_name, BatchReviewService.STATUS_PENDING)).fetchall()
+            return {row['provider']: {'count': row['count'], 'oldest': row['oldest']} for row in rows}
+
+    @staticmethod
+    def mark_submitted(request_ids: List[int], batch_id: str) -> int:
+        """将待提交的请求标记为已提交，返回实际标记的请求数"""
+        if not request_ids:
+            return 0
+        with BatchReviewService._connect() as conn:
+            cursor = conn.execute(f'''
+                    UPDATE batch_review_request SET status = ?, batch_id = ?, updated_at = ?
+                    WHERE status = ? AND id IN ({','.join(['?'] * len(request_ids))})
+                ''', [BatchReviewService.STATUS_SUBMITTED, batch_id, time.time(), BatchReviewService.STATUS_PENDING]
+                                  + list(request_ids))
+            return cursor.rowcount
+
+    @staticmethod
+    def list_submitted_batches(queue_name: str) -> List[Dict[str, Any]]:
+        """已提交、尚未有结果的批次: [{'provider': p, 'batch_id': b, 'requests': [{'id': i, 'budget_key': k}]}]"""
+        with BatchReviewService._connect() as conn:
+            rows = conn.execute('''
+                    SELECT id, provider, batch_id, budget_key FROM batch_review_request WHERE queue_name = ? AND status = ?
+                    ORDER BY id
+                ''', (queue_name, BatchReviewService.STATUS_SUBMITTED)).fetchall()
+        batches = {}
+        for row in rows:
+            batch = batches.setdefault((row['provider'], row['batch_id']),
+                                       {'provider': row['provider'], 'batch_id': row['batch_id'], 'requests': []})
+            batch['requests'].append({'id': row['id'], 'budget_key': row['budget_key']})
+        return list(batches.values())
+
+    @staticmethod
+    def finish(request_id: int, result: str = '', error: str = ''):
+        """记录已提交请求的结果，失败时 error 非空"""
+        with BatchReviewService._connect() as conn:
+            conn.execute('''
+                    UPDATE batch_review_request SET status = ?, result = ?, error = ?, updated_at = ?
+                    WHERE id = ? AND status = ?
+                ''', (BatchReviewService.STATUS_FINISHED, result or '', error or '', time.time(), request_id,
+                      BatchReviewService.STATUS_SUBMITTED))
+
+    @staticmethod
+    def claim_finished(queue_name: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        领取一个已有结果、待发布的请求(包括发布租约已过期的请求)，多个轮询任务并发执行时同一请求只会被领取一次
+        :param lease_seconds: 发布租约时长，超过此时长仍未发布完成(如进程崩溃)的请求会被重新领取
+        """
+        with BatchReviewService._connect() as conn:
+            while True:
+                now = time.time()
+                row = conn.execute('''
+                        SELECT * FROM batch_review_request WHERE queue_name = ?
+                        AND (status = ? OR (status = ? AND lease_expires_at < ?)) ORDER BY id LIMIT 1
+                    ''', (queue_name, BatchReviewService.STATUS_FINISHED, BatchReviewService.STATUS_PUBLISHING,
+                          now)).fetchone()
+                if row is None:
+                    return None
+                cursor = conn.execute('''
+                        UPDATE batch_review_request SET status = ?, lease_expires_at = ?, updated_at = ?
+                        WHERE id = ? AND status = ? AND lease_expires_at = ?
+                    ''', (BatchReviewService.STATUS_PUBLISHING, now + lease_seconds, now, row['id'], row['status'],
+                          row['lease_expires_at']))
+                if cursor.rowcount == 1:
+                    return BatchReviewService._row(row)
+
+    @staticmethod
+    def mark_published(request_id: int, result: str = None):
+        """标记为已发布；失败的请求改为同步 Review 后，同时记录最终结果"""
+        with BatchReviewService._connect() as conn:
+            conn.execute('''
+                    UPDATE batch_review_request SET status = ?, result = COALESCE(?, result), updated_at = ?
+                    WHERE id = ?
+                ''', (BatchReviewService.STATUS_PUBLISHED, result, time.time(), request_id))
+
+    @staticmethod
+    def fail(request_id: int, error: str):
+        """发布出错"""
+        with BatchReviewService._connect() as conn:
+            conn.execute('UPDATE batch_review_request SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                         (BatchReviewService.STATUS_FAILED, error, time.time(), request_id))
+
+    @staticmethod
+    def has_unfinished(queue_name: str) -> bool:
+        """分区中是否还有未发布的请求(包括发布中的请求，其租约过期后需要重新发布)"""
+        with BatchReviewService._connect() as conn:
+            row = conn.execute('''
+                    SELECT 1 FROM batch_review_request WHERE queue_name = ? AND status IN (?, ?, ?, ?) LIMIT 1
+                ''', (queue_name, BatchReviewService.STATUS_PENDING, BatchReviewService.STATUS_SUBMITTED,
+                      BatchReviewService.STATUS_FINISHED, BatchReviewService.STATUS_PUBLISHING)).fetchone()
+            return row is not None
+
+
+# Initialize database
+BatchReviewService.init_db()
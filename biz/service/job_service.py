@@ -0,0 +1,338 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Callable, Dict
+
+
+class JobService:
+    """
+    持久化的 Webhook 任务队列（默认与审查日志共用 data/data.db）。
+    Worker 通过租约(lease)领取任务，租约过期的任务会被重新放回队列，保证进程重启或被 kill 后任务不丢失。
+    多节点部署时，可通过 QUEUE_DB_FILE 指向共享存储上的数据库文件，API 节点只入队，Worker 节点按分区消费；
+    WAL 依赖共享内存，不能跨主机使用，此时需将 QUEUE_DB_JOURNAL_MODE 设为 DELETE。
+    """
+    DB_FILE = os.getenv("QUEUE_DB_FILE", "data/data.db")
+    JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST')
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_SUPERSEDED = 'superseded'
+    STATUS_CANCELLED = 'cancelled'
+
+    _SUMMARY_COLUMNS = ['id', 'handler', 'status', 'stage', 'stage_timings', 'llm_usage', 'attempts', 'error',
+                        'coalesce_key', 'fair_key', 'priority', 'queue_name', 'created_at', 'started_at', 'finished_at',
+                        'updated_at']
+
+    @staticmethod
+    @contextmanager
+    def _connect():
+        # 自动提交模式，需要事务时显式 BEGIN；退出时关闭连接，避免常驻进程中连接泄漏
+        conn = sqlite3.connect(JobService.DB_FILE, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def init_db():
+        """初始化任务表"""
+        try:
+            with JobService._connect() as conn:
+                # WAL 模式下读写互不阻塞，适合同一主机上的多个 Worker 进程并发领取任务；
+                # 多台主机通过共享存储访问同一数据库时只能使用回滚日志模式(DELETE 等)
+                journal_mode = os.getenv('QUEUE_DB_JOURNAL_MODE', 'WAL').upper()
+                if journal_mode not in JobService.JOURNAL_MODES:
+                    raise ValueError(f"QUEUE_DB_JOURNAL_MODE must be one of {', '.join(JobService.JOURNAL_MODES)}")
+                conn.execute(f'PRAGMA journal_mode={journal_mode}')
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS review_job (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            handler TEXT NOT NULL,
+                            payload TEXT NOT NULL,
+                            status TEXT NOT NULL DEFAULT 'queued',
+                            attempts INTEGER DEFAULT 0,
+                            lease_owner TEXT DEFAULT '',
+                            lease_expires_at REAL DEFAULT 0,
+                            error TEXT DEFAULT '',
+                            created_at REAL,
+                            updated_at REAL
+                        )
+                    ''')
+                # 为旧版本的review_job表补充字段
+                job_columns = [
+                    {"name": "coalesce_key", "type": "TEXT", "default": "''"},
+                    {"name": "available_at", "type": "REAL", "default": "0"},
+                    {"name": "cancel_requested", "type": "INTEGER", "default": "0"},
+                    {"name": "fair_key", "type": "TEXT", "default": "''"},
+                    {"name": "priority", "type": "INTEGER", "default": "1"},
+                    {"name": "queue_name", "type": "TEXT", "default": "''"},
+                    {"name": "stage", "type": "TEXT", "default": "''"},
+                    {"name": "stage_timings", "type": "TEXT", "default": "'{}'"},
+                    {"name": "started_at", "type": "REAL", "default": "0"},
+                    {"name": "finished_at", "type": "REAL", "default": "0"},
+                    {"name": "llm_usage", "type": "TEXT", "default": "'{}'"},
+                ]
+                current_columns = [col[1] for col in conn.execute("PRAGMA table_info('review_job')").fetchall()]
+                for column in job_columns:
+                    if column.get("name") not in current_columns:
+                        conn.execute(f"ALTER TABLE review_job ADD COLUMN {column.get('name')} {column.get('type')} "
+                                     f"DEFAULT {column.get('default')}")
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_review_job_status ON review_job (status, id);')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_review_job_coalesce_key ON review_job (coalesce_key);')
+        except sqlite3.DatabaseError as e:
+            print(f"Job table initialization failed: {e}")
+
+    @staticmethod
+    def enqueue(handler: str, args: list, coalesce_key: str = '', delay_seconds: float = 0, fair_key: str = '',
+                priority: int = 1, queue_name: str = '', keep_queued: bool = False) -> int:
+        """
+        追加任务，返回任务ID
+        :param coalesce_key: 合并键(如同一个MR)，相同键的旧任务中，排队的直接作废，执行中的请求取消
+        :param keep_queued: 与 coalesce_key 一起使用，已有相同键的排队任务时保留该任务并返回其ID，不再追加(如轮询任务)
+        :param delay_seconds: 延迟多少秒后才允许被领取(防抖窗口)
+        :param fair_key: 公平调度分组(项目或url_slug)
+        :param priority: 优先级，数值越大越优先
+        :param queue_name: 任务分区(url_slug 或项目)，Worker 节点只消费 WORKER_QUEUE 中配置的分区
+        """
+        now = time.time()
+        with JobService._connect() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                if coalesce_key and keep_queued:
+                    row = conn.execute('''
+                            SELECT id FROM review_job WHERE coalesce_key = ? AND status = ? ORDER BY id LIMIT 1
+                        ''', (coalesce_key, JobService.STATUS_QUEUED)).fetchone()
+                    if row:
+                        conn.execute('COMMIT')
+                        return row['id']
+                elif coalesce_key:
+                    conn.execute('''
+                            UPDATE review_job SET status = ?, updated_at = ? WHERE coalesce_key = ? AND status = ?
+                        ''', (JobService.STATUS_SUPERSEDED, now, coalesce_key, JobService.STATUS_QUEUED))
+                    conn.execute('''
+                            UPDATE review_job SET cancel_requested = 1, updated_at = ?
+                            WHERE coalesce_key = ? AND status = ?
+                        ''', (now, coalesce_key, JobService.STATUS_RUNNING))
+                cursor = conn.execute('''
+                        INSERT INTO review_job (handler, payload, status, coalesce_key, available_at, fair_key,
+                        priority, queue_name, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (handler, json.dumps(args, ensure_ascii=False), JobService.STATUS_QUEUED, coalesce_key,
+                          now + delay_seconds, fair_key, priority, queue_name, now, now))
+                conn.execute('COMMIT')
+            except sqlite3.DatabaseError:
+                conn.execute('ROLLBACK')
+                raise
+            return cursor.lastrowid
+
+    @staticmethod
+    def claim(owner: str, lease_seconds: float, select: Callable[[List[dict]], dict] = None,
+              queue_names: List[str] = None) -> Optional[dict]:
+        """
+        领取排队任务并加租约，没有可领取的任务时返回 None
+        :param select: 从每个公平调度分组的队首任务中选出要领取的任务，默认领取最早入队的任务
+        :param queue_names: 只领取这些分区的任务，为空时领取所有分区
+        """
+        now = time.time()
+        params = [JobService.STATUS_QUEUED, now]
+        partition_filter = ''
+        if queue_names:
+            partition_filter = f" AND queue_name IN ({','.join(['?'] * len(queue_names))})"
+            params.extend(queue_names)
+        with JobService._connect() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                # 每个分组内按优先级、入队顺序取队首任务
+                heads = [dict(r) for r in conn.execute(f'''
+                        SELECT * FROM (
+                            SELECT *, ROW_NUMBER() OVER (PARTITION BY fair_key ORDER BY priority DESC, id) AS rn
+                            FROM review_job WHERE status = ? AND available_at <= ?{partition_filter}
+                        ) WHERE rn = 1 ORDER BY id
+                    ''', params).fetchall()]
+                row = None
+                if heads:
+                    row = select(heads) if select else heads[0]
+                    row.pop('rn', None)
+                    conn.execute('''
+                            UPDATE review_job SET status = ?, attempts = attempts + 1, lease_owner = ?,
+                            lease_expires_at = ?, stage = '', stage_timings = '{}', llm_usage = '{}',
+                            started_at = ?, updated_at = ?
+                            WHERE id = ?
+                        ''', (JobService.STATUS_RUNNING, owner, now + lease_seconds, now, now, row['id']))
+                conn.execute('COMMIT')
+            except sqlite3.DatabaseError:
+                conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job['attempts'] += 1
+        job['args'] = json.loads(job.pop('payload'))
+        return job
+
+    @staticmethod
+    def renew_leases(job_ids: List[int], owner: str, lease_seconds: float):
+        """为执行中的任务续租"""
+        if not job_ids:
+            return
+        now = time.time()
+        placeholders = ','.join(['?'] * len(job_ids))
+        with JobService._connect() as conn:
+            conn.execute(f'''
+                    UPDATE review_job SET lease_expires_at = ?, updated_at = ?
+                    WHERE status = ? AND lease_owner = ? AND id IN ({placeholders})
+                ''', (now + lease_seconds, now, JobService.STATUS_RUNNING, owner, *job_ids))
+
+    @staticmethod
+    def complete(job_id: int):
+        with JobService._connect() as conn:
+            conn.execute('''
+                    UPDATE review_job SET status = CASE WHEN cancel_requested = 1 THEN ? ELSE ? END,
+                    lease_owner = '', lease_expires_at = 0, stage = '', finished_at = ?, updated_at = ? WHERE id = ?
+                ''', (JobService.STATUS_CANCELLED, JobService.STATUS_DONE, time.time(), time.time(), job_id))
+
+    @staticmethod
+    def fail(job_id: int, error: str):
+        with JobService._connect() as conn:
+            conn.execute('''
+                    UPDATE review_job SET status = ?, error = ?, lease_owner = '', lease_expires_at = 0,
+                    finished_at = ?, updated_at = ? WHERE id = ?
+                ''', (JobService.STATUS_FAILED, error, time.time(), time.time(), job_id))
+
+    @staticmethod
+    def release(job_id: int, max_attempts: int, error: str = '', count_attempt: bool = True):
+        """
+        释放执行中的任务：未超过最大尝试次数则放回队列，否则标记为失败
+        :param count_attempt: 本次执行是否计入尝试次数，进程池正常关闭(排空超时)时不计入
+        """
+        attempts_delta = 0 if count_attempt else 1
+        with JobService._connect() as conn:
+            conn.execute('''
+                    UPDATE review_job SET status = CASE WHEN attempts - ? < ? THEN ? ELSE ? END,
+                    attempts = attempts - ?, error = ?, lease_owner = '', lease_expires_at = 0, stage = '',
+                    updated_at = ? WHERE id = ? AND status = ?
+                ''', (attempts_delta, max_attempts, JobService.STATUS_QUEUED, JobService.STATUS_FAILED,
+                      attempts_delta, error, time.time(), job_id, JobService.STATUS_RUNNING))
+
+    @staticmethod
+    def defer(job_id: int, delay_seconds: float):
+        """将执行中的任务放回队列，delay_seconds 秒后才能再次领取，本次执行不计入尝试次数"""
+        now = time.time()
+        with JobService._connect() as conn:
+            conn.execute('''
+                    UPDATE review_job SET status = ?, attempts = attempts - 1, available_at = ?, lease_owner = '',
+                    lease_expires_at = 0, stage = '', updated_at = ? WHERE id = ? AND status = ?
+                ''', (JobService.STATUS_QUEUED, now + delay_seconds, now, job_id, JobService.STATUS_RUNNING))
+
+    @staticmethod
+    def requeue_expired_leases(max_attempts: int) -> int:
+        """将租约已过期的执行中任务放回队列（超过最大尝试次数的标记为失败），返回处理的任务数"""
+        now = time.time()
+        with JobService._connect() as conn:
+            cursor = conn.execute('''
+                    UPDATE review_job SET status = CASE WHEN attempts < ? THEN ? ELSE ? END,
+                    error = 'lease expired', lease_owner = '', lease_expires_at = 0, updated_at = ?
+                    WHERE status = ? AND lease_expires_at < ?
+                ''', (max_attempts, JobService.STATUS_QUEUED, JobService.STATUS_FAILED, now,
+                      JobService.STATUS_RUNNING, now))
+            return cursor.rowcount
+
+    @staticmethod
+    def set_stage(job_id: int, stage: str):
+        """更新执行中任务所处的阶段"""
+        with JobService._connect() as conn:
+            conn.execute('UPDATE review_job SET stage = ?, updated_at = ? WHERE id = ? AND status = ?',
+                         (stage, time.time(), job_id, JobService.STATUS_RUNNING))
+
+    @staticmethod
+    def add_stage_timing(job_id: int, timing: str, seconds: float):
+        """累加任务某一阶段的耗时(秒)，单条 UPDATE 完成，并发记录不会互相覆盖"""
+        path = f'$.{timing}'
+        with JobService._connect() as conn:
+            conn.execute('''
+                    UPDATE review_job SET stage_timings = json_set(COALESCE(NULLIF(stage_timings, ''), '{}'), ?,
+                    ROUND(COALESCE(json_extract(stage_timings, ?), 0) + ?, 3)) WHERE id = ?
+                ''', (path, path, seconds, job_id))
+
+    @staticmethod
+    def add_llm_usage(job_id: int, usage: Dict[str, int]):
+        """累加任务的 LLM token 用量(含调用次数 calls)，单条 UPDATE 完成，并发记录不会互相覆盖"""
+        expr, params = "COALESCE(NULLIF(llm_usage, ''), '{}')", []
+        for name, value in {'calls': 1, **usage}.items():
+            expr = f"json_set({expr}, ?, COALESCE(json_extract(llm_usage, ?), 0) + ?)"
+            params.extend([f'$.{name}', f'$.{name}', value])
+        with JobService._connect() as conn:
+            conn.execute(f'UPDATE review_job SET llm_usage = {expr} WHERE id = ?', (*params, job_id))
+
+    @staticmethod
+    def is_cancel_requested(job_id: int) -> bool:
+        """任务是否已被更新的任务取代(请求取消)"""
+        with JobService._connect() as conn:
+            row = conn.execute('SELECT cancel_requested FROM review_job WHERE id = ?', (job_id,)).fetchone()
+            return bool(row and row[0])
+
+    @staticmethod
+    def has_queued(handler: str, queue_name: str = '') -> bool:
+        """分区中是否已有排队中的 handler 任务"""
+        with JobService._connect() as conn:
+            row = conn.execute('''
+                    SELECT 1 FROM review_job WHERE handler = ? AND queue_name = ? AND status = ? LIMIT 1
+                ''', (handler, queue_name, JobService.STATUS_QUEUED)).fetchone()
+            return row is not None
+
+    @staticmethod
+    def queue_depth(queue_names: List[str] = None, deferred: bool = False) -> int:
+        """
+        排队中的任务数，可按分区统计
+        :param deferred: 为 True 时统计尚未到执行时间的任务(延迟入队、预算用尽推迟、轮询等待中)，否则只统计可立即领取的任务
+        """
+        query = f"SELECT COUNT(*) FROM review_job WHERE status = ? AND available_at {'>' if deferred else '<='} ?"
+        params = [JobService.STATUS_QUEUED, time.time()]
+        if queue_names:
+            query += f" AND queue_name IN ({','.join(['?'] * len(queue_names))})"
+            params.extend(queue_names)
+        with JobService._connect() as conn:
+            return conn.execute(query, params).fetchone()[0]
+
+    @staticmethod
+    def load() -> dict:
+        """
+        所有节点上可立即领取、执行中的任务数，用于入口限流；
+        尚未到执行时间的任务(预算用尽推迟、批量 Review 轮询等)不占用处理能力，单独统计为 deferred
+        """
+        with JobService._connect() as conn:
+            row = conn.execute('''
+                    SELECT SUM(CASE WHEN status = ? AND available_at <= ? THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN status = ? AND available_at > ? THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN status = ? THEN 1 ELSE 0 END)
+                    FROM review_job WHERE status IN (?, ?)
+                ''', (JobService.STATUS_QUEUED, time.time(), JobService.STATUS_QUEUED, time.time(),
+                      JobService.STATUS_RUNNING, JobService.STATUS_QUEUED, JobService.STATUS_RUNNING)).fetchone()
+        return {'queued': row[0] or 0, 'deferred': row[1] or 0, 'running': row[2] or 0}
+
+    @staticmethod
+    def get_job(job_id: int) -> Optional[dict]:
+        with JobService._connect() as conn:
+            row = conn.execute('SELECT * FROM review_job WHERE id = ?', (job_id,)).fetchone()
+            return dict(row) if row else None
+
+    @staticmethod
+    def list_jobs(status: str = None, limit: int = 50) -> List[dict]:
+        """按任务ID倒序查询任务，不包含任务参数(其中含有平台 Token)"""
+        query = f"SELECT {', '.join(JobService._SUMMARY_COLUMNS)} FROM review_job"
+        params = []
+        if status:
+            query += ' WHERE status = ?'
+            params.append(status)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        with JobService._connect() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+# Initialize database
+JobService.init_db()
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+class LLMMetricsService:
+    """
+    LLM 调用指标：每次调用(含重试)记录一行，包括供应商、模型、token 用量、总耗时、流式调用的首 token 耗时及调用结果，
+    用于容量规划及比较不同模型的速度和成本
+    """
+    # 各节点的调用指标汇总到同一处，与任务队列共用 QUEUE_DB_FILE 指向的数据库
+    DB_FILE = os.getenv("QUEUE_DB_FILE", "data/data.db")
+
+    OUTCOME_SUCCESS = 'success'
+
+    @staticmethod
+    @contextmanager
+    def _connect():
+        conn = sqlite3.connect(LLMMetricsService.DB_FILE, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def init_db():
+        """初始化指标表"""
+        try:
+            with LLMMetricsService._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS llm_call_metrics (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            provider TEXT,
+                            model TEXT,
+                            job_id INTEGER,
+                            streamed INTEGER DEFAULT 0,
+                            outcome TEXT,
+                            error TEXT DEFAULT '',
+                            input_tokens INTEGER DEFAULT 0,
+                            output_tokens INTEGER DEFAULT 0,
+                            cached_tokens INTEGER DEFAULT 0,
+                            cache_creation_tokens INTEGER DEFAULT 0,
+                            latency REAL,
+                            ttft REAL,
+                            created_at REAL
+                        )
+                    ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_call_metrics_created_at ON llm_call_metrics '
+                             '(created_at);')
+        except sqlite3.DatabaseError as e:
+            print(f"LLM metrics table initialization failed: {e}")
+
+    @staticmethod
+    def record(metrics: Dict[str, Any]):
+        """记录一次调用，metrics 的键为 llm_call_metrics 的列名"""
+        now = time.time()
+        columns = [name for name in metrics if name not in ('id', 'created_at')]
+        with LLMMetricsService._connect() as conn:
+            cursor = conn.execute(f'''
+                    INSERT INTO llm_call_metrics ({', '.join(columns)}, created_at)
+                    VALUES ({', '.join(['?'] * len(columns))}, ?)
+                ''', [metrics[name] for name in columns] + [now])
+            # 每写入 1000 条清理一次超过保留天数的指标
+            if cursor.lastrowid % 1000 == 0:
+                retention = float(os.getenv('LLM_METRICS_RETENTION_DAYS', 30)) * 86400
+                conn.execute('DELETE FROM llm_call_metrics WHERE created_at < ?', (now - retention,))
+
+    @staticmethod
+    def _percentile(values: List[float], ratio: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(len(values) * ratio))], 3)
+
+    @staticmethod
+    def aggregate(since: float, group_by: str = 'model') -> List[Dict[str, Any]]:
+        """
+        按供应商+模型(group_by='model')或供应商(group_by='provider')汇总 since 之后的调用：
+        调用次数、成功率、耗时的平均值/p50/p95、流式调用首 token 耗时的平均值/p95、各项 token 总数
+        """
+        keys = ['provider', 'model'] if group_by == 'model' else ['provider']
+        with LLMMetricsService._connect() as conn:
+            rows = [dict(row) for row in conn.execute('''
+                    SELECT provider, model, outcome, latency, ttft, input_tokens, output_tokens, cached_tokens,
+                    cache_creation_tokens FROM llm_call_metrics WHERE created_at >= ?
+                ''', (since,)).fetchall()]
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row[key] for key in keys), []).append(row)
+        result = []
+        for group_key, group_rows in sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])):
+            succeeded = [row for row in group_rows if row['outcome'] == LLMMetricsService.OUTCOME_SUCCESS]
+            latencies = [row['latency'] for row in succeeded if row['latency'] is not None]
+            ttfts = [row['ttft'] for row in succeeded if row['ttft'] is not None]
+            outcomes = {}
+            for row in group_rows:
+                outcomes[row['outcome']] = outcomes.get(row['outcome'], 0) + 1
+            result.append({
+                **dict(zip(keys, group_key)),
+                'calls': len(group_rows),
+                'success_rate': round(len(succeeded) / len(group_rows), 4),
+                'outcomes': outcomes,
+                'latency_avg': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'latency_p50': LLMMetricsService._percentile(latencies, 0.5),
+                'latency_p95': LLMMetricsService._percentile(latencies, 0.95),
+                'ttft_avg': round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+                'ttft_p95': LLMMetricsService._percentile(ttfts, 0.95),
+                **{name: sum(row[name] or 0 for row in group_rows)
+                   for name in ('input_tokens', 'output_tokens', 'cached_tokens', 'cache_creation_tokens')},
+            })
+        return result
+
+
+# Initialize database
+LLMMetricsService.init_db()
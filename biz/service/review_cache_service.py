@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any
+
+# diff 中的 hunk 头，如 @@ -12,7 +12,8 @@，cherry-pick 到其他分支后行号会变化但内容不变
+_HUNK_HEADER_PATTERN = re.compile(r'@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+
+class ReviewCacheService:
+    """
+    Review 结果缓存：以规范化后的 diff、完整提示词、供应商和模型的哈希为键，
+    相同的 diff(cherry-pick、同一提交推送到多个分支、重新打开的 MR)直接复用上次的 Review 结果，不再调用 LLM。
+    缓存有过期时间和条目上限，超出上限时淘汰最久未使用的条目(LRU)。
+    """
+    # 各节点共享同一份缓存，与任务队列共用 QUEUE_DB_FILE 指向的数据库
+    DB_FILE = os.getenv("QUEUE_DB_FILE", "data/data.db")
+
+    @staticmethod
+    @contextmanager
+    def _connect():
+        conn = sqlite3.connect(ReviewCacheService.DB_FILE, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def init_db():
+        """初始化缓存表"""
+        try:
+            with ReviewCacheService._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            review_result TEXT NOT NULL,
+                            provider TEXT,
+                            model TEXT,
+                            hits INTEGER DEFAULT 0,
+                            created_at REAL,
+                            last_used_at REAL
+                        )
+                    ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_review_cache_last_used_at ON review_cache (last_used_at);')
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache_stats (
+                            name TEXT PRIMARY KEY,
+                            value INTEGER DEFAULT 0
+                        )
+                    ''')
+        except sqlite3.DatabaseError as e:
+            print(f"Review cache table initialization failed: {e}")
+
+    @staticmethod
+    def enabled() -> bool:
+        return os.getenv('REVIEW_CACHE_ENABLED', '1') == '1'
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化 diff 文本：去掉 hunk 头中的行号，统一换行符"""
+        return _HUNK_HEADER_PATTERN.sub('@@', text.replace('\r\n', '\n'))
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, Any]], provider: str, model: str) -> str:
+        normalized = [{'role': m.get('role'), 'content': ReviewCacheService.normalize(str(m.get('content', '')))}
+                      for m in messages]
+        raw = json.dumps({'provider': provider, 'model': model, 'messages': normalized}, ensure_ascii=False,
+                         sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get(cache_key: str) -> Optional[str]:
+        """查询未过期的缓存结果，并记录命中率"""
+        now = time.time()
+        ttl = float(os.getenv('REVIEW_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+        with ReviewCacheService._connect() as conn:
+            row = conn.execute('SELECT review_result FROM review_cache WHERE cache_key = ? AND created_at > ?',
+                               (cache_key, now - ttl)).fetchone()
+            if row:
+                conn.execute('UPDATE review_cache SET hits = hits + 1, last_used_at = ? WHERE cache_key = ?',
+                             (now, cache_key))
+            conn.execute('''
+                    INSERT INTO review_cache_stats (name, value) VALUES (?, 1)
+                    ON CONFLICT(name) DO UPDATE SET value = value + 1
+                ''', ('hits' if row else 'misses',))
+        return row[0] if row else None
+
+    @staticmethod
+    def put(cache_key: str, review_result: str, provider: str = '', model: str = ''):
+        """写入缓存，并清理过期及超出条目上限的缓存"""
+        now = time.time()
+        ttl = float(os.getenv('REVIEW_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+        max_entries = int(os.getenv('REVIEW_CACHE_MAX_ENTRIES', 1000))
+        with ReviewCacheService._connect() as conn:
+            conn.execute('''
+                    INSERT OR REPLACE INTO review_cache (cache_key, review_result, provider, model, hits, created_at,
+                    last_used_at) VALUES (?, ?, ?, ?, 0, ?, ?)
+                ''', (cache_key, review_result, provider, model, now, now))
+            conn.execute('DELETE FROM review_cache WHERE created_at <= ?', (now - ttl,))
+            conn.execute('''
+                    DELETE FROM review_cache WHERE cache_key IN (
+                        SELECT cache_key FROM review_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (max(max_entries, 1),))
+
+    @staticmethod
+    def stats() -> dict:
+        """缓存条目数及命中率"""
+        with ReviewCacheService._connect() as conn:
+            counters = dict(conn.execute('SELECT name, value FROM review_cache_stats').fetchall())
+            entries = conn.execute('SELECT COUNT(*) FROM review_cache').fetchone()[0]
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+
+# Initialize database
+ReviewCacheService.init_db()
@@ -1,3 +1,4 @@
+import os
 import sqlite3
 
 import pandas as pd
@@ -6,7 +7,8 @@ from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity
 
 
 class ReviewService:
-    DB_FILE = "data/data.db"
+    # 多节点部署时 Review 日志(含 MR 重复提交检测)与任务队列共用 QUEUE_DB_FILE 指向的数据库
+    DB_FILE = os.getenv("QUEUE_DB_FILE", "data/data.db")
 
     @staticmethod
     def init_db():
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+
+from biz.service.job_service import JobService
+
+
+class TestJobService(TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = JobService.DB_FILE
+        JobService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        JobService.init_db()
+
+    def tearDown(self):
+        JobService.DB_FILE = self.original_db_file
+        self.db_dir.cleanup()
+
+    def test_claim_in_order_and_complete(self):
+        """测试任务按入队顺序领取，领取后不会被重复领取"""
+        first = JobService.enqueue('module:func', [{'a': 1}, 'token', 'url', 'slug'])
+        second = JobService.enqueue('module:func', [{'a': 2}, 'token', 'url', 'slug'])
+        self.assertEqual(JobService.queue_depth(), 2)
+
+        job = JobService.claim('owner', lease_seconds=60)
+        self.assertEqual(job['id'], first)
+        self.assertEqual(job['args'][0], {'a': 1})
+        self.assertEqual(JobService.claim('owner', lease_seconds=60)['id'], second)
+        self.assertIsNone(JobService.claim('owner', lease_seconds=60))
+
+        JobService.complete(first)
+        self.assertEqual(JobService.get_job(first)['status'], JobService.STATUS_DONE)
+
+    def test_expired_lease_is_requeued_until_max_attempts(self):
+        """测试租约过期的任务被放回队列，超过最大尝试次数后标记失败"""
+        job_id = JobService.enqueue('module:func', [])
+
+        JobService.claim('owner', lease_seconds=-1)
+        self.assertEqual(JobService.requeue_expired_leases(max_attempts=2), 1)
+        self.assertEqual(JobService.get_job(job_id)['status'], JobService.STATUS_QUEUED)
+
+        JobService.claim('owner', lease_seconds=-1)
+        JobService.requeue_expired_leases(max_attempts=2)
+        self.assertEqual(JobService.get_job(job_id)['status'], JobService.STATUS_FAILED)
+
+    def test_renewed_lease_is_not_requeued(self):
+        """测试续租后的任务不会被重新放回队列"""
+        job_id = JobService.enqueue('module:func', [])
+        JobService.claim('owner', lease_seconds=0.01)
+        JobService.renew_leases([job_id], 'owner', lease_seconds=60)
+        time.sleep(0.02)
+        self.assertEqual(JobService.requeue_expired_leases(max_attempts=3), 0)
+        self.assertEqual(JobService.get_job(job_id)['status'], JobService.STATUS_RUNNING)
+
+    def test_coalesce_supersedes_older_jobs_of_same_merge_request(self):
+        """测试同一个MR的新事件会作废排队中的旧任务，并请求取消执行中的旧任务"""
+        running = JobService.enqueue('module:func', [1], coalesce_key='slug:1:mr:7')
+        JobService.claim('owner', lease_seconds=60)
+        queued = JobService.enqueue('module:func', [2], coalesce_key='slug:1:mr:7')
+        other = JobService.enqueue('module:func', [3], coalesce_key='slug:1:mr:8')
+        latest = JobService.enqueue('module:func', [4], coalesce_key='slug:1:mr:7', delay_seconds=60)
+
+        self.assertTrue(JobService.is_cancel_requested(running))
+        self.assertEqual(JobService.get_job(queued)['status'], JobService.STATUS_SUPERSEDED)
+        self.assertEqual(JobService.get_job(other)['status'], JobService.STATUS_QUEUED)
+        # 防抖窗口内最新的任务不可领取
+        self.assertEqual(JobService.claim('owner', lease_seconds=60)['id'], other)
+        self.assertIsNone(JobService.claim('owner', lease_seconds=60))
+        self.assertEqual(JobService.get_job(latest)['status'], JobService.STATUS_QUEUED)
+
+        JobService.complete(running)
+        self.assertEqual(JobService.get_job(running)['status'], JobService.STATUS_CANCELLED)
+
+    def test_keep_queued_reuses_queued_job_with_same_key(self):
+        """测试 keep_queued 时已有相同合并键的排队任务则不再追加，执行中的任务不受影响"""
+        running = JobService.enqueue('module:poll', [''], coalesce_key='poll:', keep_queued=True)
+        JobService.claim('owner', lease_seconds=60)
+        queued = JobService.enqueue('module:poll', [''], coalesce_key='poll:', keep_queued=True)
+
+        self.assertEqual(JobService.enqueue('module:poll', [''], coalesce_key='poll:', keep_queued=True), queued)
+        self.assertFalse(JobService.is_cancel_requested(running))
+        self.assertEqual(JobService.queue_depth(), 1)
+
+    def test_claim_only_configured_partitions(self):
+        """测试 Worker 节点只领取 WORKER_QUEUE 中配置的分区"""
+        JobService.enqueue('module:func', [], queue_name='gitlab_a_com')
+        job_b = JobService.enqueue('module:func', [], queue_name='gitlab_b_com')
+
+        self.assertEqual(JobService.queue_depth(['gitlab_b_com']), 1)
+        self.assertEqual(JobService.claim('owner', lease_seconds=60, queue_names=['gitlab_b_com'])['id'], job_b)
+        self.assertIsNone(JobService.claim('owner', lease_seconds=60, queue_names=['gitlab_b_com']))
+        self.assertEqual(JobService.queue_depth(), 1)
+
+    def test_stage_and_timings_recorded(self):
+        """测试任务阶段及阶段耗时的记录，同名耗时累加，任务列表不包含任务参数"""
+        job_id = JobService.enqueue('module:func', [{'a': 1}, 'token', 'url', 'slug'])
+        JobService.claim('owner', lease_seconds=60)
+        JobService.set_stage(job_id, 'reviewing')
+        JobService.add_stage_timing(job_id, 'llm_call', 1.5)
+        JobService.add_stage_timing(job_id, 'llm_call', 0.5)
+        JobService.add_stage_timing(job_id, 'note_post', 0.25)
+
+        job = JobService.get_job(job_id)
+        self.assertEqual(job['stage'], 'reviewing')
+        self.assertEqual(json.loads(job['stage_timings']), {'llm_call': 2.0, 'note_post': 0.25})
+        self.assertGreater(job['started_at'], 0)
+
+        JobService.complete(job_id)
+        jobs = JobService.list_jobs(status=JobService.STATUS_DONE)
+        self.assertEqual([j['id'] for j in jobs], [job_id])
+        self.assertNotIn('payload', jobs[0])
+        self.assertGreater(jobs[0]['finished_at'], 0)
+
+    def test_llm_usage_accumulated(self):
+        """测试任务的 LLM token 用量按调用累加"""
+        job_id = JobService.enqueue('module:func', [])
+        JobService.claim('owner', lease_seconds=60)
+        JobService.add_llm_usage(job_id, {'input_tokens': 1000, 'cached_tokens': 0, 'output_tokens': 100})
+        JobService.add_llm_usage(job_id, {'input_tokens': 1200, 'cached_tokens': 900, 'output_tokens': 80})
+
+        usage = json.loads(JobService.get_job(job_id)['llm_usage'])
+        self.assertEqual(usage, {'calls': 2, 'input_tokens': 2200, 'cached_tokens': 900, 'output_tokens': 180})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+
+from biz.llm.client.base import BaseClient
+from biz.llm.types import LLMUsage
+from biz.service.llm_metrics_service import LLMMetricsService
+
+
+class FakeClient(BaseClient):
+    provider = 'fake-metrics'
+    default_model = 'fake-model'
+
+    def _completions(self, messages, model=None) -> str:
+        self._record_usage(LLMUsage(provider=self.provider, model='fake-model', input_tokens=100, output_tokens=10,
+                                    cached_tokens=80))
+        return 'ok'
+
+
+class TestLLMMetricsService(TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = LLMMetricsService.DB_FILE
+        LLMMetricsService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        LLMMetricsService.init_db()
+
+    def tearDown(self):
+        LLMMetricsService.DB_FILE = self.original_db_file
+        self.db_dir.cleanup()
+
+    def test_calls_recorded_and_aggregated(self):
+        """测试同步、流式调用的指标均被记录，并按模型汇总"""
+        client = FakeClient()
+        client.completions([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(''.join(client.stream_completions([{'role': 'user', 'content': 'hi'}])), 'ok')
+        LLMMetricsService.record({'provider': 'fake-metrics', 'model': 'fake-model', 'outcome': 'LLMRateLimitError',
+                                  'latency': 0.1})
+
+        [stats] = LLMMetricsService.aggregate(time.time() - 60)
+        self.assertEqual(stats['calls'], 3)
+        self.assertEqual(stats['outcomes'], {'success': 2, 'LLMRateLimitError': 1})
+        self.assertEqual((stats['input_tokens'], stats['cached_tokens'], stats['output_tokens']), (200, 160, 20))
+        self.assertIsNotNone(stats['ttft_avg'])
+        self.assertIsNotNone(stats['latency_p95'])
+
+
+if __name__ == '__main__':
+    main()
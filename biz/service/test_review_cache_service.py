@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.service.review_cache_service import ReviewCacheService
+
+
+class TestReviewCacheService(TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = ReviewCacheService.DB_FILE
+        ReviewCacheService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        ReviewCacheService.init_db()
+
+    def tearDown(self):
+        ReviewCacheService.DB_FILE = self.original_db_file
+        self.db_dir.cleanup()
+
+    @staticmethod
+    def _messages(diff: str):
+        return [{'role': 'system', 'content': 'review'}, {'role': 'user', 'content': diff}]
+
+    def test_same_diff_with_shifted_lines_hits_cache(self):
+        """测试 cherry-pick 后行号变化的相同 diff 命中缓存，不同模型不命中"""
+        key = ReviewCacheService.make_key(self._messages('@@ -10,3 +10,4 @@\n+print(1)'), 'openai', 'gpt-4o')
+        ReviewCacheService.put(key, 'LGTM 总分: 90分')
+
+        shifted = ReviewCacheService.make_key(self._messages('@@ -42,3 +45,4 @@\n+print(1)'), 'openai', 'gpt-4o')
+        self.assertEqual(ReviewCacheService.get(shifted), 'LGTM 总分: 90分')
+        other_model = ReviewCacheService.make_key(self._messages('@@ -42,3 +45,4 @@\n+print(1)'), 'openai', 'o3')
+        self.assertIsNone(ReviewCacheService.get(other_model))
+        self.assertEqual(ReviewCacheService.stats()['hit_rate'], 0.5)
+
+    @patch.dict(os.environ, {'REVIEW_CACHE_MAX_ENTRIES': '2'})
+    def test_least_recently_used_entry_evicted(self):
+        now = time.time()
+        with patch('biz.service.review_cache_service.time.time', side_effect=[now + i for i in range(4)]):
+            ReviewCacheService.put('a', 'A')
+            ReviewCacheService.put('b', 'B')
+            ReviewCacheService.get('a')
+            ReviewCacheService.put('c', 'C')
+        self.assertEqual(ReviewCacheService.stats()['entries'], 2)
+        self.assertIsNone(ReviewCacheService.get('b'))
+        self.assertEqual(ReviewCacheService.get('a'), 'A')
+
+    @patch.dict(os.environ, {'REVIEW_CACHE_TTL_SECONDS': '0'})
+    def test_expired_entry_not_returned(self):
+        ReviewCacheService.put('a', 'A')
+        self.assertIsNone(ReviewCacheService.get('a'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.llm.budget import budget_limit, check_budget, consume, token_budget
+from biz.service.token_budget_service import TokenBudgetService
+
+
+class TestTokenBudget(TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = TokenBudgetService.DB_FILE
+        TokenBudgetService.DB_FILE = os.path.join(self.db_dir.name, 'test.db')
+        TokenBudgetService.init_db()
+
+    def tearDown(self):
+        TokenBudgetService.DB_FILE = self.original_db_file
+        self.db_dir.cleanup()
+
+    def test_usage_accumulated_per_window(self):
+        with token_budget('demo'):
+            consume(300)
+            consume(200)
+        consume(1000)  # 不在预算上下文中，不计入
+        self.assertEqual(TokenBudgetService.used('demo'), {'hour': 500, 'day': 500})
+
+    @patch.dict(os.environ, {'TOKEN_BUDGET_DAILY': '1000', 'TOKEN_BUDGET_HOURLY_DEMO': '400'})
+    def test_project_override_and_exhaustion(self):
+        """测试按项目覆盖的额度优先于全局额度"""
+        self.assertIsNone(check_budget('demo'))
+        TokenBudgetService.add('demo', 450)
+        TokenBudgetService.add('other', 450)
+        exhausted = check_budget('demo')
+        self.assertEqual((exhausted.window, exhausted.used, exhausted.limit), ('hour', 450, 400))
+        self.assertGreater(exhausted.reset_in, 0)
+        self.assertIsNone(check_budget('other'))
+
+    @patch.dict(os.environ, {'TOKEN_BUDGET_DAILY': '1000', 'TOKEN_BUDGET_DAILY_GROUP_MY_PROJECT': '300'})
+    def test_project_override_key_normalized(self):
+        """测试预算键中的 -、/、. 等字符对应变量名中的下划线"""
+        self.assertEqual(budget_limit('group/my-project', 'day'), 300)
+        self.assertEqual(budget_limit('group.my_project', 'day'), 300)
+        self.assertEqual(budget_limit('other', 'day'), 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# 统计窗口及其长度(秒)
+WINDOWS = {'hour': 3600, 'day': 86400}
+
+
+class TokenBudgetService:
+    """
+    按项目统计 LLM token 用量：每个 (预算键, 窗口, 窗口起始时间) 一行计数，
+    累加和查询都是主键上的单行操作，不随历史用量增长而变慢
+    """
+    # 各节点累加到同一份用量，预算对整个集群生效，与任务队列共用 QUEUE_DB_FILE 指向的数据库
+    DB_FILE = os.getenv("QUEUE_DB_FILE", "data/data.db")
+
+    @staticmethod
+    @contextmanager
+    def _connect():
+        conn = sqlite3.connect(TokenBudgetService.DB_FILE, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def init_db():
+        """初始化用量表"""
+        try:
+            with TokenBudgetService._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS token_budget_usage (
+                            budget_key TEXT NOT NULL,
+                            window TEXT NOT NULL,
+                            window_start INTEGER NOT NULL,
+                            tokens INTEGER DEFAULT 0,
+                            PRIMARY KEY (budget_key, window, window_start)
+                        )
+                    ''')
+        except sqlite3.DatabaseError as e:
+            print(f"Token budget table initialization failed: {e}")
+
+    @staticmethod
+    def window_start(window: str, now: float = None) -> int:
+        """当前窗口的起始时间(按 UTC 整点/整天对齐)"""
+        length = WINDOWS[window]
+        now = time.time() if now is None else now
+        return int(now // length * length)
+
+    @staticmethod
+    def add(budget_key: str, tokens: int):
+        """累加当前小时、当天窗口的用量；某个预算键进入新的小时窗口时，顺带清理其两天前的记录"""
+        if tokens <= 0:
+            return
+        now = time.time()
+        with TokenBudgetService._connect() as conn:
+            for window in WINDOWS:
+                window_start = TokenBudgetService.window_start(window, now)
+                cursor = conn.execute('''
+                        INSERT OR IGNORE INTO token_budget_usage (budget_key, window, window_start, tokens)
+                        VALUES (?, ?, ?, 0)
+                    ''', (budget_key, window, window_start))
+                if window == 'hour' and cursor.rowcount == 1:
+                    conn.execute('DELETE FROM token_budget_usage WHERE budget_key = ? AND window_start < ?',
+                                 (budget_key, now - 2 * WINDOWS['day']))
+                conn.execute('''
+                        UPDATE token_budget_usage SET tokens = tokens + ?
+                        WHERE budget_key = ? AND window = ? AND window_start = ?
+                    ''', (tokens, budget_key, window, window_start))
+
+    @staticmethod
+    def used(budget_key: str) -> Dict[str, int]:
+        """当前小时、当天窗口已用的 token 数"""
+        now = time.time()
+        with TokenBudgetService._connect() as conn:
+            return {
+                window: (conn.execute('''
+                        SELECT tokens FROM token_budget_usage WHERE budget_key = ? AND window = ? AND window_start = ?
+                    ''', (budget_key, window, TokenBudgetService.window_start(window, now))).fetchone() or (0,))[0]
+                for window in WINDOWS
+            }
+
+
+# Initialize database
+TokenBudgetService.init_db()
@@ -1,21 +1,71 @@
 import abc
 import os
 import re
-from typing import Dict, Any, List
+import time
+from functools import partial
+from typing import Dict, Any, List, Callable, Optional, Tuple
 
 import yaml
 from jinja2 import Template
 
+from biz.llm.batch import batch_provider, get_batch_backend
+from biz.llm.budget import BudgetExhausted, budget_action, check_budget, token_budget, ACTION_DEFER, \
+    ACTION_DOWNGRADE
+from biz.llm.client.base import BaseClient
 from biz.llm.factory import Factory
+from biz.llm.types import NOT_GIVEN
+from biz.queue.context import JobDeferred, job_stage
+from biz.queue.pipeline import run_concurrently
+from biz.service.review_cache_service import ReviewCacheService
+from biz.utils.diff_allocator import allocate_changes, change_path, omitted_files_note
 from biz.utils.log import logger
+from biz.utils.review_report import ReviewReport, extract_json
+from biz.utils.review_triage import TriageDecision, heuristic_triage, trivial_review_result, TRIAGE_REVIEW, \
+    TRIAGE_TRIVIAL, TRIAGE_UNSURE
 from biz.utils.token_util import count_tokens, truncate_text_by_tokens
 
 
+def split_changes(changes: list, max_tokens: int) -> List[list]:
+    """
+    按文件、hunk 边界将变更拆分为多个分片，每个分片的 token 数不超过 max_tokens；
+    单个文件超长时按 hunk 拆分，单个 hunk 仍然超长时截断
+    """
+    pieces = []
+    for change in changes:
+        tokens = count_tokens(str(change))
+        if tokens <= max_tokens or not change.get('diff'):
+            pieces.append((change, tokens))
+            continue
+        overhead = count_tokens(str({**change, 'diff': ''}))
+        for hunk in re.split(r'(?m)^(?=@@ )', change['diff']):
+            if not hunk:
+                continue
+            piece = {**change, 'diff': hunk}
+            tokens = count_tokens(str(piece))
+            if tokens > max_tokens:
+                piece['diff'] = truncate_text_by_tokens(hunk, max(max_tokens - overhead, 1))
+                tokens = max_tokens
+            pieces.append((piece, tokens))
+
+    chunks, current, current_tokens = [], [], 0
+    for piece, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
 class BaseReviewer(abc.ABC):
     """代码审查基类"""
 
     def __init__(self, prompt_key: str):
         self.client = Factory().getClient()
+        # 调用时指定的模型，默认使用供应商配置的模型；token 预算用尽时可降级为更便宜的模型
+        self.model = NOT_GIVEN
         self.prompts = self._load_prompts(prompt_key, os.getenv("REVIEW_STYLE", "professional"))
 
     def _load_prompts(self, prompt_key: str, style="professional") -> Dict[str, Any]:
@@ -41,11 +91,58 @@ class BaseReviewer(abc.ABC):
             logger.error(f"加载提示词配置失败: {e}")
             raise Exception(f"提示词配置加载失败: {e}")
 
-    def call_llm(self, messages: List[Dict[str, Any]]) -> str:
-        """调用 LLM 进行代码审核"""
+    @staticmethod
+    def build_messages(prompts: Dict[str, Any], **fields: str) -> List[Dict[str, Any]]:
+        """
+        组装发送给 LLM 的消息，按变化频率从低到高排列，使请求前缀在多次调用间保持一致以命中供应商的前缀缓存：
+        system 提示词(每次相同) -> user 提示词中的固定说明 -> 提交历史(同一次 Review 的各分片相同) -> 代码变更，
+        自定义提示词模板时，占位符同样应按此顺序排列
+        """
+        return [
+            prompts["system_message"],
+            {"role": "user", "content": prompts["user_message"]["content"].format(**fields)},
+        ]
+
+    def call_llm(self, messages: List[Dict[str, Any]], on_progress: Optional[Callable[[str], None]] = None,
+                 response_schema: Optional[Dict[str, Any]] = None,
+                 validate: Optional[Callable[[str], Any]] = None) -> str:
+        """
+        调用 LLM 进行代码审核，相同的 diff 及提示词直接返回缓存的结果
+        :param on_progress: 传入时以流式方式调用 LLM，每隔 REVIEW_STREAM_UPDATE_INTERVAL 秒以已生成的内容回调一次
+        :param response_schema: 要求按 JSON Schema 输出(不使用流式调用)
+        :param validate: 写入缓存前校验结果，校验失败时抛出异常，结果不写入缓存
+        """
+        cache_key = None
+        if ReviewCacheService.enabled():
+            provider, model = self.client.provider, self.model or getattr(self.client, 'default_model', '')
+            cache_key = ReviewCacheService.make_key(messages, provider, model)
+            cached_result = ReviewCacheService.get(cache_key)
+            if cached_result is not None:
+                logger.info(f"命中 Review 缓存, cache_key: {cache_key}")
+                return cached_result
         logger.info(f"向 AI 发送代码 Review 请求, messages: {messages}")
-        review_result = self.client.completions(messages=messages)
+        with job_stage('llm_call', 'reviewing'):
+            if on_progress and not response_schema:
+                review_result = self._stream_llm(messages, on_progress)
+            else:
+                review_result = self.client.completions(messages=messages, model=self.model,
+                                                        response_schema=response_schema)
         logger.info(f"收到 AI 返回结果: {review_result}")
+        if validate:
+            validate(review_result)
+        if cache_key and review_result:
+            ReviewCacheService.put(cache_key, review_result, provider, model)
+        return review_result
+
+    def _stream_llm(self, messages: List[Dict[str, Any]], on_progress: Callable[[str], None]) -> str:
+        interval = float(os.getenv("REVIEW_STREAM_UPDATE_INTERVAL", 5))
+        review_result = ""
+        last_update = time.time()
+        for delta in self.client.stream_completions(messages=messages, model=self.model):
+            review_result += delta
+            if time.time() - last_update >= interval:
+                last_update = time.time()
+                on_progress(review_result)
         return review_result
 
     @abc.abstractmethod
@@ -57,15 +154,222 @@ class BaseReviewer(abc.ABC):
 class CodeReviewer(BaseReviewer):
     """代码 Diff 级别的审查"""
 
-    def __init__(self):
-        super().__init__("code_review_prompt")
+    def __init__(self, budget_key: str = None):
+        """
+        :param budget_key: 计入的 token 预算(通常为项目名)，为空时不检查预算
+        """
+        # REVIEW_OUTPUT_FORMAT=json 时按 ReviewReport 的 JSON Schema 输出，在本地渲染为 Markdown
+        self.structured = os.getenv("REVIEW_OUTPUT_FORMAT", "markdown") == "json"
+        super().__init__("code_review_json_prompt" if self.structured else "code_review_prompt")
+        self.budget_key = budget_key
+        # 结构化输出时最近一次 Review 的结果，可用于逐行评论及统计
+        self.report: Optional[ReviewReport] = None
+        # 最近一次初筛的 (变更列表, 结果)，batch_request 与 review_changes 共用
+        self._triaged = None
+
+    def review_changes(self, changes: list, commits_text: str = "",
+                       on_progress: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Review 代码变更：未超过 REVIEW_MAX_TOKENS 时整体 Review；
+        超过时若开启了 REVIEW_MAP_REDUCE_ENABLED，按文件、hunk 边界拆分为多个分片并行 Review，再合并为一份报告；
+        超过全部分片的预算(未开启时为 REVIEW_MAX_TOKENS)时，按风险优先选取 hunk，未纳入的文件列在结果末尾
+        :param changes: 过滤后的变更列表
+        :param commits_text:
+        :param on_progress: 流式输出回调，分片 Review 时只对最终合并的结果回调
+        :return:
+        """
+        with token_budget(self.budget_key):
+            self._route_model(changes)
+            exhausted = check_budget(self.budget_key)
+            if exhausted:
+                notice = self._on_budget_exhausted(exhausted)
+                if notice:
+                    return notice
+            trivial_result = self.triage(changes, commits_text)
+            if trivial_result:
+                return trivial_result
+            return self._review_changes(changes, commits_text, on_progress)
+
+    def triage(self, changes: list, commits_text: str = "") -> Optional[str]:
+        """
+        开启 REVIEW_TRIAGE_ENABLED 时，完整 Review 前先初筛变更：本地规则无法判断的小变更再由 LLM 做一次轻量判断，
+        无需深度 Review 时返回固定的 Review 结果，否则返回 None
+        """
+        if os.getenv("REVIEW_TRIAGE_ENABLED", "0") != "1" or not changes:
+            return None
+        if self._triaged and self._triaged[0] is changes:
+            return self._triaged[1]
+        changes_text = str(changes)
+        verdict, reason = heuristic_triage(changes, count_tokens(changes_text))
+        if verdict == TRIAGE_UNSURE:
+            verdict, reason = self._llm_triage(changes_text, commits_text)
+        logger.info(f"变更初筛结果: {verdict}, 原因: {reason}")
+        result = trivial_review_result(reason) if verdict == TRIAGE_TRIVIAL else None
+        self._triaged = (changes, result)
+        return result
+
+    def _llm_triage(self, changes_text: str, commits_text: str = "") -> Tuple[str, str]:
+        """
+        由 LLM 按 TriageDecision 判断是否需要完整 Review，使用 REVIEW_TRIAGE_MODEL(未配置时使用 MODEL_ROUTING_FAST_MODEL)；
+        调用失败或输出不符合 Schema 时进入完整 Review
+        """
+        prompts = self._load_prompts("code_triage_prompt")
+        messages = self.build_messages(prompts, commits_text=commits_text, diffs_text=changes_text)
+        model = os.getenv("REVIEW_TRIAGE_MODEL", "") or os.getenv("MODEL_ROUTING_FAST_MODEL", "") or self.model
+        try:
+            with job_stage('llm_call', 'triaging'):
+                output = self.client.completions(messages=messages, model=model,
+                                                 response_schema=TriageDecision.model_json_schema())
+            decision = TriageDecision.model_validate_json(extract_json(output))
+        except Exception as e:
+            logger.warning(f"变更初筛失败，进入完整 Review: {e}")
+            return TRIAGE_REVIEW, 'triage failed'
+        return (TRIAGE_REVIEW if decision.deep_review else TRIAGE_TRIVIAL), decision.reason
+
+    def _route_model(self, changes: list):
+        """未指定模型时，按变更规模及风险选择模型档位(MODEL_ROUTING_ENABLED=1 时生效)"""
+        if not self.model and changes:
+            self.model = Factory.review_model(changes)
 
-    def review_and_strip_code(self, changes_text: str, commits_text: str = "") -> str:
+    def _on_budget_exhausted(self, exhausted: BudgetExhausted) -> Optional[str]:
+        """
+        token 预算用尽时按 TOKEN_BUDGET_ACTION 处理：
+        - downgrade: 改用 TOKEN_BUDGET_FALLBACK_MODEL 继续 Review（未配置时按 skip 处理）
+        - defer: 抛出 JobDeferred，任务推迟到预算窗口重置后重新执行
+        - skip: 跳过 Review，返回说明作为 Review 结果
+        """
+        action = budget_action()
+        fallback_model = os.getenv("TOKEN_BUDGET_FALLBACK_MODEL", "")
+        if action == ACTION_DOWNGRADE and fallback_model:
+            logger.warning(f"{exhausted}，降级为模型 {fallback_model} 进行 Review。")
+            self.model = fallback_model
+            return None
+        if action == ACTION_DEFER:
+            raise JobDeferred(exhausted.reset_in, str(exhausted))
+        logger.warning(f"{exhausted}，跳过 Review。")
+        return f"AI Review 已跳过：{exhausted}，预计 {max(int(exhausted.reset_in // 60), 1)} 分钟后恢复。"
+
+    def batch_request(self, changes: list, commits_text: str = "") -> Optional[Dict[str, Any]]:
+        """
+        开启 PUSH_REVIEW_BATCH_ENABLED 时，生成经供应商 Batch 接口异步 Review 的请求(BatchReviewService.add 的参数)；
+        预算已用尽、变更超过 REVIEW_MAX_TOKENS(需要分片或裁剪)或已命中缓存时返回 None，由调用方同步 Review
+        """
+        if os.getenv("PUSH_REVIEW_BATCH_ENABLED", "0") != "1" or not changes or check_budget(self.budget_key):
+            return None
+        with token_budget(self.budget_key):
+            # 无需深度 Review 的变更由调用方同步返回初筛结果
+            if self.triage(changes, commits_text):
+                return None
+        changes_text = str(changes)
+        if count_tokens(changes_text) > int(os.getenv("REVIEW_MAX_TOKENS", 10000)):
+            return None
+
+        self._route_model(changes)
+        provider = batch_provider()
+        backend = get_batch_backend(provider)
+        # 路由档位的模型属于 LLM_PROVIDER 对应的供应商，批次经其他供应商执行时改用该供应商的默认模型
+        model = (self.model if backend.client.provider == self.client.provider else '') or backend.default_model
+        messages = self.build_messages(self.prompts, commits_text=commits_text, diffs_text=changes_text)
+        if self.structured:
+            # Batch 请求中通过提示词约束输出格式，结果在发布前校验
+            messages = BaseClient.schema_messages(messages, ReviewReport.json_schema())
+        cache_key = None
+        if ReviewCacheService.enabled():
+            cache_key = ReviewCacheService.make_key(messages, backend.client.provider, model)
+            if ReviewCacheService.get(cache_key) is not None:
+                return None
+        return {'provider': provider, 'model': model, 'messages': messages, 'budget_key': self.budget_key,
+                'cache_key': cache_key}
+
+    def finish_batch_request(self, request: Dict[str, Any]) -> str:
+        """批量请求的最终 Review 结果，批次中失败、过期或不符合 Review Schema 的请求改为同步调用"""
+        error = request['error']
+        if not error and self.structured:
+            try:
+                self.report = ReviewReport.parse_output(request['result'])
+            except ValueError as e:
+                error = f"invalid review report: {e}"
+        if error:
+            logger.warning(f"批量 Review 请求 {request['id']} 失败: {error}，改为同步 Review。")
+            with token_budget(self.budget_key):
+                if self.structured:
+                    self.report = self._call_structured(request['messages'])
+                    return self.report.to_markdown()
+                return self.strip_markdown(self.call_llm(request['messages']))
+        if request['cache_key']:
+            ReviewCacheService.put(request['cache_key'], request['result'],
+                                   get_batch_backend(request['provider']).client.provider, request['model'])
+        return self.report.to_markdown() if self.structured else self.strip_markdown(request['result'])
+
+    def _review_changes(self, changes: list, commits_text: str = "",
+                        on_progress: Optional[Callable[[str], None]] = None) -> str:
+        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
+        if not changes:
+            logger.info("变更为空，跳过 Review。")
+            return "代码为空"
+        map_reduce = os.getenv("REVIEW_MAP_REDUCE_ENABLED", "0") == "1"
+        max_chunks = int(os.getenv("REVIEW_MAX_CHUNKS", 8)) if map_reduce else 1
+        with job_stage('token_count', 'reviewing'):
+            chunks, omitted = self._allocate_chunks(changes, review_max_tokens, max_chunks)
+            if omitted:
+                logger.warning(f"变更超过 {max_chunks} 个分片的 token 预算，{len(omitted)} 个文件未纳入 Review: {omitted}")
+        omitted_note = omitted_files_note(omitted)
+        if len(chunks) == 1:
+            return self.review_and_strip_code(str(chunks[0]), commits_text, on_progress) + omitted_note
+
+        logger.info(f"变更超过 {review_max_tokens} tokens，拆分为 {len(chunks)} 个分片并行 Review。")
+        if self.structured:
+            # 结构化结果在本地合并，不需要再调用 LLM 合并各分片的报告
+            self.report = ReviewReport.merge(run_concurrently(
+                *[partial(self.review_structured, str(chunk), commits_text) for chunk in chunks]))
+            return self.report.to_markdown() + omitted_note
+        # map: 各分片并行 Review（并发受 LLM 自适应并发窗口限制）
+        chunk_reviews = run_concurrently(
+            *[partial(self.review_and_strip_code, str(chunk), commits_text) for chunk in chunks])
+        # reduce: 合并各分片的 Review 结果，给出统一的总分
+        return self.reduce_reviews(chunk_reviews, commits_text, on_progress) + omitted_note
+
+    @staticmethod
+    def _allocate_chunks(changes: list, review_max_tokens: int, max_chunks: int) -> Tuple[List[list], List[str]]:
+        """
+        按风险及改动价值选取 hunk 并拆分为不超过 max_chunks 个分片，返回 (分片, 未纳入 Review 的文件)：
+        分片未能装满时(按文件、hunk 边界拆分)分片数可能超过预算对应的数量，此时按比例缩小预算重新选取，
+        由分配器而不是截断分片决定舍弃哪些内容；仍超出时舍弃多余的分片，其中的文件同样列为未纳入
+        """
+        max_tokens = review_max_tokens * max_chunks
+        while True:
+            allocated, omitted = allocate_changes(changes, max_tokens)
+            if max_chunks == 1 or count_tokens(str(allocated)) <= review_max_tokens:
+                return [allocated], omitted
+            chunks = split_changes(allocated, review_max_tokens)
+            if len(chunks) <= max_chunks or max_tokens <= review_max_tokens:
+                break
+            max_tokens = max(review_max_tokens, int(max_tokens * max_chunks / len(chunks)))
+        if len(chunks) > max_chunks:
+            logger.warning(f"变更被拆分为 {len(chunks)} 个分片，超过 REVIEW_MAX_CHUNKS，仅 Review 前 {max_chunks} 个分片。")
+            reviewed = {change_path(change) for chunk in chunks[:max_chunks] for change in chunk}
+            dropped = [change_path(change) for chunk in chunks[max_chunks:] for change in chunk]
+            omitted = omitted + [path for path in dict.fromkeys(dropped) if path not in reviewed]
+            chunks = chunks[:max_chunks]
+        return chunks, omitted
+
+    def reduce_reviews(self, chunk_reviews: List[str], commits_text: str = "",
+                       on_progress: Optional[Callable[[str], None]] = None) -> str:
+        """将各分片的 Review 结果合并为一份报告"""
+        prompts = self._load_prompts("code_review_reduce_prompt", os.getenv("REVIEW_STYLE", "professional"))
+        total = len(chunk_reviews)
+        reviews_text = "\n\n".join(f"### 第 {i}/{total} 部分\n{review}" for i, review in enumerate(chunk_reviews, 1))
+        messages = self.build_messages(prompts, commits_text=commits_text, chunk_reviews=reviews_text)
+        return self.strip_markdown(self.call_llm(messages, on_progress))
+
+    def review_and_strip_code(self, changes_text: str, commits_text: str = "",
+                              on_progress: Optional[Callable[[str], None]] = None) -> str:
         """
         Review判断changes_text超出取前REVIEW_MAX_TOKENS个token，超出则截断changes_text，
         调用review_code方法，返回review_result，如果review_result是markdown格式，则去掉头尾的```
         :param changes_text:
         :param commits_text:
+        :param on_progress: 流式输出回调
         :return:
         """
         # 如果超长，取前REVIEW_MAX_TOKENS个token
@@ -76,27 +380,48 @@ class CodeReviewer(BaseReviewer):
             return "代码为空"
 
         # 计算tokens数量，如果超过REVIEW_MAX_TOKENS，截断changes_text
-        tokens_count = count_tokens(changes_text)
-        if tokens_count > review_max_tokens:
-            changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
+        with job_stage('token_count', 'reviewing'):
+            tokens_count = count_tokens(changes_text)
+            if tokens_count > review_max_tokens:
+                changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
 
-        review_result = self.review_code(changes_text, commits_text).strip()
+        return self.strip_markdown(self.review_code(changes_text, commits_text, on_progress))
+
+    @staticmethod
+    def strip_markdown(review_result: str) -> str:
+        """如果review_result是markdown格式，则去掉头尾的```"""
+        review_result = review_result.strip()
         if review_result.startswith("```markdown") and review_result.endswith("```"):
             return review_result[11:-3].strip()
         return review_result
 
-    def review_code(self, diffs_text: str, commits_text: str = "") -> str:
+    def review_code(self, diffs_text: str, commits_text: str = "",
+                    on_progress: Optional[Callable[[str], None]] = None) -> str:
         """Review 代码并返回结果"""
-        messages = [
-            self.prompts["system_message"],
-            {
-                "role": "user",
-                "content": self.prompts["user_message"]["content"].format(
-                    diffs_text=diffs_text, commits_text=commits_text
-                ),
-            },
-        ]
-        return self.call_llm(messages)
+        if self.structured:
+            self.report = self.review_structured(diffs_text, commits_text)
+            return self.report.to_markdown()
+        messages = self.build_messages(self.prompts, commits_text=commits_text, diffs_text=diffs_text)
+        return self.call_llm(messages, on_progress)
+
+    def review_structured(self, diffs_text: str, commits_text: str = "") -> ReviewReport:
+        """按 JSON Schema 输出的 Review 结果"""
+        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
+        if count_tokens(diffs_text) > review_max_tokens:
+            diffs_text = truncate_text_by_tokens(diffs_text, review_max_tokens)
+        return self._call_structured(self.build_messages(self.prompts, commits_text=commits_text, diffs_text=diffs_text))
+
+    def _call_structured(self, messages: List[Dict[str, Any]]) -> ReviewReport:
+        """调用 LLM 并校验输出，不符合 Schema 时重新请求一次，仍不符合时抛出 ValueError"""
+        attempts = 2
+        for attempt in range(1, attempts + 1):
+            try:
+                return ReviewReport.parse_output(self.call_llm(messages, response_schema=ReviewReport.json_schema(),
+                                                               validate=ReviewReport.parse_output))
+            except ValueError as e:
+                logger.warning(f"AI 返回的结果不符合 Review Schema(第 {attempt}/{attempts} 次): {e}")
+                if attempt == attempts:
+                    raise ValueError(f"AI 返回的结果不符合 Review Schema: {e}") from e
 
     @staticmethod
     def parse_review_score(review_text: str) -> int:
@@ -57,8 +57,17 @@ def check_llm_provider():
     else:
         logger.info(f"LLM 供应商 {llm_provider} 的配置项已设置。")
 
+    for provider in Factory.routing_providers():
+        if provider not in LLM_PROVIDERS:
+            logger.error(f"LLM_PROVIDERS 中的 {provider} 值错误，应为 {LLM_PROVIDERS} 之一。")
+            continue
+        missing_keys = [key for key in LLM_REQUIRED_KEYS.get(provider, []) if not os.getenv(key)]
+        if missing_keys:
+            logger.error(f"LLM_PROVIDERS 包含 {provider}，但缺少必要的环境变量: {', '.join(missing_keys)}")
+
 def check_llm_connectivity():
     client = Factory().getClient()
+    client.warm_up()
     logger.info(f"正在检查 LLM 供应商的连接...")
     if client.ping():
         logger.info("LLM 可以连接成功。")
@@ -0,0 +1,107 @@
+"""
+按风险排序的 diff token 预算分配
+
+变更超过 token 预算时，不再截取 str(changes) 的前 N 个 token，而是按 hunk 评估 Review 价值：
+文件类型、路径(高风险目录、测试、生成文件)、改动行数及安全相关关键字，按价值从高到低贪心放入预算，
+放入的 hunk 按原文件、原顺序重新组装，完全未放入的文件在结果中列出。
+"""
+import math
+import os
+import re
+from typing import List, Tuple
+
+from biz.utils.token_util import count_tokens, truncate_text_by_tokens
+
+# 默认的高风险路径/文件类型：认证鉴权、密钥、支付、数据库变更及迁移
+DEFAULT_RISKY_PATTERNS = r'(^|/)(auth|security|permission|payment|billing|migrations?)/|password|secret|credential|crypt|\.sql$'
+
+# 文件类型权重，未列出的类型为 1.0
+_EXTENSION_WEIGHTS = {
+    '.sql': 1.3,
+    '.yml': 0.6, '.yaml': 0.6, '.json': 0.5, '.xml': 0.5, '.properties': 0.6,
+    '.css': 0.4, '.md': 0.3, '.txt': 0.3, '.rst': 0.3,
+    '.lock': 0.05,
+}
+_TEST_PATH = re.compile(r'(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]*$|_test\.\w+$|\.(test|spec)\.\w+$', re.IGNORECASE)
+_GENERATED_PATH = re.compile(r'(^|/)(vendor|dist|build|node_modules|generated)/|\.min\.\w+$|\.pb\.go$|_pb2\.py$',
+                             re.IGNORECASE)
+_SENSITIVE_KEYWORDS = re.compile(
+    r'password|passwd|secret|token|credential|private[_ ]?key|auth|permission|role|crypto|encrypt|decrypt|hash|'
+    r'\beval\b|\bexec\b|subprocess|os\.system|shell|pickle|deserializ|\bsql\b|select\s|insert\s|update\s|delete\s|'
+    r'transaction|\block\b|mutex|thread|concurren|unsafe|innerHTML|redirect|cookie|session|csrf|cors',
+    re.IGNORECASE)
+
+
+def risky_path_pattern() -> re.Pattern:
+    """高风险路径的正则，MODEL_ROUTING_RISKY_PATTERNS 为空时使用默认规则"""
+    return re.compile(os.getenv('MODEL_ROUTING_RISKY_PATTERNS', '') or DEFAULT_RISKY_PATTERNS, re.IGNORECASE)
+
+
+def change_path(change: dict) -> str:
+    return change.get('new_path') or change.get('old_path') or ''
+
+
+def path_weight(path: str, risky_pattern: re.Pattern = None) -> float:
+    """按文件类型及路径评估的权重"""
+    weight = _EXTENSION_WEIGHTS.get(os.path.splitext(path)[1].lower(), 1.0)
+    if (risky_pattern or risky_path_pattern()).search(path):
+        weight *= 2
+    if _TEST_PATH.search(path):
+        weight *= 0.5
+    if _GENERATED_PATH.search(path):
+        weight *= 0.1
+    return weight
+
+
+def hunk_value(hunk: str, weight: float) -> float:
+    """hunk 的 Review 价值：文件权重 × 改动行数(对数) × (1 + 改动行中的安全相关关键字)"""
+    changed_lines = [line for line in hunk.splitlines() if line[:1] in ('+', '-') and line[:3] not in ('+++', '---')]
+    keywords = sum(len(_SENSITIVE_KEYWORDS.findall(line)) for line in changed_lines)
+    return weight * math.log2(2 + len(changed_lines)) * (1 + 0.5 * min(keywords, 6))
+
+
+def allocate_changes(changes: list, max_tokens: int) -> Tuple[list, List[str]]:
+    """
+    在 max_tokens 内按价值从高到低选取 hunk，返回 (重新组装的变更列表, 完全未放入的文件路径)；
+    单个 hunk 超过剩余预算时跳过，尝试放入价值次高的 hunk。未超过预算时原样返回
+    """
+    if count_tokens(str(changes)) <= max_tokens:
+        return changes, []
+
+    risky_pattern = risky_path_pattern()
+    candidates = []
+    overheads = []
+    for file_index, change in enumerate(changes):
+        overheads.append(count_tokens(str({**change, 'diff': ''})))
+        weight = path_weight(change_path(change), risky_pattern)
+        hunks = [hunk for hunk in re.split(r'(?m)^(?=@@ )', change.get('diff') or '') if hunk] or ['']
+        for hunk_index, hunk in enumerate(hunks):
+            # 变更以 str(changes) 的形式放入提示词，按 repr 计算 token 数(换行符等被转义)
+            candidates.append((hunk_value(hunk, weight), file_index, hunk_index, hunk, count_tokens(repr(hunk))))
+
+    selected = {}
+    remaining = max_tokens
+    for value, file_index, hunk_index, hunk, tokens in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        cost = tokens + (0 if file_index in selected else overheads[file_index])
+        if cost > remaining:
+            continue
+        selected.setdefault(file_index, []).append((hunk_index, hunk))
+        remaining -= cost
+
+    if not selected:
+        # 价值最高的 hunk 单独就超过预算，截断后放入
+        value, file_index, hunk_index, hunk, tokens = max(candidates, key=lambda c: (c[0], -c[1], -c[2]))
+        selected[file_index] = [(hunk_index, truncate_text_by_tokens(hunk, max(max_tokens - overheads[file_index], 1)))]
+
+    allocated = [{**change, 'diff': ''.join(hunk for _, hunk in sorted(selected[file_index]))}
+                 for file_index, change in enumerate(changes) if file_index in selected]
+    omitted = [change_path(change) for file_index, change in enumerate(changes) if file_index not in selected]
+    return allocated, omitted
+
+
+def omitted_files_note(omitted: List[str]) -> str:
+    """附加在 Review 结果后的未 Review 文件说明"""
+    if not omitted:
+        return ''
+    shown = ', '.join(omitted[:20]) + (f' 等 {len(omitted)} 个文件' if len(omitted) > 20 else '')
+    return f"\n\n> 变更超过 token 预算，以下文件未纳入本次 Review：{shown}"
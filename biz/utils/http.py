@@ -0,0 +1,18 @@
+import os
+import threading
+
+import requests
+
+_local = threading.local()
+
+
+def http_session() -> requests.Session:
+    """
+    获取当前线程复用的 requests.Session，复用 HTTP 连接。
+    Session 按进程、线程缓存，避免 fork 出来的 Worker 进程复用父进程的 socket，也避免多线程共享同一个 Session。
+    """
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.session = requests.Session()
+    return _local.session
@@ -1,9 +1,25 @@
 import os
-from multiprocessing import Process
 
-from biz.utils.log import logger
+from biz.queue.admission import check_admission
+from biz.queue.fair_queue import fair_key, job_priority
+from biz.queue.pool import get_worker_pool
 
 
-def handle_queue(function: callable, data: any, token: str, url: str, url_slug: str):
-    process = Process(target=function, args=(data, token, url, url_slug))
-    process.start()
+def handle_queue(function: callable, data: any, token: str, url: str, url_slug: str, coalesce_key: str = '',
+                 project: str = '', is_merge_request: bool = False, target_branch: str = '') -> int:
+    """
+    提交任务到 Worker 进程池
+    :param coalesce_key: 同一个 MR 的合并键，防抖窗口(MR_REVIEW_DEBOUNCE_SECONDS)内只会 Review 最新的一次事件
+    :param project: 项目路径，用于按项目公平调度
+    :param is_merge_request: 是否为 MR 事件，MR 事件优先于 Push 事件
+    :param target_branch: MR 目标分支，合并到受保护分支的 MR 优先级最高
+    :raises QueueOverloadedError: 队列过载，事件被拒绝
+    """
+    priority = job_priority(is_merge_request, target_branch)
+    check_admission(priority)
+    delay_seconds = float(os.getenv('MR_REVIEW_DEBOUNCE_SECONDS', 30)) if coalesce_key else 0
+    # 任务分区，多节点部署时 Worker 节点按 WORKER_QUEUE 消费对应分区
+    queue_name = project if os.getenv('QUEUE_PARTITION_KEY', 'url_slug') == 'project' and project else url_slug
+    return get_worker_pool().submit(function, data, token, url, url_slug, coalesce_key=coalesce_key,
+                                    delay_seconds=delay_seconds, fair_key=fair_key(url_slug, project),
+                                    priority=priority, queue_name=queue_name)
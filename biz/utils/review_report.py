@@ -0,0 +1,115 @@
+"""
+结构化 Review 结果
+
+REVIEW_OUTPUT_FORMAT=json 时，LLM 按 ReviewReport 的 JSON Schema 输出问题列表及各项评分，
+经 pydantic 校验后在本地渲染为 Markdown；总分由各项评分求和得到，不再依赖正则从自由文本中解析。
+"""
+import json
+import re
+from typing import List, Literal, Optional, Dict, Any
+
+from pydantic import BaseModel, Field
+
+# 严重程度，按从高到低排列
+SEVERITIES = ('critical', 'major', 'minor', 'suggestion')
+_SEVERITY_LABELS = {'critical': '🔴 严重', 'major': '🟠 重要', 'minor': '🟡 一般', 'suggestion': '🔵 建议'}
+
+
+def extract_json(text: str) -> str:
+    """取出 LLM 输出中的 JSON 对象(兼容 ```json 代码块及前后的多余文字)"""
+    text = (text or '').strip()
+    match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', text, re.DOTALL)
+    if match:
+        return match.group(1)
+    if not text.startswith('{'):
+        start, end = text.find('{'), text.rfind('}')
+        return text[start:end + 1] if 0 <= start < end else text
+    return text
+
+
+class ReviewIssue(BaseModel):
+    file: str = Field(description="问题所在文件的路径")
+    line: Optional[int] = Field(default=None, description="问题所在的新文件行号，无法确定时为 null")
+    severity: Literal['critical', 'major', 'minor', 'suggestion'] = Field(
+        description="严重程度：critical(必须修复的缺陷或安全漏洞)、major、minor、suggestion(优化建议)")
+    title: str = Field(description="问题的简要描述")
+    suggestion: str = Field(default='', description="优化建议")
+
+
+class ReviewScores(BaseModel):
+    correctness: int = Field(ge=0, le=40, description="功能实现的正确性与健壮性(0-40)")
+    security: int = Field(ge=0, le=30, description="安全性与潜在风险(0-30)")
+    best_practices: int = Field(ge=0, le=20, description="是否符合最佳实践(0-20)")
+    performance: int = Field(ge=0, le=5, description="性能与资源利用效率(0-5)")
+    commits: int = Field(ge=0, le=5, description="Commits信息的清晰性与准确性(0-5)")
+
+    @property
+    def total(self) -> int:
+        return sum(getattr(self, name) for name in type(self).model_fields)
+
+
+_SCORE_LABELS = {
+    'correctness': ('功能实现的正确性与健壮性', 40),
+    'security': ('安全性与潜在风险', 30),
+    'best_practices': ('是否符合最佳实践', 20),
+    'performance': ('性能与资源利用效率', 5),
+    'commits': ('Commits信息的清晰性与准确性', 5),
+}
+
+
+class ReviewReport(BaseModel):
+    summary: str = Field(description="整体评价，一到三句话")
+    issues: List[ReviewIssue] = Field(default_factory=list, description="发现的问题，按严重程度从高到低排列")
+    scores: ReviewScores
+    total_score: int = Field(default=0, description="总分，等于各项评分之和")
+
+    @classmethod
+    def json_schema(cls) -> Dict[str, Any]:
+        return cls.model_json_schema()
+
+    @classmethod
+    def parse_output(cls, text: str) -> "ReviewReport":
+        """
+        解析 LLM 输出的 JSON(兼容 ```json 代码块及前后的多余文字)并校验，不符合 Schema 时抛出 ValueError；
+        总分以各项评分之和为准
+        """
+        report = cls.model_validate_json(extract_json(text))
+        report.issues.sort(key=lambda issue: SEVERITIES.index(issue.severity))
+        report.total_score = report.scores.total
+        return report
+
+    @classmethod
+    def merge(cls, reports: List["ReviewReport"]) -> "ReviewReport":
+        """
+        合并分片 Review 的结果：问题去重后按严重程度排序，各项评分取各分片的最低分(任一部分的严重问题都会拉低该项得分)
+        """
+        issues, seen = [], set()
+        for issue in sorted((issue for report in reports for issue in report.issues),
+                            key=lambda issue: SEVERITIES.index(issue.severity)):
+            key = (issue.file, issue.line, issue.title)
+            if key not in seen:
+                seen.add(key)
+                issues.append(issue)
+        scores = ReviewScores(**{name: min(getattr(report.scores, name) for report in reports)
+                                 for name in ReviewScores.model_fields})
+        return cls(summary='\n'.join(report.summary for report in reports if report.summary), issues=issues,
+                   scores=scores, total_score=scores.total)
+
+    def to_markdown(self) -> str:
+        """渲染为与 Markdown 模式一致的审查报告，总分行可被 CodeReviewer.parse_review_score 解析"""
+        lines = [self.summary, '', '### 问题描述和优化建议']
+        if not self.issues:
+            lines.append('未发现明显问题。')
+        for issue in sorted(self.issues, key=lambda issue: SEVERITIES.index(issue.severity)):
+            location = f"{issue.file}:{issue.line}" if issue.line else issue.file
+            lines.append(f"- {_SEVERITY_LABELS[issue.severity]} `{location}` {issue.title}")
+            if issue.suggestion:
+                lines.append(f"  - 建议：{issue.suggestion}")
+        lines += ['', '### 评分明细', '| 评分标准 | 得分 |', '| --- | --- |']
+        for name, (label, full_score) in _SCORE_LABELS.items():
+            lines.append(f"| {label} | {getattr(self.scores, name)}/{full_score} |")
+        lines += ['', f"总分:{self.total_score}分"]
+        return '\n'.join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(self.model_dump(), ensure_ascii=False)
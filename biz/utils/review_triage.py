@@ -0,0 +1,129 @@
+"""
+Review 前的变更初筛
+
+开启 REVIEW_TRIAGE_ENABLED 后，完整 Review 前先用本地规则判断变更是否需要深度 Review：
+只涉及文档、锁文件/生成文件、纯格式调整(缩进无语义的语言中 token 序列不变)或依赖/版本号升级时直接判定为无需深度 Review；
+涉及高风险路径或变更较大时直接进入完整 Review；介于两者之间的小变更再由 LLM 按 TriageDecision 做一次轻量判断。
+"""
+import os
+import re
+from typing import List, Tuple
+
+from pydantic import BaseModel, Field
+
+from biz.utils.diff_allocator import change_path, risky_path_pattern
+
+TRIAGE_TRIVIAL = 'trivial'
+TRIAGE_REVIEW = 'review'
+TRIAGE_UNSURE = 'unsure'
+
+DEFAULT_TRIVIAL_EXTENSIONS = '.md,.txt,.rst,.adoc,.png,.jpg,.jpeg,.gif,.svg,.ico'
+_CONFIG_EXTENSIONS = ('.yml', '.yaml', '.json', '.toml', '.ini', '.cfg', '.properties', '.xml', '.gradle')
+_GENERATED_PATH = re.compile(r'(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Pipfile\.lock|go\.sum|'
+                             r'Cargo\.lock|composer\.lock)$|\.lock$|\.min\.\w+$|\.pb\.go$|_pb2\.py$', re.IGNORECASE)
+# 缩进、空白没有语义的语言，只在这些文件中识别纯格式调整(不包括 Python、YAML、Makefile 等)
+_WHITESPACE_INSENSITIVE_EXTENSIONS = ('.java', '.kt', '.scala', '.groovy', '.c', '.h', '.cc', '.cpp', '.hpp', '.cs',
+                                      '.go', '.rs', '.swift', '.m', '.php', '.js', '.jsx', '.mjs', '.ts', '.tsx',
+                                      '.css', '.scss', '.less', '.json', '.xml', '.sql')
+# 字符串字面量(保留其中的空白)、标识符/数字、其他单个字符
+_TOKEN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`|\w+|\S')
+# 包管理清单文件，其中的版本号即依赖版本
+_MANIFEST_PATH = re.compile(r'(^|/)(package\.json|composer\.json|pom\.xml|build\.gradle(\.kts)?|gradle\.properties|'
+                            r'Cargo\.toml|pyproject\.toml|setup\.cfg|requirements[\w.-]*\.txt|go\.mod|Chart\.yaml)$',
+                            re.IGNORECASE)
+# 版本号形式的值：最多三段数字，可带 v 前缀及预发布/构建后缀；四段数字(IPv4 地址)不匹配
+_SEMVER = re.compile(r'(?<![\w.])v?\d+\.\d+(?:\.\d+)?(?:[-+][0-9A-Za-z.-]+)?(?![\w.])')
+_THREE_PART_VERSION = re.compile(r'(?<![\w.])v?\d+\.\d+\.\d+(?![\d.])')
+# 行中表明是版本号的键或版本约束符
+_VERSION_CONTEXT = re.compile(r'version|==|~=|>=|<=|[\s"\':=]\s*[\^~]\s*v?\d', re.IGNORECASE)
+
+
+class TriageDecision(BaseModel):
+    deep_review: bool = Field(description="是否需要完整的代码 Review：涉及逻辑、接口、依赖行为或安全的改动为 true")
+    reason: str = Field(description="判断依据，不超过 30 个字")
+
+
+def _changed_lines(diff: str) -> Tuple[List[str], List[str]]:
+    lines = [line for line in (diff or '').splitlines() if line[:3] not in ('+++', '---')]
+    return [line[1:] for line in lines if line.startswith('-')], [line[1:] for line in lines if line.startswith('+')]
+
+
+def is_formatting_only(path: str, diff: str) -> bool:
+    """
+    缩进、空白没有语义的语言中，删除行与新增行的 token 序列相同(缩进、换行、空行调整)；
+    字符串字面量作为整体比较，其中的空白变化不视为格式调整
+    """
+    if not path.lower().endswith(_WHITESPACE_INSENSITIVE_EXTENSIONS):
+        return False
+    removed, added = _changed_lines(diff)
+    if not removed and not added:
+        return False
+    return _TOKEN.findall('\n'.join(removed)) == _TOKEN.findall('\n'.join(added))
+
+
+def is_version_bump(path: str, diff: str) -> bool:
+    """
+    只改动了版本号：每个改动行都含版本号形式的值，且行中有 version 键、版本约束符(==、^、~ 等)，
+    或位于包管理清单文件中且为 x.y.z 形式的三段版本号；替换版本号后删除行与新增行相同。
+    IP 地址、超时等数值的改动不视为版本号升级
+    """
+    is_manifest = bool(_MANIFEST_PATH.search(path))
+    if not is_manifest and not path.lower().endswith(_CONFIG_EXTENSIONS):
+        return False
+    removed, added = _changed_lines(diff)
+    if not removed or len(removed) != len(added):
+        return False
+    if not all(_SEMVER.search(line) and (_VERSION_CONTEXT.search(line) or
+                                         (is_manifest and _THREE_PART_VERSION.search(line)))
+               for line in removed + added):
+        return False
+    return sorted(_SEMVER.sub('<version>', line.strip()) for line in removed) == \
+        sorted(_SEMVER.sub('<version>', line.strip()) for line in added)
+
+
+def trivial_change_kind(change: dict, trivial_extensions: List[str]) -> str:
+    """单个文件的变更属于无需深度 Review 的哪一类，不属于时返回空字符串"""
+    path = change_path(change)
+    diff = change.get('diff') or ''
+    if _MANIFEST_PATH.search(path):
+        # requirements.txt 等清单文件只在版本号升级时无需深度 Review
+        return '版本号升级' if is_version_bump(path, diff) else ''
+    if os.path.splitext(path)[1].lower() in trivial_extensions or re.search(r'(^|/)docs?/', path, re.IGNORECASE):
+        return '文档'
+    if _GENERATED_PATH.search(path):
+        return '锁文件/生成文件'
+    if is_formatting_only(path, diff):
+        return '格式调整'
+    if is_version_bump(path, diff):
+        return '版本号升级'
+    return ''
+
+
+def heuristic_triage(changes: list, tokens: int) -> Tuple[str, str]:
+    """
+    按本地规则初筛变更，返回 (结论, 原因)，结论为 TRIAGE_TRIVIAL / TRIAGE_REVIEW / TRIAGE_UNSURE：
+    - 涉及高风险路径(MODEL_ROUTING_RISKY_PATTERNS)时需要 Review
+    - 所有文件都属于文档、锁文件/生成文件、格式调整或版本号升级时无需深度 Review
+    - 超过 REVIEW_TRIAGE_MAX_TOKENS 的变更需要 Review，其余交由 LLM 判断
+    """
+    if not changes:
+        return TRIAGE_REVIEW, 'no changes'
+    risky_pattern = risky_path_pattern()
+    risky_paths = [change_path(change) for change in changes if risky_pattern.search(change_path(change))]
+    if risky_paths:
+        return TRIAGE_REVIEW, f"risky paths: {', '.join(risky_paths[:3])}"
+    trivial_extensions = [extension.strip().lower() for extension in
+                          (os.getenv('REVIEW_TRIAGE_TRIVIAL_EXTENSIONS', '') or DEFAULT_TRIVIAL_EXTENSIONS).split(',')
+                          if extension.strip()]
+    kinds = [trivial_change_kind(change, trivial_extensions) for change in changes]
+    if all(kinds):
+        return TRIAGE_TRIVIAL, '、'.join(dict.fromkeys(kinds))
+    if tokens > int(os.getenv('REVIEW_TRIAGE_MAX_TOKENS', 2000)):
+        return TRIAGE_REVIEW, f"large diff: {tokens} tokens"
+    return TRIAGE_UNSURE, f"small diff: {tokens} tokens"
+
+
+def trivial_review_result(reason: str) -> str:
+    """无需深度 Review 的变更使用的固定 Review 结果，总分行可被 CodeReviewer.parse_review_score 解析"""
+    score = int(os.getenv('REVIEW_TRIAGE_TRIVIAL_SCORE', 100))
+    return f"本次变更经初筛判定为无需深度 Review 的改动（{reason}），未进行完整的 AI Review。\n\n总分:{score}分"
@@ -0,0 +1,82 @@
+import os
+from unittest import TestCase, main
+from unittest.mock import patch, MagicMock
+
+from biz.llm.budget import BudgetExhausted
+from biz.queue.context import JobDeferred
+from biz.utils.code_reviewer import CodeReviewer, split_changes
+from biz.utils.token_util import count_tokens
+
+
+class TestSplitChanges(TestCase):
+    def test_small_changes_kept_in_one_chunk(self):
+        changes = [{'diff': '@@ -1 +1 @@\n-a\n+b', 'new_path': 'a.py'},
+                   {'diff': '@@ -1 +1 @@\n-c\n+d', 'new_path': 'b.py'}]
+        self.assertEqual(split_changes(changes, 1000), [changes])
+
+    def test_large_file_split_on_hunk_boundaries(self):
+        """测试超长文件按 hunk 拆分，每个分片不超过 token 上限，且不丢失 hunk"""
+        hunks = [f"@@ -{i * 10},3 +{i * 10},3 @@\n" + "+x = 1\n" * 40 for i in range(6)]
+        changes = [{'diff': ''.join(hunks), 'new_path': 'big.py'}, {'diff': '@@ -1 +1 @@\n+y', 'new_path': 'small.py'}]
+        max_tokens = count_tokens(str({'diff': hunks[0], 'new_path': 'big.py'})) * 2 + 10
+
+        chunks = split_changes(changes, max_tokens)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(sum(count_tokens(str(piece)) for piece in chunk), max_tokens)
+        big_diffs = [piece['diff'] for chunk in chunks for piece in chunk if piece['new_path'] == 'big.py']
+        self.assertEqual(big_diffs, hunks)
+        self.assertEqual(chunks[-1][-1]['new_path'], 'small.py')
+
+
+@patch.dict(os.environ, {'REVIEW_CACHE_ENABLED': '0', 'REVIEW_MAP_REDUCE_ENABLED': '1'})
+@patch('biz.utils.code_reviewer.Factory.getClient')
+class TestReviewChanges(TestCase):
+    def test_empty_changes_not_sent_to_llm(self, get_client):
+        self.assertEqual(CodeReviewer().review_changes([]), '代码为空')
+        get_client.return_value.completions.assert_not_called()
+
+    def test_files_beyond_max_chunks_listed_as_omitted(self, get_client):
+        """测试分片未装满导致分片数超过 REVIEW_MAX_CHUNKS 时，由分配器舍弃的文件列在结果末尾"""
+        get_client.return_value = MagicMock(provider='fake', default_model='fake-model')
+        get_client.return_value.completions.return_value = '总分:80分'
+        changes = [{'diff': '@@ -1,20 +1,20 @@\n' + '+value = compute(value)\n' * 20, 'new_path': f'{name}.py'}
+                   for name in ('a', 'b', 'c')]
+        # 每个分片只放得下一个文件，三个文件需要三个分片
+        max_tokens = int(count_tokens(str(changes[0])) * 1.6)
+        with patch.dict(os.environ, {'REVIEW_MAX_TOKENS': str(max_tokens), 'REVIEW_MAX_CHUNKS': '2'}):
+            result = CodeReviewer().review_changes(changes)
+
+        self.assertIn('以下文件未纳入本次 Review：c.py', result)
+        # 两个分片及一次合并
+        self.assertEqual(get_client.return_value.completions.call_count, 3)
+
+
+@patch('biz.utils.code_reviewer.check_budget', return_value=BudgetExhausted('demo', 'day', 1200, 1000))
+@patch('biz.utils.code_reviewer.Factory.getClient')
+class TestTokenBudgetActions(TestCase):
+    changes = [{'diff': '@@ -1 +1 @@\n-a\n+b', 'new_path': 'a.py'}]
+
+    @patch.dict(os.environ, {'TOKEN_BUDGET_ACTION': 'skip'})
+    def test_skip_returns_notice_without_calling_llm(self, get_client, _):
+        result = CodeReviewer('demo').review_changes(self.changes)
+        self.assertIn('token 预算已用尽', result)
+        get_client.return_value.completions.assert_not_called()
+
+    @patch.dict(os.environ, {'TOKEN_BUDGET_ACTION': 'defer'})
+    def test_defer_raises_job_deferred(self, get_client, _):
+        with self.assertRaises(JobDeferred) as ctx:
+            CodeReviewer('demo').review_changes(self.changes)
+        self.assertGreater(ctx.exception.delay_seconds, 0)
+
+    @patch.dict(os.environ, {'TOKEN_BUDGET_ACTION': 'downgrade', 'TOKEN_BUDGET_FALLBACK_MODEL': 'cheap-model',
+                             'REVIEW_CACHE_ENABLED': '0'})
+    def test_downgrade_uses_fallback_model(self, get_client, _):
+        get_client.return_value = MagicMock(provider='fake', default_model='strong-model')
+        get_client.return_value.completions.return_value = '总分:90分'
+        CodeReviewer('demo').review_changes(self.changes)
+        self.assertEqual(get_client.return_value.completions.call_args.kwargs['model'], 'cheap-model')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+from unittest import TestCase, main
+
+from biz.utils.diff_allocator import allocate_changes, omitted_files_note
+from biz.utils.token_util import count_tokens
+
+
+def _hunk(start: int, lines: list) -> str:
+    return f"@@ -{start},1 +{start},{len(lines)} @@\n" + ''.join(f"+{line}\n" for line in lines)
+
+
+class TestAllocateChanges(TestCase):
+    def test_changes_within_budget_unchanged(self):
+        changes = [{'new_path': 'a.py', 'diff': _hunk(1, ['x = 1'])}]
+        self.assertEqual(allocate_changes(changes, 1000), (changes, []))
+
+    def test_high_risk_hunks_kept_and_omitted_files_listed(self):
+        """测试超出预算时优先保留高风险的 hunk，而不是排在前面的文件"""
+        docs = {'new_path': 'docs/guide.md', 'diff': _hunk(1, ['说明文字 ' * 20] * 20)}
+        tests = {'new_path': 'tests/test_util.py', 'diff': _hunk(1, ['assert add(1, 2) == 3'] * 20)}
+        auth = {'new_path': 'app/auth/login.py',
+                'diff': _hunk(1, ['if password == stored_password:', '    session["user"] = user'])
+                        + _hunk(40, ['logger.info("login")'])}
+        changes = [docs, tests, auth]
+        budget = count_tokens(str([auth])) + count_tokens(str([tests])) // 2
+
+        allocated, omitted = allocate_changes(changes, budget)
+
+        self.assertEqual([change['new_path'] for change in allocated], ['app/auth/login.py'])
+        # 同一文件中保留的 hunk 保持原顺序
+        self.assertEqual(allocated[0]['diff'], auth['diff'])
+        self.assertEqual(omitted, ['docs/guide.md', 'tests/test_util.py'])
+        self.assertLessEqual(count_tokens(str(allocated)), budget)
+        self.assertIn('docs/guide.md', omitted_files_note(omitted))
+
+    def test_oversized_single_hunk_truncated(self):
+        changes = [{'new_path': 'a.py', 'diff': _hunk(1, ['value = compute(x)'] * 500)}]
+        allocated, omitted = allocate_changes(changes, 200)
+        self.assertEqual(omitted, [])
+        self.assertLess(len(allocated[0]['diff']), len(changes[0]['diff']))
+
+
+if __name__ == '__main__':
+    main()
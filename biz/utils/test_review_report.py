@@ -0,0 +1,65 @@
+import json
+import os
+from unittest import TestCase, main
+from unittest.mock import patch, MagicMock
+
+from biz.utils.code_reviewer import CodeReviewer
+from biz.utils.review_report import ReviewReport
+
+
+def _report(total: int = 0, **scores) -> dict:
+    return {
+        'summary': '整体良好',
+        'issues': [
+            {'file': 'app/db.py', 'line': 12, 'severity': 'minor', 'title': '缺少异常处理'},
+            {'file': 'app/db.py', 'line': 3, 'severity': 'critical', 'title': 'SQL 拼接存在注入风险',
+             'suggestion': '使用参数化查询'},
+        ],
+        'scores': {'correctness': 30, 'security': 10, 'best_practices': 15, 'performance': 5, 'commits': 4, **scores},
+        'total_score': total,
+    }
+
+
+class TestReviewReport(TestCase):
+    def test_parse_and_render(self):
+        """测试总分以各项评分之和为准，渲染后的总分可被 parse_review_score 解析"""
+        report = ReviewReport.parse_output(f"```json\n{json.dumps(_report(total=99), ensure_ascii=False)}\n```")
+        self.assertEqual(report.total_score, 64)
+        markdown = report.to_markdown()
+        self.assertEqual(CodeReviewer.parse_review_score(markdown), 64)
+        # 严重问题排在前面
+        self.assertLess(markdown.index('app/db.py:3'), markdown.index('app/db.py:12'))
+
+    def test_invalid_output_rejected(self):
+        with self.assertRaises(ValueError):
+            ReviewReport.parse_output(json.dumps(_report(security=45)))
+        with self.assertRaises(ValueError):
+            ReviewReport.parse_output('总分:80分')
+
+    def test_merge_keeps_lowest_scores_and_deduplicates_issues(self):
+        first = ReviewReport.parse_output(json.dumps(_report()))
+        second = ReviewReport.parse_output(json.dumps(_report(security=25, correctness=20)))
+        merged = ReviewReport.merge([first, second])
+        self.assertEqual((merged.scores.correctness, merged.scores.security), (20, 10))
+        self.assertEqual(merged.total_score, merged.scores.total)
+        self.assertEqual(len(merged.issues), 2)
+
+
+@patch.dict(os.environ, {'REVIEW_OUTPUT_FORMAT': 'json', 'REVIEW_CACHE_ENABLED': '0'})
+@patch('biz.utils.code_reviewer.Factory.getClient')
+class TestStructuredReview(TestCase):
+    def test_invalid_output_requested_again(self, get_client):
+        client = get_client.return_value = MagicMock(provider='fake', default_model='fake-model')
+        client.completions.side_effect = ['总分:80分', json.dumps(_report(), ensure_ascii=False)]
+
+        reviewer = CodeReviewer()
+        result = reviewer.review_changes([{'diff': '@@ -1 +1 @@\n-a\n+b', 'new_path': 'app/db.py'}], 'fix')
+
+        self.assertEqual(CodeReviewer.parse_review_score(result), 64)
+        self.assertEqual(reviewer.report.issues[0].severity, 'critical')
+        self.assertEqual(client.completions.call_count, 2)
+        self.assertEqual(client.completions.call_args.kwargs['response_schema'], ReviewReport.json_schema())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import json
+import os
+from unittest import TestCase, main
+from unittest.mock import patch, MagicMock
+
+from biz.utils.code_reviewer import CodeReviewer
+from biz.utils.review_triage import heuristic_triage, TRIAGE_REVIEW, TRIAGE_TRIVIAL, TRIAGE_UNSURE
+
+
+class TestHeuristicTriage(TestCase):
+    def _verdict(self, path, diff, tokens=100):
+        return heuristic_triage([{'new_path': path, 'diff': diff}], tokens)[0]
+
+    def test_trivial_changes(self):
+        self.assertEqual(self._verdict('README.md', '@@ -1 +1 @@\n-Hello\n+Hello world'), TRIAGE_TRIVIAL)
+        self.assertEqual(self._verdict('package-lock.json', '@@ -1 +1 @@\n-a\n+b', tokens=50000), TRIAGE_TRIVIAL)
+        self.assertEqual(self._verdict('app/Service.java', '@@ -1,2 +1,3 @@\n-int f(int a,int b){\n-  return a;}\n'
+                                                           '+int f(int a, int b) {\n+\n+    return a;\n+}'),
+                         TRIAGE_TRIVIAL)
+        self.assertEqual(self._verdict('pom.xml', '@@ -1 +1 @@\n-<version>1.2.3</version>\n'
+                                                  '+<version>1.3.0-RELEASE</version>'), TRIAGE_TRIVIAL)
+        self.assertEqual(self._verdict('package.json', '@@ -1 +1 @@\n-  "express": "^4.18.2",\n'
+                                                       '+  "express": "^4.19.0",'), TRIAGE_TRIVIAL)
+        self.assertEqual(self._verdict('requirements.txt', '@@ -1 +1 @@\n-requests==2.31.0\n+requests==2.32.3'),
+                         TRIAGE_TRIVIAL)
+
+    def test_whitespace_changes_with_meaning(self):
+        # Python 中的缩进调整改变了代码块
+        self.assertEqual(self._verdict('app/service.py', '@@ -1,2 +1,2 @@\n if user.is_admin:\n-    delete_all()\n'
+                                                         '+delete_all()'), TRIAGE_UNSURE)
+        self.assertEqual(self._verdict('conf/app.yml', '@@ -1 +1 @@\n-  debug: true\n+debug: true'), TRIAGE_UNSURE)
+        # 字符串字面量中的空白
+        self.assertEqual(self._verdict('app/Dao.java', '@@ -1 +1 @@\n-run("DROP TABLE a");\n+run("DROPTABLE a");'),
+                         TRIAGE_UNSURE)
+
+    def test_numeric_config_changes_are_not_version_bumps(self):
+        self.assertEqual(self._verdict('conf/app.yml', '@@ -1 +1 @@\n-bind: 127.0.0.1\n+bind: 0.0.0.0'), TRIAGE_UNSURE)
+        self.assertEqual(self._verdict('conf/app.yml', '@@ -1 +1 @@\n-timeout: 1.5\n+timeout: 30.0'), TRIAGE_UNSURE)
+        self.assertEqual(self._verdict('requirements.txt', '@@ -1 +1 @@\n-requests==2.31.0\n+reqeusts==2.31.0'),
+                         TRIAGE_UNSURE)
+
+    def test_changes_needing_review(self):
+        # 高风险路径即使只是格式调整也需要 Review
+        self.assertEqual(self._verdict('app/auth/login.py', '@@ -1 +1 @@\n-a=1\n+a = 1'), TRIAGE_REVIEW)
+        self.assertEqual(self._verdict('app/service.py', '@@ -1 +1 @@\n-return a\n+return b', tokens=5000),
+                         TRIAGE_REVIEW)
+        self.assertEqual(self._verdict('app/service.py', '@@ -1 +1 @@\n-return a\n+return b'), TRIAGE_UNSURE)
+        self.assertEqual(self._verdict('conf/app.yml', '@@ -1 +1 @@\n-debug: false\n+debug: true'), TRIAGE_UNSURE)
+
+
+@patch.dict(os.environ, {'REVIEW_TRIAGE_ENABLED': '1', 'REVIEW_TRIAGE_MODEL': 'tiny-model',
+                         'REVIEW_CACHE_ENABLED': '0'})
+@patch('biz.utils.code_reviewer.Factory.getClient')
+class TestCodeReviewerTriage(TestCase):
+    changes = [{'diff': '@@ -1 +1 @@\n-log.info("start")\n+log.info("starting")', 'new_path': 'app/service.py'}]
+
+    def test_trivial_change_gets_canned_result(self, get_client):
+        client = get_client.return_value = MagicMock(provider='fake', default_model='fake-model')
+        client.completions.return_value = json.dumps({'deep_review': False, 'reason': '只修改了日志文案'})
+
+        result = CodeReviewer().review_changes(self.changes, 'fix log')
+
+        self.assertIn('只修改了日志文案', result)
+        self.assertEqual(CodeReviewer.parse_review_score(result), 100)
+        # 只有一次初筛调用，使用初筛模型，不进行完整 Review
+        self.assertEqual(client.completions.call_count, 1)
+        self.assertEqual(client.completions.call_args.kwargs['model'], 'tiny-model')
+
+    def test_escalated_change_gets_full_review(self, get_client):
+        client = get_client.return_value = MagicMock(provider='fake', default_model='fake-model')
+        client.completions.side_effect = ['not json', '总分:75分']
+
+        result = CodeReviewer().review_changes(self.changes, 'fix log')
+
+        # 初筛输出无法解析时进入完整 Review
+        self.assertEqual(result, '总分:75分')
+        self.assertEqual(client.completions.call_count, 2)
+
+
+if __name__ == '__main__':
+    main()
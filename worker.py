@@ -0,0 +1,28 @@
+"""
+Worker 节点主程序入口：只消费任务队列，不提供 HTTP 服务
+"""
+from dotenv import load_dotenv
+
+# 必须在其他导入之前加载环境变量
+load_dotenv("conf/.env")
+
+import os
+import time
+
+# 通过 worker.py 启动的节点始终为 worker 角色
+os.environ['NODE_ROLE'] = 'worker'
+
+from biz.queue.pool import drain_on_sigterm, get_worker_pool
+from biz.utils.config_checker import check_config
+
+if __name__ == '__main__':
+    check_config()
+    # 启动常驻 Worker 进程池，消费 WORKER_QUEUE 中配置的分区
+    get_worker_pool().start()
+    # 部署重启时(SIGTERM)先排空进程池，执行中的 Review 完成后再退出
+    drain_on_sigterm()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        get_worker_pool().shutdown()